@@ -1,13 +1,16 @@
+import os
 from flask import Flask, jsonify
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from .config import Config 
 from dotenv import load_dotenv
 from flask_cors import CORS
+from .replicas import RoutingSession, replica_router
 
 load_dotenv()
 
-db = SQLAlchemy()
+# RoutingSession sends read-only requests to replicas when configured.
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 login_manager = LoginManager()
 
 @login_manager.unauthorized_handler
@@ -16,8 +19,13 @@ def unauthorized():
 
 @login_manager.user_loader
 def load_user(user_id):
-    from .models import User
-    return db.session.get(User, int(user_id))
+    from .auth import load_principal
+    return load_principal(int(user_id))
+
+def init_migrate(app):
+    # Makes `flask db ...` and flask_migrate's upgrade() work with this app.
+    from flask_migrate import Migrate
+    Migrate(app, db, directory=os.path.join(os.path.dirname(__file__), '..', 'migrations'))
 
 def create_app(test_config=None):
     app = Flask(__name__, static_folder='../frontend/out')
@@ -25,15 +33,51 @@ def create_app(test_config=None):
     if test_config:
         app.config.update(test_config)
 
+    if app.config['TRUSTED_PROXIES']:
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['TRUSTED_PROXIES'])
+
     CORS(app, origins=["http://localhost:3000"], supports_credentials=True)
 
+    from . import pool
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', pool.engine_options(app.config))
     db.init_app(app)
+    replica_router.init_app(app)
+    pool.init_app(app)
+    # The schema is managed by migrations (`flask db upgrade`), not created at
+    # boot. Flask-Migrate imports alembic, a good part of the import time, so
+    # gunicorn workers skip it; only the flask CLI sets it up.
+    if os.environ.get('FLASK_RUN_FROM_CLI') == 'true':
+        init_migrate(app)
     login_manager.init_app(app)
 
+    # First, so its timer wraps the other request hooks.
+    from . import instrumentation
+    instrumentation.init_app(app)
+
+    # Before anything else does work for a request it will refuse.
+    from . import ratelimit
+    ratelimit.init_app(app)
+
+    from . import encoding
+    encoding.init_app(app)
+
+    from .access import ticket_access
+    ticket_access.init_app(app)
+
+    from . import results
+    results.init_app(app)
+
+    from . import events
+    events.init_app(app)
+
+    from . import assets
+    assets.init_app(app)
+
+    from . import jobs
+    jobs.init_app(app)
+
     from .routes import bp
     app.register_blueprint(bp)
 
-    with app.app_context():
-        db.create_all()
-    
     return app
@@ -0,0 +1,68 @@
+from flask import g, current_app
+from . import db
+from .cache import get_cache, MISSING
+from .models import TicketAssignment
+
+# --------------------------------
+# Ticket access control
+# --------------------------------
+# Admins can see every ticket; standard users can see the tickets they are
+# assigned to. The set of visible ticket ids is resolved at most once per
+# request (memoized on `g`) and, when ACCESS_CACHE_TTL > 0, kept in a
+# per-worker TTL cache keyed on user id. Routes that create or delete
+# assignments must call `invalidate` for the affected users.
+
+class TicketAccess:
+    def __init__(self):
+        self.request_hits = 0
+        self.db_lookups = 0
+
+    def init_app(self, app):
+        app.extensions['ticket_access'] = self
+        app.before_request(self.reset)
+
+    def reset(self):
+        # Forget the ids resolved so far in this request.
+        g.pop('_visible_ticket_ids', None)
+
+    def _cache(self):
+        if current_app.config['ACCESS_CACHE_TTL'] <= 0:
+            return None
+        return get_cache('ticket_access', current_app.config['ACCESS_CACHE_SIZE'], current_app.config['ACCESS_CACHE_TTL'])
+
+    def visible_ticket_ids(self, user):
+        memo = g.setdefault('_visible_ticket_ids', {})
+        if user.id in memo:
+            self.request_hits += 1
+            return memo[user.id]
+
+        cache = self._cache()
+        cached = cache.get(user.id) if cache else MISSING
+        if cached is not MISSING:
+            ticket_ids = frozenset(cached)
+        else:
+            self.db_lookups += 1
+            ticket_ids = frozenset(db.session.scalars(
+                db.select(TicketAssignment.ticket_id).where(TicketAssignment.user_id == user.id)
+            ))
+            if cache:
+                cache.set(user.id, sorted(ticket_ids))
+
+        memo[user.id] = ticket_ids
+        return ticket_ids
+
+    def can_view(self, user, ticket_id):
+        return user.role == "admin" or ticket_id in self.visible_ticket_ids(user)
+
+    def invalidate(self, *user_ids):
+        memo = g.get('_visible_ticket_ids', {})
+        cache = self._cache()
+        for user_id in user_ids:
+            memo.pop(user_id, None)
+            if cache:
+                cache.delete(user_id)
+
+    def stats(self):
+        return {"request_hits": self.request_hits, "db_lookups": self.db_lookups}
+
+ticket_access = TicketAccess()
@@ -0,0 +1,91 @@
+import json
+import mimetypes
+import os
+from flask import current_app, request, send_file, abort
+
+# --------------------------------
+# Static frontend
+# --------------------------------
+# The Next.js export in frontend/out (app.static_folder) is served from a route
+# table built once per worker, instead of probing the filesystem on every
+# request:
+#   /path   -> path, path.html or path/index.html, the files Next.js exports
+#   other   -> index.html, for client-side routing (but a missing /_next/ asset
+#              is a 404, not a page)
+# `npm run build` also writes .br/.gz copies of compressible files and
+# MANIFEST (frontend/scripts/precompress.mjs). The table is read from the
+# manifest; without one (e.g. an older build) it is scanned from the folder.
+# The best precompressed copy the client accepts is sent as is.
+#
+# Content-hashed assets (_next/static/) are cached by browsers for a year
+# without revalidating; everything else, HTML included, is revalidated so a
+# deploy shows up at once. In production nginx serves the same files itself
+# (nginx/default.conf) and only passes requests it can't answer to Flask.
+
+MANIFEST = 'asset-manifest.json'
+SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+
+def _scan(root):
+    # The manifest's 'files', from whatever is in the folder.
+    files = {}
+    for dirpath, _, names in os.walk(root):
+        for name in names:
+            path = os.path.relpath(os.path.join(dirpath, name), root).replace(os.sep, '/')
+            if path == MANIFEST or name.endswith(tuple(SUFFIXES.values())):
+                continue
+            files[path] = {
+                'encodings': [encoding for encoding, suffix in SUFFIXES.items() if os.path.exists(os.path.join(dirpath, name + suffix))],
+                'immutable': path.startswith('_next/static/'),
+            }
+    return files
+
+def load_routes(root):
+    # {url path without slashes: (file path, encodings, immutable)}
+    if not root or not os.path.isdir(root):
+        return {}
+    try:
+        with open(os.path.join(root, MANIFEST)) as f:
+            files = json.load(f)['files']
+    except FileNotFoundError:
+        files = _scan(root)
+
+    routes = {path: (path, tuple(info['encodings']), info['immutable']) for path, info in files.items()}
+    for path, entry in list(routes.items()):
+        if path.endswith('.html'):
+            stem = path[:-len('.html')]
+            routes.setdefault(stem, entry)
+            if stem == 'index' or stem.endswith('/index'):
+                routes.setdefault(stem[:-len('index')].rstrip('/'), entry)
+    return routes
+
+def serve(path):
+    if current_app.debug:
+        # Pick up `npm run build` without restarting the dev server.
+        current_app.extensions['frontend_routes'] = load_routes(current_app.static_folder)
+    routes = current_app.extensions['frontend_routes']
+    path = path.strip('/')
+    entry = routes.get(path)
+    if entry is None and not path.startswith('_next/'):
+        entry = routes.get('')
+    if entry is None:
+        abort(404)
+
+    file_path, encodings, immutable = entry
+    full_path = os.path.join(current_app.static_folder, file_path)
+    for encoding in encodings:
+        if request.accept_encodings[encoding]:
+            mimetype = mimetypes.guess_type(file_path)[0] or 'application/octet-stream'
+            response = send_file(full_path + SUFFIXES[encoding], mimetype=mimetype, conditional=True)
+            response.headers['Content-Encoding'] = encoding
+            break
+    else:
+        response = send_file(full_path, conditional=True)
+    if encodings:
+        response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = IMMUTABLE if immutable else REVALIDATE
+    return response
+
+def init_app(app):
+    app.extensions['frontend_routes'] = load_routes(app.static_folder)
@@ -0,0 +1,53 @@
+from flask import current_app
+from flask_login import UserMixin
+from . import db
+from .cache import get_cache, MISSING
+
+# --------------------------------
+# Session user principals
+# --------------------------------
+# Flask-Login resolves current_user on every authenticated request. Instead of a
+# primary-key query each time, a lightweight principal (id, username, role) is
+# cached per user id. Routes that change a user's role or delete a user must call
+# `invalidate_user` so the change applies on the next request.
+#
+# invalidate_user only reaches other workers when the cache is shared
+# (CACHE_REDIS_URL). With a per-worker cache (USER_CACHE_TTL set without Redis)
+# the other workers keep the old role, or a deleted user, for up to
+# USER_CACHE_TTL seconds; that's why the cache is off by default without Redis.
+
+class UserPrincipal(UserMixin):
+    def __init__(self, id, username, role):
+        self.id = id
+        self.username = username
+        self.role = role
+
+    def to_dict(self):
+        return {"id": self.id, "username": self.username, "role": self.role}
+
+def _user_cache():
+    if current_app.config['USER_CACHE_TTL'] <= 0:
+        return None
+    return get_cache('users', current_app.config['USER_CACHE_SIZE'], current_app.config['USER_CACHE_TTL'])
+
+def load_principal(user_id):
+    from .models import User
+    cache = _user_cache()
+    cached = cache.get(user_id) if cache else MISSING
+    if cached is not MISSING:
+        return UserPrincipal(**cached)
+
+    row = db.session.execute(
+        db.select(User.id, User.username, User.role).where(User.id == user_id)
+    ).first()
+    if row is None:
+        return None
+    principal = UserPrincipal(row.id, row.username, row.role)
+    if cache:
+        cache.set(user_id, principal.to_dict())
+    return principal
+
+def invalidate_user(user_id):
+    cache = _user_cache()
+    if cache:
+        cache.delete(user_id)
@@ -0,0 +1,138 @@
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+# --------------------------------
+# Caches
+# --------------------------------
+# A small size-bounded LRU with per-entry TTL. Each gunicorn worker has its own
+# copy, so anything cached here can be up to `ttl` seconds stale in the other
+# workers after an invalidation; keep TTLs short for authorization data.
+# Setting CACHE_REDIS_URL switches every cache to a shared Redis backend so
+# invalidations are seen by all workers. Values must be JSON serializable.
+
+MISSING = object()
+
+class TTLCache:
+    def __init__(self, name, maxsize=1024, ttl=30):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=MISSING):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > now:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": "local",
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+        }
+
+
+class RedisCache:
+    def __init__(self, name, url, ttl=30):
+        import redis  # optional dependency, only needed when CACHE_REDIS_URL is set
+        self.name = name
+        self.ttl = ttl
+        self.prefix = f"subjex:{name}:"
+        self.client = redis.Redis.from_url(url)
+        self.errors = redis.RedisError
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=MISSING):
+        try:
+            raw = self.client.get(self.prefix + str(key))
+        except self.errors:
+            logger.warning("Cache %s unavailable, treating lookup as a miss", self.name, exc_info=True)
+            raw = None
+        if raw is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return json.loads(raw)
+
+    def set(self, key, value):
+        try:
+            self.client.set(self.prefix + str(key), json.dumps(value), px=int(self.ttl * 1000))
+        except self.errors:
+            logger.warning("Cache %s unavailable, value not stored", self.name, exc_info=True)
+
+    def delete(self, key):
+        # Let errors propagate: a failed invalidation must not be silently ignored.
+        self.client.delete(self.prefix + str(key))
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=self.prefix + "*"))
+        if keys:
+            self.client.delete(*keys)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": "redis",
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+        }
+
+# Caches are created lazily per app and registered in app.extensions['caches']
+# so /api/dev/cache-stats can report on all of them.
+def get_cache(name, maxsize, ttl):
+    app = current_app._get_current_object()
+    caches = app.extensions.setdefault('caches', {})
+    cache = caches.get(name)
+    if cache is None:
+        if app.config.get('CACHE_REDIS_URL'):
+            cache = RedisCache(name, app.config['CACHE_REDIS_URL'], ttl)
+        else:
+            cache = TTLCache(name, maxsize, ttl)
+        caches[name] = cache
+    return cache
+
+def cache_stats():
+    return {name: cache.stats() for name, cache in current_app.extensions.get('caches', {}).items()}
@@ -1,3 +1,4 @@
+import json
 import os
 from dotenv import load_dotenv
 
@@ -7,6 +8,155 @@ class Config:
     SECRET_KEY = os.environ.get("SECRET_KEY")
     SQLALCHEMY_DATABASE_URI = os.environ.get("DATABASE_URI")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # SQLALCHEMY_ENGINE_OPTIONS is built from the DB_* settings below (pool.py)
+    # unless it is set explicitly.
     FLASK_ENV = os.environ.get("FLASK_ENV")
     ELEVATE_ADMIN_SECRET = os.environ.get("ELEVATE_ADMIN_SECRET")
     DELETE_USER_SECRET = os.environ.get("DELETE_USER_SECRET")
+    # Number of reverse proxies (nginx) in front of the app whose
+    # X-Forwarded-For may be trusted for the client IP. 0: use the peer address.
+    TRUSTED_PROXIES = int(os.environ.get("TRUSTED_PROXIES", 0))
+
+    # Password hashing (see passwords.py): scrypt:N:r:p, pbkdf2:sha256:iterations
+    # or argon2:time_cost:memory_kib:parallelism. Existing hashes are upgraded
+    # to this on the next successful login.
+    PASSWORD_HASH_METHOD = os.environ.get("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+    PASSWORD_SALT_LENGTH = int(os.environ.get("PASSWORD_SALT_LENGTH", 16))
+    # Threads per worker that hash passwords, and how many more hashes may
+    # wait for one before logins get 503.
+    PASSWORD_HASH_THREADS = int(os.environ.get("PASSWORD_HASH_THREADS", 1))
+    PASSWORD_HASH_QUEUE = int(os.environ.get("PASSWORD_HASH_QUEUE", 16))
+    # Refuse logins for a username (or from an IP) after this many failures,
+    # until LOGIN_THROTTLE_SECONDS after the last one. 0 seconds disables it.
+    LOGIN_THROTTLE_SECONDS = float(os.environ.get("LOGIN_THROTTLE_SECONDS", 300))
+    LOGIN_MAX_FAILURES = int(os.environ.get("LOGIN_MAX_FAILURES", 5))
+    LOGIN_MAX_FAILURES_PER_IP = int(os.environ.get("LOGIN_MAX_FAILURES_PER_IP", 50))
+    LOGIN_THROTTLE_SIZE = int(os.environ.get("LOGIN_THROTTLE_SIZE", 100000))
+
+    # Listings (tickets, comments) are keyset paginated.
+    PAGE_SIZE_DEFAULT = int(os.environ.get("PAGE_SIZE_DEFAULT", 50))
+    PAGE_SIZE_MAX = int(os.environ.get("PAGE_SIZE_MAX", 200))
+    # Keep serving the original un-paginated arrays to clients that don't send
+    # limit/cursor (the current Next.js pages). Set to "false" once they page.
+    LEGACY_LISTINGS = os.environ.get("LEGACY_LISTINGS", "true").lower() == "true"
+
+    # Cache each user's visible ticket ids for this many seconds (per worker).
+    # 0 disables the cache; ids are then still resolved only once per request.
+    ACCESS_CACHE_TTL = float(os.environ.get("ACCESS_CACHE_TTL", 0))
+    ACCESS_CACHE_SIZE = int(os.environ.get("ACCESS_CACHE_SIZE", 10000))
+
+    # Optional Redis URL (e.g. redis://redis:6379/0) to share caches between
+    # gunicorn workers so invalidations apply everywhere. Requires `redis`.
+    CACHE_REDIS_URL = os.environ.get("CACHE_REDIS_URL")
+    # Cache the logged-in user's id/username/role for this many seconds so
+    # authenticated requests don't query the users table. 0 disables it.
+    # Without CACHE_REDIS_URL each worker has its own copy, which
+    # invalidate_user can't reach from other workers or `flask worker`: a
+    # deleted or demoted user would keep their old role elsewhere for up to
+    # the TTL. So it's off by default unless the cache is shared.
+    USER_CACHE_TTL = float(os.environ.get("USER_CACHE_TTL", 30 if CACHE_REDIS_URL else 0))
+    USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", 10000))
+
+    # Server-sent change feed (/api/events).
+    EVENTS_HEARTBEAT_SECONDS = float(os.environ.get("EVENTS_HEARTBEAT_SECONDS", 15))
+    EVENTS_STREAM_MAX_SECONDS = float(os.environ.get("EVENTS_STREAM_MAX_SECONDS", 300))
+    EVENTS_RETRY_MS = int(os.environ.get("EVENTS_RETRY_MS", 2000))
+    EVENTS_BATCH_SIZE = int(os.environ.get("EVENTS_BATCH_SIZE", 100))
+    EVENTS_RETENTION_HOURS = float(os.environ.get("EVENTS_RETENTION_HOURS", 24))
+    EVENTS_GAP_GRACE_SECONDS = float(os.environ.get("EVENTS_GAP_GRACE_SECONDS", 1))
+    # Direct (non-PgBouncer) connection used for LISTEN; defaults to DATABASE_URI.
+    EVENTS_DATABASE_URI = os.environ.get("EVENTS_DATABASE_URI")
+
+    # Maximum number of items accepted by the bulk endpoints in one request.
+    BULK_MAX_ITEMS = int(os.environ.get("BULK_MAX_ITEMS", 1000))
+
+    # Tickets fetched per round-trip by the streaming export.
+    EXPORT_CHUNK_SIZE = int(os.environ.get("EXPORT_CHUNK_SIZE", 500))
+
+    # Compress responses of at least this many bytes (0 disables), with these
+    # types, for clients that accept br or gzip (see encoding.py).
+    COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", 1024))
+    COMPRESS_MIMETYPES = {"application/json", "text/plain", "text/csv"}
+    COMPRESS_GZIP_LEVEL = int(os.environ.get("COMPRESS_GZIP_LEVEL", 6))
+    COMPRESS_BR_QUALITY = int(os.environ.get("COMPRESS_BR_QUALITY", 4))
+
+    # Background jobs (see jobs.py), run by `flask worker`. Deletes that would
+    # remove more than JOBS_INLINE_MAX_ROWS rows are queued and answered 202.
+    JOBS_INLINE_MAX_ROWS = int(os.environ.get("JOBS_INLINE_MAX_ROWS", 1000))
+    JOBS_MAX_ATTEMPTS = int(os.environ.get("JOBS_MAX_ATTEMPTS", 5))
+    JOBS_BACKOFF_SECONDS = float(os.environ.get("JOBS_BACKOFF_SECONDS", 10))
+    JOBS_BACKOFF_MAX_SECONDS = float(os.environ.get("JOBS_BACKOFF_MAX_SECONDS", 3600))
+    # A running job is handed to another worker after this long without
+    # finishing (its worker is presumed dead); keep it above the longest job.
+    JOBS_LEASE_SECONDS = float(os.environ.get("JOBS_LEASE_SECONDS", 1800))
+    JOBS_POLL_SECONDS = float(os.environ.get("JOBS_POLL_SECONDS", 1))
+    JOBS_RETENTION_DAYS = float(os.environ.get("JOBS_RETENTION_DAYS", 7))
+
+    # Cache ticket listings and summaries (see results.py) for up to this many
+    # seconds, RESULT_CACHE_SIZE responses per worker (or in CACHE_REDIS_URL).
+    # 0 disables it.
+    RESULT_CACHE_TTL = float(os.environ.get("RESULT_CACHE_TTL", 300))
+    RESULT_CACHE_SIZE = int(os.environ.get("RESULT_CACHE_SIZE", 128))
+
+    # Token-bucket rate limits per endpoint and user (or IP when logged out),
+    # written "N/second|minute|hour [burst M]" (see ratelimit.py). Views can set
+    # their own with @rate_limit; RATELIMIT_ROUTES (JSON, endpoint -> limit or
+    # null to exempt) overrides both.
+    RATELIMIT_ENABLED = os.environ.get("RATELIMIT_ENABLED", "true").lower() == "true"
+    RATELIMIT_DEFAULT = os.environ.get("RATELIMIT_DEFAULT", "10/second burst 50")
+    RATELIMIT_ROUTES = {
+        "main.index": None,
+        "main.static_proxy": None,
+        "main.get_metrics": None,
+        "static": None,
+        **json.loads(os.environ.get("RATELIMIT_ROUTES", "{}")),
+    }
+    # Shared buckets for all workers (requires `redis`); per worker without.
+    RATELIMIT_REDIS_URL = os.environ.get("RATELIMIT_REDIS_URL", CACHE_REDIS_URL)
+    RATELIMIT_MAX_KEYS = int(os.environ.get("RATELIMIT_MAX_KEYS", 100000))
+    # Refuse requests that queued longer than this in front of the app,
+    # measured from nginx's X-Request-Start header. 0 disables it.
+    ADMISSION_QUEUE_BUDGET_MS = float(os.environ.get("ADMISSION_QUEUE_BUDGET_MS", 5000))
+
+    # Per-request timing (see instrumentation.py).
+    INSTRUMENTATION = os.environ.get("INSTRUMENTATION", "true").lower() == "true"
+    # Send a Server-Timing header with db/hash/app timings to clients.
+    SERVER_TIMING = os.environ.get("SERVER_TIMING", "true").lower() == "true"
+    # Requests slower than this are logged at WARNING and, if sampled, profiled.
+    SLOW_REQUEST_MS = float(os.environ.get("SLOW_REQUEST_MS", 500))
+    # Fraction of requests to run under cProfile (0 disables). Profiles of the
+    # slow ones are written to PROFILE_DIR; open them with snakeviz or pstats.
+    PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0))
+    PROFILE_DIR = os.environ.get("PROFILE_DIR", "instance/profiles")
+    # Shared directory where each gunicorn worker writes its metrics so that
+    # /metrics reports all of them. Unset: only the answering process is reported.
+    METRICS_DIR = os.environ.get("METRICS_DIR")
+    METRICS_FLUSH_SECONDS = float(os.environ.get("METRICS_FLUSH_SECONDS", 5))
+    # If set, /metrics requires "Authorization: Bearer <METRICS_TOKEN>".
+    METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
+    # Connection pool, per worker (see pool.py). Ignored for SQLite.
+    # DB_POOL_SIZE=0 turns the app-side pool off (e.g. behind PgBouncer).
+    DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 5))
+    DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 5))
+    # Seconds to wait for a free connection before failing the request.
+    DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 10))
+    # Replace connections older than this many seconds (-1: never).
+    DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", 1800))
+    # Test connections on checkout so ones broken by a Postgres restart or
+    # failover are replaced instead of failing a request.
+    DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "true").lower() == "true"
+    # Postgres statement_timeout in milliseconds (0: no limit).
+    DB_STATEMENT_TIMEOUT_MS = int(os.environ.get("DB_STATEMENT_TIMEOUT_MS", 30000))
+    # Running behind PgBouncer in transaction pooling mode.
+    DB_PGBOUNCER = os.environ.get("DB_PGBOUNCER", "false").lower() == "true"
+
+    # Read replicas (see replicas.py): comma-separated database URIs. Empty:
+    # everything uses DATABASE_URI.
+    DATABASE_REPLICA_URIS = [uri.strip() for uri in os.environ.get("DATABASE_REPLICA_URIS", "").split(",") if uri.strip()]
+    # After a client writes, its reads stay on the primary for this long.
+    REPLICA_PIN_SECONDS = float(os.environ.get("REPLICA_PIN_SECONDS", 5))
+    # How often to re-check a replica's health and lag.
+    REPLICA_CHECK_SECONDS = float(os.environ.get("REPLICA_CHECK_SECONDS", 5))
+    # Skip replicas further behind the primary than this.
+    REPLICA_MAX_LAG_SECONDS = float(os.environ.get("REPLICA_MAX_LAG_SECONDS", 10))
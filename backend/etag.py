@@ -0,0 +1,93 @@
+import hashlib
+from flask import request, current_app
+from sqlalchemy import func
+from . import db
+from .models import User, Ticket, Comment, TicketAssignment, utcnow
+from .queries import visible_filter, filter_tickets
+from .results import invalidate
+
+# --------------------------------
+# ETags / conditional GET
+# --------------------------------
+# ETags are derived from cheap aggregate queries over version counters and ids
+# rather than by hashing the response body, so a matching If-None-Match gets a
+# 304 before any rows are loaded or serialized.
+#
+# Bump ETAG_FORMAT whenever the shape of a read response changes, so clients
+# don't keep a cached body in the old format.
+ETAG_FORMAT = "3"
+
+def touch_tickets(*ticket_ids, comments=0, assignees=0):
+    # Record a change to these tickets (or their assignments/comments).
+    # `comments` and `assignees` are added to each ticket's counters.
+    # Call before committing the change itself.
+    ticket_ids = [ticket_id for ticket_id in ticket_ids if ticket_id is not None]
+    if not ticket_ids:
+        return
+    invalidate('tickets')
+    now = utcnow()
+    values = {'version': Ticket.version + 1, 'updated_at': now, 'last_activity_at': now}
+    if comments:
+        values['comment_count'] = Ticket.comment_count + comments
+    if assignees:
+        values['assignee_count'] = Ticket.assignee_count + assignees
+    db.session.execute(
+        db.update(Ticket)
+        .where(Ticket.id.in_(ticket_ids))
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+
+def recount_tickets(*ticket_ids):
+    # Recompute the counters of these tickets from their rows, after changes
+    # whose effect on each ticket isn't known up front (e.g. deleting a user).
+    ticket_ids = [ticket_id for ticket_id in ticket_ids if ticket_id is not None]
+    if not ticket_ids:
+        return
+    invalidate('tickets')
+    db.session.execute(
+        db.update(Ticket)
+        .where(Ticket.id.in_(ticket_ids))
+        .values(
+            comment_count=db.select(func.count(Comment.id)).where(Comment.ticket_id == Ticket.id).scalar_subquery(),
+            assignee_count=db.select(func.count(TicketAssignment.id)).where(TicketAssignment.ticket_id == Ticket.id).scalar_subquery(),
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+def make_etag(*parts):
+    raw = "|".join(str(part) for part in (ETAG_FORMAT, request.path, request.query_string.decode()) + parts)
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+def tickets_state(user, args):
+    # Aggregate over the visible tickets matching the listing filters. It
+    # changes whenever one of them is created, deleted or touched.
+    query = db.session.query(
+        func.count(Ticket.id), func.max(Ticket.id), func.sum(Ticket.version), func.max(Ticket.updated_at)
+    )
+    return tuple(filter_tickets(visible_filter(query, user), args).one())
+
+def tickets_etag(user, args, state=None):
+    return make_etag(user.role, user.id, *(state or tickets_state(user, args)))
+
+def ticket_etag(ticket_version):
+    return make_etag(ticket_version)
+
+def users_etag():
+    return make_etag(*db.session.query(func.count(User.id), func.max(User.id)).one())
+
+def user_etag(user):
+    return make_etag(user.id, user.username)
+
+def is_fresh(etag):
+    # True if the client's If-None-Match already covers this ETag.
+    return request.if_none_match.contains_weak(etag)
+
+def tagged(response, etag):
+    # Clients may store the body but must revalidate it on every use.
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def not_modified(etag):
+    return tagged(current_app.response_class(status=304), etag)
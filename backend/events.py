@@ -0,0 +1,216 @@
+import json
+import logging
+import select
+import threading
+import time
+from datetime import timedelta
+import click
+from flask import current_app
+from sqlalchemy import event as sa_event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+from . import db
+from .cache import get_cache
+from .models import ChangeEvent, utcnow
+
+logger = logging.getLogger(__name__)
+
+# --------------------------------
+# Change feed
+# --------------------------------
+# Mutating routes call `publish` before committing, which appends a row to the
+# change_events table in the same transaction. The table is the source of truth
+# (and what makes resuming from Last-Event-ID possible); the broker only wakes
+# up streams waiting for new rows:
+#   - after a commit in this process, via a SQLAlchemy after_commit hook
+#   - on Postgres, via LISTEN/NOTIFY from any process (pg_notify is sent on commit)
+
+CHANNEL = 'change_events'
+
+class Broker:
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._seq = 0
+
+    @property
+    def seq(self):
+        return self._seq
+
+    def notify(self):
+        with self._cond:
+            self._seq += 1
+            self._cond.notify_all()
+
+    def wait(self, seq, timeout):
+        # Block until notify() is called after `seq` was read, or timeout.
+        # Returns True if woken by a notification.
+        with self._cond:
+            return self._cond.wait_for(lambda: self._seq != seq, timeout)
+
+class PostgresListener(threading.Thread):
+    # One per worker process: a dedicated connection (not from the pool) that
+    # LISTENs on the channel and forwards notifications to the broker.
+    daemon = True
+
+    def __init__(self, uri, broker):
+        super().__init__(name='change-event-listener')
+        self.dsn = make_url(uri).set(drivername='postgresql').render_as_string(hide_password=False)
+        self.broker = broker
+
+    def run(self):
+        import psycopg2
+        import psycopg2.extensions
+        while True:
+            try:
+                conn = psycopg2.connect(self.dsn)
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                conn.cursor().execute(f"LISTEN {CHANNEL}")
+                while True:
+                    if select.select([conn], [], [], 30) != ([], [], []):
+                        conn.poll()
+                        if conn.notifies:
+                            conn.notifies.clear()
+                            self.broker.notify()
+            except Exception:
+                logger.warning("Change event listener lost its connection, reconnecting", exc_info=True)
+                time.sleep(1)
+
+broker = Broker()
+_listener = None
+_listener_lock = threading.Lock()
+
+def _ensure_listener():
+    global _listener
+    if db.engine.dialect.name != 'postgresql':
+        return
+    with _listener_lock:
+        if _listener is None or not _listener.is_alive():
+            uri = current_app.config.get('EVENTS_DATABASE_URI') or current_app.config['SQLALCHEMY_DATABASE_URI']
+            _listener = PostgresListener(uri, broker)
+            _listener.start()
+
+@sa_event.listens_for(Session, 'after_commit')
+def _wake_local_streams(session):
+    if session.info.pop('change_events_published', False):
+        broker.notify()
+
+@sa_event.listens_for(Session, 'after_rollback')
+def _discard_published(session):
+    session.info.pop('change_events_published', None)
+
+def publish(kind, ticket_id=None, user_ids=(), **payload):
+    # Record a change as part of the current transaction.
+    if user_ids:
+        payload['user_ids'] = list(user_ids)
+    publish_many([{'kind': kind, 'ticket_id': ticket_id, 'payload': payload}])
+
+def publish_many(changes):
+    # Record several changes (dicts of kind, ticket_id, payload) with one
+    # multi-row insert and a single notification.
+    if not changes:
+        return
+    db.session.execute(db.insert(ChangeEvent), changes)
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(text("SELECT pg_notify(:channel, '')"), {'channel': CHANNEL})
+    db.session.info['change_events_published'] = True
+
+def serialize_event(change):
+    return {
+        'id': change.id,
+        'kind': change.kind,
+        'ticket_id': change.ticket_id,
+        'payload': change.payload,
+        'created_at': change.created_at.isoformat() if change.created_at else None,
+    }
+
+def format_sse(change):
+    return f"id: {change.id}\nevent: {change.kind}\ndata: {json.dumps(serialize_event(change))}\n\n"
+
+def latest_event_id():
+    return db.session.scalar(db.select(db.func.max(ChangeEvent.id))) or 0
+
+def oldest_event_id():
+    return db.session.scalar(db.select(db.func.min(ChangeEvent.id)))
+
+def _settled_gaps():
+    # Gaps ("<id before>:<id after>") whose grace expired in some stream. The
+    # missing ids were rolled back and will never appear, so later streams
+    # move past them without waiting again. Shared between workers with
+    # CACHE_REDIS_URL. Kept as long as events are, since that's how far back a
+    # client can resume.
+    return get_cache('event_gaps', 1024, current_app.config['EVENTS_RETENTION_HOURS'] * 3600)
+
+def stream_events(can_see, last_event_id):
+    # Generator of SSE frames for events after last_event_id that pass
+    # can_see(event). Runs for at most EVENTS_STREAM_MAX_SECONDS; the browser's
+    # EventSource then reconnects with Last-Event-ID and resumes.
+    config = current_app.config
+    batch_size = config['EVENTS_BATCH_SIZE']
+    heartbeat = config['EVENTS_HEARTBEAT_SECONDS']
+    deadline = time.monotonic() + config['EVENTS_STREAM_MAX_SECONDS']
+    _ensure_listener()
+
+    yield f"retry: {config['EVENTS_RETRY_MS']}\n\n"
+
+    # Events older than the retention window were pruned: tell the client to
+    # reload from the REST endpoints instead of silently skipping changes.
+    oldest = oldest_event_id()
+    if last_event_id and oldest is not None and last_event_id < oldest - 1:
+        yield f"event: reset\ndata: {json.dumps({'reason': 'history_pruned'})}\n\n"
+        last_event_id = latest_event_id()
+
+    # Ids are allocated before commit, so a transaction holding id N can commit
+    # after one holding N+1. When the next id is missing, wait up to
+    # EVENTS_GAP_GRACE_SECONDS for it before assuming it was rolled back.
+    gap_grace = config['EVENTS_GAP_GRACE_SECONDS']
+    gap_seen_at = None
+    settled_gaps = _settled_gaps()
+
+    while time.monotonic() < deadline:
+        seq = broker.seq
+        changes = db.session.scalars(
+            db.select(ChangeEvent).where(ChangeEvent.id > last_event_id)
+            .order_by(ChangeEvent.id).limit(batch_size)
+        ).all()
+        held_back = False
+        for change in changes:
+            if last_event_id and change.id != last_event_id + 1:
+                gap = f"{last_event_id}:{change.id}"
+                if settled_gaps.get(gap, None) is None:
+                    gap_seen_at = gap_seen_at or time.monotonic()
+                    if time.monotonic() - gap_seen_at < gap_grace:
+                        held_back = True
+                        break
+                    settled_gaps.set(gap, 1)
+            gap_seen_at = None
+            last_event_id = change.id
+            if can_see(change):
+                yield format_sse(change)
+        # End the read transaction so no pooled connection is held while idle.
+        db.session.commit()
+
+        if held_back:
+            time.sleep(min(0.05, gap_grace))
+            continue
+        if len(changes) == batch_size:
+            continue
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        if not broker.wait(seq, min(heartbeat, remaining)):
+            yield ": keepalive\n\n"
+
+def prune_events(older_than):
+    cutoff = utcnow() - older_than
+    result = db.session.execute(db.delete(ChangeEvent).where(ChangeEvent.created_at < cutoff))
+    db.session.commit()
+    return result.rowcount
+
+def init_app(app):
+    @app.cli.command('prune-events')
+    @click.option('--hours', type=float, default=None, help='Keep this many hours of events (default EVENTS_RETENTION_HOURS).')
+    def prune_events_command(hours):
+        """Delete change events older than the retention window."""
+        hours = hours if hours is not None else current_app.config['EVENTS_RETENTION_HOURS']
+        removed = prune_events(timedelta(hours=hours))
+        click.echo(f"Removed {removed} change events older than {hours} hours.")
@@ -0,0 +1,109 @@
+import csv
+import io
+from collections import defaultdict
+from flask import current_app
+from sqlalchemy import text
+from . import db
+from .models import User, Ticket, Comment, TicketAssignment
+from .queries import visible_filter, filter_tickets
+from .schemas import ticket_schema
+
+# --------------------------------
+# Streaming export
+# --------------------------------
+# Tickets are read through a server-side cursor (yield_per / stream_results) in
+# chunks of EXPORT_CHUNK_SIZE. For each chunk the assignees and comments are
+# loaded with one query each, then the chunk is written out and dropped, so
+# memory stays flat however many tickets are exported. Plain column rows are
+# selected instead of ORM entities so nothing accumulates in the session.
+
+CSV_COLUMNS = [
+    'ticket_id', 'title', 'description', 'status', 'creator_id', 'assignees',
+    'comment_id', 'comment_author_id', 'comment_created_at', 'comment_content',
+]
+
+def export_query(user, args):
+    # Raises PaginationError on invalid filters, so call it before streaming.
+    query = db.select(Ticket.id, Ticket.title, Ticket.description, Ticket.status, Ticket.creator_id)
+    return filter_tickets(visible_filter(query, user), args).order_by(Ticket.id)
+
+def _chunks(query):
+    # Postgres: run the whole export as a read-only transaction.
+    db.session.commit()
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(text("SET TRANSACTION READ ONLY"))
+    result = db.session.execute(query, execution_options={'yield_per': current_app.config['EXPORT_CHUNK_SIZE']})
+    for tickets in result.partitions():
+        ticket_ids = [ticket.id for ticket in tickets]
+
+        assignees = defaultdict(list)
+        for row in db.session.execute(
+            db.select(TicketAssignment.ticket_id, User.id, User.username)
+            .join(User, User.id == TicketAssignment.user_id)
+            .where(TicketAssignment.ticket_id.in_(ticket_ids))
+            .order_by(TicketAssignment.ticket_id, TicketAssignment.id)
+        ):
+            assignees[row.ticket_id].append({'user_id': row.id, 'username': row.username})
+
+        comments = defaultdict(list)
+        for row in db.session.execute(
+            db.select(Comment.ticket_id, Comment.id, Comment.user_id, Comment.created_at, Comment.content)
+            .where(Comment.ticket_id.in_(ticket_ids))
+            .order_by(Comment.ticket_id, Comment.created_at, Comment.id)
+        ):
+            comments[row.ticket_id].append(row)
+
+        yield tickets, assignees, comments
+    db.session.commit()
+
+EXPORT_TICKET = ticket_schema.only('id', 'title', 'description', 'status', 'creator_id')
+
+def _ticket_record(ticket, assignees, comments):
+    return dict(
+        EXPORT_TICKET.dump(ticket),
+        assigned_users=assignees[ticket.id],
+        comments=[{
+            'id': comment.id,
+            'author_id': comment.user_id,
+            'created_at': comment.created_at.isoformat() if comment.created_at else None,
+            'content': comment.content,
+        } for comment in comments[ticket.id]],
+    )
+
+def generate_ndjson(query):
+    for tickets, assignees, comments in _chunks(query):
+        dumps = current_app.json.dumps
+        yield "".join(dumps(_ticket_record(ticket, assignees, comments)) + "\n" for ticket in tickets)
+
+def generate_csv(query):
+    # One row per comment, with the ticket columns repeated; tickets without
+    # comments get a single row with empty comment columns.
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    for tickets, assignees, comments in _chunks(query):
+        for ticket in tickets:
+            ticket_columns = [
+                ticket.id, ticket.title, ticket.description, ticket.status, ticket.creator_id,
+                ";".join(user['username'] for user in assignees[ticket.id]),
+            ]
+            rows = comments[ticket.id] or [None]
+            for comment in rows:
+                if comment is None:
+                    writer.writerow(ticket_columns + ['', '', '', ''])
+                else:
+                    writer.writerow(ticket_columns + [
+                        comment.id, comment.user_id,
+                        comment.created_at.isoformat() if comment.created_at else '', comment.content,
+                    ])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+FORMATS = {
+    'ndjson': (generate_ndjson, 'application/x-ndjson'),
+    'csv': (generate_csv, 'text/csv'),
+}
@@ -0,0 +1,391 @@
+import cProfile
+import glob
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from flask import g, request, current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger('backend.requests')
+
+# --------------------------------
+# Request instrumentation
+# --------------------------------
+# For every request this records the time spent building the response, and the
+# number and total time of its SQL statements (via engine events, so every
+# engine and bind is covered). Named sections such as password hashing can be
+# timed with `timed(name)`. The results are used in four places:
+#   - a Server-Timing header (db, hash, ..., app), visible in browser devtools
+#   - one JSON log line per request on the `backend.requests` logger, at
+#     WARNING level when slower than SLOW_REQUEST_MS
+#   - a cProfile dump in PROFILE_DIR for sampled requests that turn out slow
+#   - per-route histograms for the Prometheus /metrics endpoint
+# Streaming responses (export, events) are timed until the response starts.
+
+# Histogram bucket upper bounds, in seconds.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _query_started(conn, cursor, statement, parameters, context, executemany):
+    context._query_started = time.perf_counter()
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _query_finished(conn, cursor, statement, parameters, context, executemany):
+    started = context._query_started
+    timing = g.get('_timing') if has_app_context() else None
+    if timing is not None:
+        timing['db_queries'] += 1
+        timing['db_seconds'] += time.perf_counter() - started
+
+@contextmanager
+def timed(name):
+    # Time a section of a request; shows up as its own Server-Timing entry.
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing = g.get('_timing') if has_app_context() else None
+        if timing is not None:
+            sections = timing['sections']
+            sections[name] = sections.get(name, 0) + time.perf_counter() - started
+
+# --------------------------------
+# Metrics
+# --------------------------------
+# Each process keeps its own counters. With METRICS_DIR set (required with
+# several gunicorn workers), each process also writes them to its own file in
+# that directory every METRICS_FLUSH_SECONDS, and /metrics adds up every file,
+# so a scrape sees all workers whichever one answers it. When a worker exits,
+# gunicorn's child_exit hook folds its file into archive.json
+# (`archive_worker`), so the totals don't go backwards and recycled workers
+# (max_requests) don't leave a growing pile of files for every scrape to read.
+# Clear the directory when the server starts. Gauges (see `register_gauges`)
+# only count live workers.
+#
+# Besides the per-route series, other modules can record named counters and
+# histograms (`count`, `observe_histogram`); describe them with `describe`.
+
+_descriptions = {}
+_gauge_sources = []
+
+def describe(name, kind, text):
+    _descriptions[name] = (kind, text)
+
+def register_gauges(source):
+    # source() returns {name: value} for this process; called in app context.
+    _gauge_sources.append(source)
+
+class RouteMetrics:
+    def __init__(self):
+        self.pid = os.getpid()
+        self.filename = f"{self.pid}-{uuid.uuid4().hex[:8]}.json"
+        self.lock = threading.Lock()
+        self.routes = {}
+        self.statuses = {}
+        self.counters = {}
+        self.histograms = {}
+        self.flushed_at = 0
+
+    def observe(self, endpoint, method, status, seconds, db_queries, db_seconds):
+        key = f"{endpoint} {method}"
+        with self.lock:
+            route = self.routes.get(key)
+            if route is None:
+                route = self.routes[key] = {
+                    'buckets': [0] * len(BUCKETS), 'count': 0, 'sum': 0.0, 'db_queries': 0, 'db_seconds': 0.0,
+                }
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    route['buckets'][i] += 1
+                    break
+            route['count'] += 1
+            route['sum'] += seconds
+            route['db_queries'] += db_queries
+            route['db_seconds'] += db_seconds
+            status_key = f"{key} {status}"
+            self.statuses[status_key] = self.statuses.get(status_key, 0) + 1
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe_histogram(self, name, value, bounds):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = {'bounds': list(bounds), 'buckets': [0] * len(bounds), 'count': 0, 'sum': 0.0}
+            for i, bound in enumerate(bounds):
+                if value <= bound:
+                    histogram['buckets'][i] += 1
+                    break
+            histogram['count'] += 1
+            histogram['sum'] += value
+
+    def snapshot(self):
+        gauges = {}
+        for source in _gauge_sources:
+            gauges.update(source())
+        with self.lock:
+            return json.loads(json.dumps({
+                'pid': self.pid, 'routes': self.routes, 'statuses': self.statuses,
+                'counters': self.counters, 'histograms': self.histograms, 'gauges': gauges,
+            }))
+
+    def flush(self, directory, interval):
+        now = time.monotonic()
+        if now - self.flushed_at < interval:
+            return
+        self.flushed_at = now
+        os.makedirs(directory, exist_ok=True)
+        # Write then rename, so readers never see a partial file.
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp, os.path.join(directory, self.filename))
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+def metrics():
+    # The current process's metrics; a forked worker starts its own.
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None or _metrics.pid != os.getpid():
+            _metrics = RouteMetrics()
+        return _metrics
+
+def _merge(total, data):
+    for key, route in data['routes'].items():
+        merged = total['routes'].setdefault(key, {
+            'buckets': [0] * len(BUCKETS), 'count': 0, 'sum': 0.0, 'db_queries': 0, 'db_seconds': 0.0,
+        })
+        merged['buckets'] = [a + b for a, b in zip(merged['buckets'], route['buckets'])]
+        for field in ('count', 'sum', 'db_queries', 'db_seconds'):
+            merged[field] += route[field]
+    for key, count in data['statuses'].items():
+        total['statuses'][key] = total['statuses'].get(key, 0) + count
+    for name, value in data.get('counters', {}).items():
+        total['counters'][name] = total['counters'].get(name, 0) + value
+    for name, histogram in data.get('histograms', {}).items():
+        merged = total['histograms'].setdefault(name, {
+            'bounds': histogram['bounds'], 'buckets': [0] * len(histogram['bounds']), 'count': 0, 'sum': 0.0,
+        })
+        merged['buckets'] = [a + b for a, b in zip(merged['buckets'], histogram['buckets'])]
+        merged['count'] += histogram['count']
+        merged['sum'] += histogram['sum']
+    if _alive(data.get('pid')):
+        for name, value in data.get('gauges', {}).items():
+            total['gauges'][name] = total['gauges'].get(name, 0) + value
+
+def _alive(pid):
+    if pid is None:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+ARCHIVE = 'archive.json'
+
+def _empty_totals():
+    return {'routes': {}, 'statuses': {}, 'counters': {}, 'histograms': {}, 'gauges': {}}
+
+@contextmanager
+def _locked(directory, exclusive):
+    # Readers share the lock; archiving takes it alone, so a scrape never sees
+    # a worker's counts both in its file and in the archive, or in neither.
+    try:
+        import fcntl
+    except ImportError:
+        # Windows (development): no gunicorn, so nothing archives the files.
+        yield
+        return
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, '.lock'), 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield
+
+def _read_files(paths, total):
+    for path in paths:
+        try:
+            with open(path) as f:
+                _merge(total, json.load(f))
+        except (OSError, ValueError):
+            continue
+
+def archive_worker(directory, pid):
+    # Fold the files of the exited worker `pid` into the archive.
+    with _locked(directory, exclusive=True):
+        paths = glob.glob(os.path.join(directory, f"{pid}-*.json"))
+        if not paths:
+            return
+        archive = os.path.join(directory, ARCHIVE)
+        total = _empty_totals()
+        _read_files([archive] + paths, total)
+        total['gauges'] = {}
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(total, f)
+        os.replace(tmp, archive)
+        for path in paths:
+            os.remove(path)
+
+def collect():
+    # Counters of every worker: this process's live ones plus everyone else's
+    # files, and the archive of exited workers.
+    current = metrics()
+    total = _empty_totals()
+    _merge(total, current.snapshot())
+    directory = current_app.config['METRICS_DIR']
+    if directory:
+        with _locked(directory, exclusive=False):
+            paths = glob.glob(os.path.join(directory, '*.json'))
+            _read_files([path for path in paths if os.path.basename(path) != current.filename], total)
+    return total
+
+def _labels(**labels):
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels.items()) + "}"
+
+def render_metrics():
+    # Prometheus text exposition format.
+    data = collect()
+    routes = sorted(data['routes'].items())
+    lines = [
+        "# HELP http_request_duration_seconds Time to build the response, by route.",
+        "# TYPE http_request_duration_seconds histogram",
+    ]
+    for key, route in routes:
+        endpoint, method = key.split(" ")
+        cumulative = 0
+        for bound, count in zip(BUCKETS, route['buckets']):
+            cumulative += count
+            lines.append(f"http_request_duration_seconds_bucket{_labels(endpoint=endpoint, method=method, le=bound)} {cumulative}")
+        lines.append(f"http_request_duration_seconds_bucket{_labels(endpoint=endpoint, method=method, le='+Inf')} {route['count']}")
+        lines.append(f"http_request_duration_seconds_sum{_labels(endpoint=endpoint, method=method)} {route['sum']}")
+        lines.append(f"http_request_duration_seconds_count{_labels(endpoint=endpoint, method=method)} {route['count']}")
+
+    lines += ["# HELP http_requests_total Responses by route and status.", "# TYPE http_requests_total counter"]
+    for key, count in sorted(data['statuses'].items()):
+        endpoint, method, status = key.split(" ")
+        lines.append(f"http_requests_total{_labels(endpoint=endpoint, method=method, status=status)} {count}")
+
+    lines += ["# HELP db_queries_total SQL statements run, by route.", "# TYPE db_queries_total counter"]
+    for key, route in routes:
+        endpoint, method = key.split(" ")
+        lines.append(f"db_queries_total{_labels(endpoint=endpoint, method=method)} {route['db_queries']}")
+
+    lines += ["# HELP db_query_duration_seconds_total Time spent in SQL statements, by route.",
+              "# TYPE db_query_duration_seconds_total counter"]
+    for key, route in routes:
+        endpoint, method = key.split(" ")
+        lines.append(f"db_query_duration_seconds_total{_labels(endpoint=endpoint, method=method)} {route['db_seconds']}")
+
+    for name in sorted(set(data['counters']) | set(data['histograms']) | set(data['gauges'])):
+        kind, text = _descriptions.get(name, (None, None))
+        if text:
+            lines.append(f"# HELP {name} {text}")
+        if name in data['histograms']:
+            histogram = data['histograms'][name]
+            lines.append(f"# TYPE {name} histogram")
+            cumulative = 0
+            for bound, count in zip(histogram['bounds'], histogram['buckets']):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(le=bound)} {cumulative}")
+            lines.append(f"{name}_bucket{_labels(le='+Inf')} {histogram['count']}")
+            lines.append(f"{name}_sum {histogram['sum']}")
+            lines.append(f"{name}_count {histogram['count']}")
+        else:
+            lines.append(f"# TYPE {name} {kind or ('gauge' if name in data['gauges'] else 'counter')}")
+            lines.append(f"{name} {data['counters'].get(name, data['gauges'].get(name))}")
+    return "\n".join(lines) + "\n"
+
+# --------------------------------
+# Request hooks
+# --------------------------------
+# Only one cProfile profiler can run at a time, so at most one request per
+# process is profiled at once.
+_profiling = threading.Lock()
+
+def _start_request():
+    g._timing = {'started': time.perf_counter(), 'db_queries': 0, 'db_seconds': 0.0, 'sections': {}}
+    rate = current_app.config['PROFILE_SAMPLE_RATE']
+    if rate > 0 and random.random() < rate and _profiling.acquire(blocking=False):
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler (e.g. a debugger) is active.
+            _profiling.release()
+        else:
+            g._profiler = profiler
+
+def _finish_request(response):
+    timing = g.get('_timing')
+    if timing is None:
+        return response
+    config = current_app.config
+    seconds = time.perf_counter() - timing['started']
+    timing['seconds'] = seconds
+    endpoint = request.endpoint or 'unmatched'
+
+    if config['SERVER_TIMING']:
+        entries = [f'db;dur={timing["db_seconds"] * 1000:.1f};desc="{timing["db_queries"]} queries"']
+        entries += [f"{name};dur={value * 1000:.1f}" for name, value in timing['sections'].items()]
+        entries.append(f"app;dur={seconds * 1000:.1f}")
+        response.headers.add('Server-Timing', ", ".join(entries))
+
+    current = metrics()
+    current.observe(endpoint, request.method, response.status_code, seconds,
+                    timing['db_queries'], timing['db_seconds'])
+    if config['METRICS_DIR']:
+        current.flush(config['METRICS_DIR'], config['METRICS_FLUSH_SECONDS'])
+
+    slow = seconds * 1000 >= config['SLOW_REQUEST_MS']
+    logger.log(logging.WARNING if slow else logging.INFO, json.dumps({
+        'event': 'request',
+        'method': request.method,
+        'path': request.path,
+        'endpoint': endpoint,
+        'status': response.status_code,
+        'duration_ms': round(seconds * 1000, 2),
+        'db_queries': timing['db_queries'],
+        'db_ms': round(timing['db_seconds'] * 1000, 2),
+        **{f'{name}_ms': round(value * 1000, 2) for name, value in timing['sections'].items()},
+        'slow': slow,
+    }))
+    return response
+
+def _stop_profiler(exc):
+    profiler = g.pop('_profiler', None)
+    if profiler is None:
+        return
+    profiler.disable()
+    _profiling.release()
+    timing = g.get('_timing') or {}
+    seconds = timing.get('seconds', 0)
+    if seconds * 1000 < current_app.config['SLOW_REQUEST_MS']:
+        return
+    directory = current_app.config['PROFILE_DIR']
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')
+    path = os.path.join(directory, f"{stamp}-{request.endpoint or 'unmatched'}-{seconds * 1000:.0f}ms-{os.getpid()}.prof")
+    profiler.dump_stats(path)
+    logger.warning(json.dumps({'event': 'profile', 'path': request.path, 'profile': path}))
+
+def init_app(app):
+    if not app.config['INSTRUMENTATION']:
+        return
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_stop_profiler)
@@ -0,0 +1,172 @@
+import logging
+import os
+import random
+import signal
+import socket
+import time
+import traceback
+from datetime import timedelta
+import click
+from flask import current_app
+from . import db
+from .models import Job, utcnow
+
+logger = logging.getLogger(__name__)
+
+# --------------------------------
+# Background jobs
+# --------------------------------
+# Slow work (large cascading deletes, counter rebuilds, reindexing) is queued as
+# a row in the jobs table and run by a separate `flask worker` process. The
+# request only pays for an INSERT and answers 202 with the job, whose progress
+# is at GET /api/jobs/<id>.
+#
+# `enqueue` adds the job to the current transaction, so workers only see it if
+# the request commits. Workers claim due jobs with SELECT ... FOR UPDATE SKIP
+# LOCKED: any number of them can poll the table without handing out a job
+# twice or waiting on each other's row locks. When a handler raises, the job is
+# retried after JOBS_BACKOFF_SECONDS, doubling with each attempt up to
+# JOBS_BACKOFF_MAX_SECONDS, until it has run max_attempts times. A job left
+# 'running' by a worker that died is claimed again after JOBS_LEASE_SECONDS.
+# Handlers can therefore run more than once and must be idempotent (deleting
+# something already deleted is a no-op).
+#
+# Handlers are registered with @task(kind) (see tasks.py). They get the payload
+# as keyword arguments, commit their own work, and may return a JSON result
+# that is stored on the job. Routes can also call them directly to do small
+# amounts of the same work inline.
+
+HANDLERS = {}
+
+def task(kind):
+    def decorator(f):
+        HANDLERS[kind] = f
+        return f
+    return decorator
+
+def enqueue(kind, payload=None, created_by=None, max_attempts=None, delay=0):
+    # Queue a job as part of the current transaction; commit to release it.
+    if kind not in HANDLERS:
+        raise ValueError(f"Unknown job kind {kind!r}")
+    job = Job(
+        kind=kind,
+        payload=payload or {},
+        status='queued',
+        attempts=0,
+        max_attempts=max_attempts or current_app.config['JOBS_MAX_ATTEMPTS'],
+        run_at=utcnow() + timedelta(seconds=delay),
+        created_by=created_by,
+    )
+    db.session.add(job)
+    db.session.flush()
+    return job
+
+def backoff(attempts):
+    # Seconds before retrying after the given number of failed attempts, with
+    # jitter so jobs that failed together don't all retry together.
+    config = current_app.config
+    delay = min(config['JOBS_BACKOFF_SECONDS'] * 2 ** (attempts - 1), config['JOBS_BACKOFF_MAX_SECONDS'])
+    return delay * random.uniform(0.5, 1.0)
+
+def claim(worker_id):
+    # The next due job, marked running for this worker, or None.
+    now = utcnow()
+    expired = now - timedelta(seconds=current_app.config['JOBS_LEASE_SECONDS'])
+    job = db.session.scalars(
+        db.select(Job)
+        .where(db.or_(
+            db.and_(Job.status == 'queued', Job.run_at <= now),
+            db.and_(Job.status == 'running', Job.locked_at < expired),
+        ))
+        .order_by(Job.run_at, Job.id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    ).first()
+    if job is not None:
+        job.status = 'running'
+        job.attempts += 1
+        job.locked_at = now
+        job.locked_by = worker_id
+    db.session.commit()
+    return job
+
+def run(job):
+    # Run a claimed job and record the outcome.
+    started = time.monotonic()
+    try:
+        handler = HANDLERS.get(job.kind)
+        if handler is None:
+            raise LookupError(f"No handler for job kind {job.kind!r}")
+        if job.attempts > job.max_attempts:
+            raise RuntimeError("Worker lease expired on the last attempt")
+        result = handler(**job.payload)
+    except Exception:
+        db.session.rollback()
+        job.error = traceback.format_exc()
+        if job.attempts >= job.max_attempts:
+            job.status = 'failed'
+            job.finished_at = utcnow()
+            logger.error("Job %s (%s) failed after %d attempts", job.id, job.kind, job.attempts, exc_info=True)
+        else:
+            job.status = 'queued'
+            job.run_at = utcnow() + timedelta(seconds=backoff(job.attempts))
+            logger.warning("Job %s (%s) failed, retrying at %s", job.id, job.kind, job.run_at, exc_info=True)
+    else:
+        job.status = 'succeeded'
+        job.result = result
+        job.error = None
+        job.finished_at = utcnow()
+        logger.info("Job %s (%s) done in %.2fs", job.id, job.kind, time.monotonic() - started)
+    job.locked_at = None
+    job.locked_by = None
+    db.session.commit()
+    return job
+
+def work(burst=False, should_stop=lambda: False):
+    # Claim and run jobs until should_stop(), or with burst=True until none are
+    # due. Returns the number of jobs run.
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    poll = current_app.config['JOBS_POLL_SECONDS']
+    processed = 0
+    while not should_stop():
+        job = claim(worker_id)
+        if job is None:
+            if burst:
+                break
+            time.sleep(poll)
+            continue
+        run(job)
+        processed += 1
+    return processed
+
+def prune_jobs(older_than):
+    cutoff = utcnow() - older_than
+    result = db.session.execute(
+        db.delete(Job).where(Job.status.in_(('succeeded', 'failed')), Job.finished_at < cutoff)
+    )
+    db.session.commit()
+    return result.rowcount
+
+def init_app(app):
+    from . import tasks  # registers the handlers
+
+    @app.cli.command('worker')
+    @click.option('--burst', is_flag=True, help='Exit once no jobs are due instead of polling.')
+    def worker_command(burst):
+        """Run queued background jobs."""
+        stopping = []
+        def stop(signum, frame):
+            # Finish the current job, then exit.
+            stopping.append(signum)
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        processed = work(burst=burst, should_stop=lambda: bool(stopping))
+        click.echo(f"Ran {processed} jobs.")
+
+    @app.cli.command('prune-jobs')
+    @click.option('--days', type=float, default=None, help='Keep finished jobs this many days (default JOBS_RETENTION_DAYS).')
+    def prune_jobs_command(days):
+        """Delete finished jobs older than the retention window."""
+        days = days if days is not None else current_app.config['JOBS_RETENTION_DAYS']
+        removed = prune_jobs(timedelta(days=days))
+        click.echo(f"Removed {removed} jobs finished more than {days} days ago.")
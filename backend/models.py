@@ -1,45 +1,129 @@
+from datetime import datetime, timezone
 from . import db
 from flask_login import UserMixin
 
+# Timestamps are generated in Python (naive UTC) rather than by the database so
+# they round-trip with a consistent format, which keyset cursors rely on.
+def utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
 class User(db.Model, UserMixin):
     __tablename__ = 'users'
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(150), unique=True, nullable=False)
-    password = db.Column(db.String(150), nullable=False)
+    password = db.Column(db.String(255), nullable=False)  # scrypt hashes are 162 characters
     role = db.Column(db.String(50), nullable=False)  # e.g., 'admin' or 'regular'
     
-    # Tickets created by this user (if they are an admin)
-    created_tickets = db.relationship('Ticket', foreign_keys='Ticket.creator_id', backref='creator', lazy=True)
-    comments = db.relationship('Comment', backref='user', lazy=True)
+    # Tickets created by this user (if they are an admin). Never loaded or
+    # changed on delete: the database refuses to delete a user who still owns
+    # tickets.
+    created_tickets = db.relationship('Ticket', foreign_keys='Ticket.creator_id', backref='creator', lazy=True, passive_deletes='all')
+    # Comments and assignments are removed by the database (ON DELETE CASCADE)
+    # when their user or ticket is deleted; passive_deletes stops SQLAlchemy
+    # from loading them to delete them one by one first.
+    comments = db.relationship('Comment', backref='user', cascade="all, delete", passive_deletes=True, lazy=True)
 
 class Ticket(db.Model):
     __tablename__ = 'tickets'
+    __table_args__ = (
+        # Listing filters: ?creator_id= and ?status=
+        db.Index('ix_tickets_creator_id_status', 'creator_id', 'status'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
     description = db.Column(db.String(255))
     status = db.Column(db.String(50), default='Open')
     # The admin who created the ticket.
     creator_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    # Bumped (see etag.touch_tickets) whenever the ticket, its assignments or
+    # its comments change; ETags for ticket and comment reads derive from it.
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    updated_at = db.Column(db.DateTime, default=utcnow, onupdate=utcnow)
+    # Denormalized for listings and dashboards, so they don't count comments
+    # and assignments per ticket. Kept in step by touch_tickets(comments=,
+    # assignees=) in the same transaction as the change itself.
+    comment_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    assignee_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    last_activity_at = db.Column(db.DateTime, default=utcnow)
     
     # A ticket may have many comments.
-    comments = db.relationship('Comment', backref='ticket', lazy=True)
+    comments = db.relationship('Comment', backref='ticket', cascade="all, delete", passive_deletes=True, lazy=True)
     
     # The ticket assignments (many-to-many-like relationship)
-    assignments = db.relationship('TicketAssignment', backref='ticket', cascade="all, delete-orphan", lazy=True)
+    assignments = db.relationship('TicketAssignment', backref='ticket', cascade="all, delete-orphan", passive_deletes=True, lazy=True, order_by='TicketAssignment.id')
 
 class TicketAssignment(db.Model):
     __tablename__ = 'ticket_assignments'
+    __table_args__ = (
+        # Access checks look up (ticket_id, user_id); a user can only be assigned once.
+        db.Index('ix_ticket_assignments_ticket_id_user_id', 'ticket_id', 'user_id', unique=True),
+        # "Which tickets can this user see" starts from the user.
+        db.Index('ix_ticket_assignments_user_id', 'user_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
-    ticket_id = db.Column(db.Integer, db.ForeignKey('tickets.id'), nullable=False)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    ticket_id = db.Column(db.Integer, db.ForeignKey('tickets.id', ondelete='CASCADE'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     
     # Establish a relationship so that each assignment knows its user.
-    user = db.relationship("User", backref=db.backref("ticket_assignments", cascade="all, delete-orphan", lazy=True))
+    user = db.relationship("User", backref=db.backref("ticket_assignments", cascade="all, delete-orphan", passive_deletes=True, lazy=True))
 
 class Comment(db.Model):
     __tablename__ = 'comments'
+    __table_args__ = (
+        # Comment listings are keyset paginated on (created_at, id) per ticket.
+        db.Index('ix_comments_ticket_id_created_at_id', 'ticket_id', 'created_at', 'id'),
+        db.Index('ix_comments_user_id', 'user_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     content = db.Column(db.Text, nullable=False)
-    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
-    ticket_id = db.Column(db.Integer, db.ForeignKey('tickets.id'), nullable=False)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    created_at = db.Column(db.DateTime, default=utcnow)
+    updated_at = db.Column(db.DateTime, default=utcnow, onupdate=utcnow)
+    ticket_id = db.Column(db.Integer, db.ForeignKey('tickets.id', ondelete='CASCADE'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+
+class ChangeEvent(db.Model):
+    # Append-only log of ticket/comment/assignment changes, streamed to clients
+    # by /api/events. ticket_id is not a foreign key so events about deleted
+    # tickets survive; user_ids lists users who must see the event even if they
+    # can no longer see the ticket (e.g. they were just unassigned).
+    __tablename__ = 'change_events'
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    ticket_id = db.Column(db.Integer, index=True)
+    payload = db.Column(db.JSON, nullable=False, default=dict)
+    created_at = db.Column(db.DateTime, default=utcnow, index=True)
+
+class Job(db.Model):
+    # Work queued for `flask worker` (see jobs.py). created_by is not a foreign
+    # key so a job (e.g. deleting a user) outlives the user who queued it.
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        # Workers claim the next due job: WHERE status = 'queued' ORDER BY run_at.
+        db.Index('ix_jobs_status_run_at', 'status', 'run_at'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.JSON, nullable=False, default=dict)
+    # queued -> running -> succeeded, or back to queued to retry, or failed
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False)
+    run_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+    locked_at = db.Column(db.DateTime)
+    locked_by = db.Column(db.String(100))
+    result = db.Column(db.JSON)
+    error = db.Column(db.Text)
+    created_by = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, default=utcnow)
+    finished_at = db.Column(db.DateTime)
+
+# Full-text search on Postgres (see search.py): GIN indexes over these
+# expressions, which Postgres keeps up to date on every write. Queries must use
+# the exact same expressions for the planner to pick the indexes.
+SEARCH_CONFIG = db.literal_column("'english'::regconfig")
+ticket_search_vector = db.func.to_tsvector(
+    SEARCH_CONFIG, db.func.coalesce(Ticket.title, '') + ' ' + db.func.coalesce(Ticket.description, '')
+)
+comment_search_vector = db.func.to_tsvector(SEARCH_CONFIG, Comment.content)
+db.Index('ix_tickets_search', ticket_search_vector, postgresql_using='gin').ddl_if(dialect='postgresql')
+db.Index('ix_comments_search', comment_search_vector, postgresql_using='gin').ddl_if(dialect='postgresql')
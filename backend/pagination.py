@@ -0,0 +1,113 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from flask import current_app as app
+from sqlalchemy import tuple_, DateTime
+
+# --------------------------------
+# Keyset (cursor) pagination
+# --------------------------------
+# Pages are addressed by the sort key of the last row the client saw, never by
+# an offset, so page 1000 costs the same index range scan as page 1. The cursor
+# handed to clients is opaque: base64 of the sort name and the key values.
+
+class PaginationError(ValueError):
+    pass
+
+class Sort:
+    # A named ordering for a listing. `columns` must end with a unique column
+    # (the primary key) so that the ordering is total.
+    def __init__(self, name, columns, key_of, descending=False):
+        self.name = name
+        self.columns = columns
+        self.key_of = key_of
+        self.descending = descending
+
+def encode_cursor(sort, row):
+    values = [v.isoformat() if isinstance(v, datetime) else v for v in sort.key_of(row)]
+    raw = json.dumps({"s": sort.name, "k": values}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(sort, cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+        values = data["k"]
+        if data["s"] != sort.name or len(values) != len(sort.columns):
+            raise PaginationError("Cursor does not match the requested sort")
+        return [
+            datetime.fromisoformat(v) if isinstance(col.type, DateTime) and v is not None else v
+            for col, v in zip(sort.columns, values)
+        ]
+    except PaginationError:
+        raise
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise PaginationError("Invalid cursor")
+
+def parse_sort(args, sorts, default):
+    name = args.get('sort', default)
+    descending = name.startswith('-')
+    base = sorts.get(name.lstrip('-'))
+    if base is None:
+        raise PaginationError(f"Unsupported sort '{name}'. Use one of: {', '.join(sorted(sorts))}")
+    return Sort(name, base.columns, base.key_of, descending)
+
+def parse_limit(args):
+    default = app.config['PAGE_SIZE_DEFAULT']
+    cap = app.config['PAGE_SIZE_MAX']
+    try:
+        limit = int(args.get('limit', default))
+    except ValueError:
+        raise PaginationError("limit must be an integer")
+    if limit < 1:
+        raise PaginationError("limit must be at least 1")
+    return min(limit, cap)
+
+def int_arg(args, name):
+    value = args.get(name)
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise PaginationError(f"{name} must be an integer")
+
+def int_list_arg(args, name):
+    # ?name=1,2,3 as a list of at most PAGE_SIZE_MAX integers.
+    value = args.get(name)
+    if value is None:
+        return None
+    try:
+        values = [int(part) for part in value.split(',') if part.strip()]
+    except ValueError:
+        raise PaginationError(f"{name} must be a comma-separated list of integers")
+    if len(values) > app.config['PAGE_SIZE_MAX']:
+        raise PaginationError(f"{name} accepts at most {app.config['PAGE_SIZE_MAX']} values")
+    return values
+
+# With LEGACY_LISTINGS on, a request without limit/cursor gets the original
+# un-paginated array so existing clients keep working.
+def wants_page(args):
+    return not app.config['LEGACY_LISTINGS'] or 'limit' in args or 'cursor' in args
+
+def ordered(query, sort):
+    return query.order_by(*[col.desc() if sort.descending else col.asc() for col in sort.columns])
+
+def keyset_page(query, sort, args):
+    limit = parse_limit(args)
+    cursor = args.get('cursor')
+    if cursor:
+        values = decode_cursor(sort, cursor)
+        if len(sort.columns) == 1:
+            key, after = sort.columns[0], values[0]
+        else:
+            key, after = tuple_(*sort.columns), tuple_(*values)
+        query = query.filter(key < after if sort.descending else key > after)
+
+    rows = ordered(query, sort).limit(limit + 1).all()
+    next_cursor = encode_cursor(sort, rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+def page_body(items, next_cursor):
+    return {"items": items, "next_cursor": next_cursor}
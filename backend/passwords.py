@@ -0,0 +1,169 @@
+import math
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app, request
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+from .cache import get_cache
+from .instrumentation import metrics, describe
+
+# --------------------------------
+# Password hashing
+# --------------------------------
+# PASSWORD_HASH_METHOD picks the algorithm and its cost:
+#   scrypt:N:r:p                             e.g. scrypt:32768:8:1 (default)
+#   pbkdf2:sha256:iterations                 e.g. pbkdf2:sha256:600000
+#   argon2:time_cost:memory_kib:parallelism  e.g. argon2:3:65536:4 (needs argon2-cffi)
+# Hashes stored with other settings keep working. On the user's next successful
+# login they are re-hashed with the current ones, so a cost change rolls out
+# gradually without a migration.
+#
+# Hashing is CPU-bound, so it runs on PASSWORD_HASH_THREADS native threads per
+# worker. hashlib and argon2 release the GIL while they work, so other requests
+# keep being served meanwhile; under gevent the hash runs on gevent's own thread
+# pool and only the waiting greenlet blocks. At most PASSWORD_HASH_QUEUE more
+# hashes wait for a thread. Beyond that, logins and registrations get a 503
+# instead of piling up behind each other.
+#
+# Failed logins are counted per username and per client IP for
+# LOGIN_THROTTLE_SECONDS (in the 'login_failures' cache: per worker, or shared
+# with CACHE_REDIS_URL). Past the limit, logins are refused with 429 before any
+# hashing is done.
+
+describe('auth_password_rehashed_total', 'counter', "Stored password hashes upgraded to the current settings at login.")
+describe('auth_hash_rejected_total', 'counter', "Logins and registrations refused because the hashing queue was full.")
+describe('auth_login_throttled_total', 'counter', "Logins refused after too many failures for the username or IP.")
+
+class HashingBusy(Exception):
+    pass
+
+def _gevent_patched():
+    if 'gevent' not in sys.modules:
+        return False
+    from gevent import monkey
+    return monkey.is_module_patched('threading')
+
+class HashExecutor:
+    def __init__(self, threads, queue):
+        self.slots = threading.BoundedSemaphore(threads + queue)
+        if _gevent_patched():
+            from gevent.threadpool import ThreadPool
+            self._call = ThreadPool(threads).apply
+        else:
+            pool = ThreadPoolExecutor(threads, thread_name_prefix='password-hash')
+            self._call = lambda fn, args: pool.submit(fn, *args).result()
+
+    def run(self, fn, *args):
+        if not self.slots.acquire(blocking=False):
+            metrics().count('auth_hash_rejected_total')
+            raise HashingBusy()
+        try:
+            return self._call(fn, args)
+        finally:
+            self.slots.release()
+
+_executor = None
+
+def _hash_executor():
+    # One per process; a forked worker must not reuse its parent's threads.
+    global _executor
+    if _executor is None or _executor[0] != os.getpid():
+        config = current_app.config
+        _executor = (os.getpid(), HashExecutor(config['PASSWORD_HASH_THREADS'], config['PASSWORD_HASH_QUEUE']))
+    return _executor[1]
+
+def _argon2(method):
+    from argon2 import PasswordHasher  # optional dependency, only needed for argon2 methods
+    _, time_cost, memory_cost, parallelism = method.split(':')
+    return PasswordHasher(time_cost=int(time_cost), memory_cost=int(memory_cost), parallelism=int(parallelism))
+
+def _canonical(method):
+    # The method as werkzeug writes it into a hash, with its defaults filled in.
+    name, *args = method.split(':')
+    if name == 'scrypt':
+        defaults = ['32768', '8', '1']
+    elif name == 'pbkdf2':
+        defaults = ['sha256', str(DEFAULT_PBKDF2_ITERATIONS)]
+    else:
+        return method
+    return ':'.join([name] + args + defaults[len(args):])
+
+def _hash(password, method, salt_length):
+    if method.startswith('argon2'):
+        return _argon2(method).hash(password)
+    return generate_password_hash(password, method=method, salt_length=salt_length)
+
+def _verify(stored, password):
+    if stored.startswith('$argon2'):
+        from argon2 import PasswordHasher
+        from argon2.exceptions import VerificationError, InvalidHashError
+        try:
+            return PasswordHasher().verify(stored, password)
+        except (VerificationError, InvalidHashError):
+            return False
+    return check_password_hash(stored, password)
+
+def needs_rehash(stored):
+    method = current_app.config['PASSWORD_HASH_METHOD']
+    if method.startswith('argon2'):
+        return not stored.startswith('$argon2') or _argon2(method).check_needs_rehash(stored)
+    stored_method, _, rest = stored.partition('$')
+    salt = rest.partition('$')[0]
+    return stored_method != _canonical(method) or len(salt) < current_app.config['PASSWORD_SALT_LENGTH']
+
+def hash_password(password):
+    # Raises HashingBusy when the hashing queue is full.
+    config = current_app.config
+    return _hash_executor().run(_hash, password, config['PASSWORD_HASH_METHOD'], config['PASSWORD_SALT_LENGTH'])
+
+def verify_password(user, password):
+    # Checks password against user.password, upgrading the stored hash to the
+    # current settings when it matches (the caller commits). Raises HashingBusy.
+    if not _hash_executor().run(_verify, user.password, password):
+        return False
+    if needs_rehash(user.password):
+        user.password = hash_password(password)
+        metrics().count('auth_password_rehashed_total')
+    return True
+
+# --------------------------------
+# Login throttling
+# --------------------------------
+
+def _failures():
+    config = current_app.config
+    return get_cache('login_failures', config['LOGIN_THROTTLE_SIZE'], config['LOGIN_THROTTLE_SECONDS'])
+
+def _throttle_keys(username):
+    config = current_app.config
+    return (
+        (f"user:{username}", config['LOGIN_MAX_FAILURES']),
+        (f"ip:{request.remote_addr}", config['LOGIN_MAX_FAILURES_PER_IP']),
+    )
+
+def login_retry_after(username):
+    # Seconds until this username and client may try again; 0 if they may now.
+    window = current_app.config['LOGIN_THROTTLE_SECONDS']
+    if window <= 0:
+        return 0
+    failures = _failures()
+    for key, limit in _throttle_keys(username):
+        count, last = failures.get(key, (0, 0))
+        if count >= limit:
+            metrics().count('auth_login_throttled_total')
+            return max(1, math.ceil(last + window - time.time()))
+    return 0
+
+def record_login_failure(username):
+    if current_app.config['LOGIN_THROTTLE_SECONDS'] <= 0:
+        return
+    failures = _failures()
+    for key, _ in _throttle_keys(username):
+        count, _ = failures.get(key, (0, 0))
+        failures.set(key, (count + 1, time.time()))
+
+def clear_login_failures(username):
+    if current_app.config['LOGIN_THROTTLE_SECONDS'] > 0:
+        _failures().delete(f"user:{username}")
@@ -0,0 +1,146 @@
+import os
+import sqlite3
+import time
+import weakref
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import Pool, QueuePool, NullPool
+from . import db
+from .instrumentation import metrics, timed, describe, register_gauges
+
+# --------------------------------
+# Connection pool
+# --------------------------------
+# Engine options come from the DB_* settings in Config (see there). Each gunicorn
+# worker has its own pool, so the database sees up to
+# workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) connections.
+#
+# DB_PGBOUNCER=true is for PgBouncer in transaction pooling mode, where
+# consecutive transactions may run on different server connections. Session
+# state can't be relied on there:
+#   - the statement timeout is set per transaction (SET LOCAL) instead of as a
+#     startup option, which PgBouncer would reject
+#   - LISTEN for the change feed needs a direct connection (EVENTS_DATABASE_URI)
+# DB_POOL_SIZE=0 disables the app-side pool (NullPool), leaving pooling to
+# PgBouncer entirely.
+
+# Pool wait bucket upper bounds, in seconds.
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+describe('db_pool_wait_seconds', 'histogram', "Time spent waiting to check out a pooled connection.")
+describe('db_pool_timeouts_total', 'counter', "Checkouts that gave up after DB_POOL_TIMEOUT.")
+describe('db_pool_connections_opened_total', 'counter', "New database connections opened.")
+describe('db_pool_invalidated_total', 'counter', "Connections discarded as stale or broken (e.g. by pre-ping).")
+describe('db_pool_checked_out', 'gauge', "Connections currently checked out, over live workers.")
+describe('db_pool_idle', 'gauge', "Idle connections held by the pools of live workers.")
+describe('db_pool_overflow', 'gauge', "Connections open beyond DB_POOL_SIZE, over live workers.")
+
+class InstrumentedQueuePool(QueuePool):
+    # QueuePool that records how long each checkout waits for a connection.
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            with timed('pool'):
+                return super()._do_get()
+        except PoolTimeoutError:
+            metrics().count('db_pool_timeouts_total')
+            raise
+        finally:
+            metrics().observe_histogram('db_pool_wait_seconds', time.perf_counter() - started, WAIT_BUCKETS)
+
+@event.listens_for(Pool, 'connect')
+def _connection_opened(dbapi_connection, connection_record):
+    metrics().count('db_pool_connections_opened_total')
+
+@event.listens_for(Pool, 'invalidate')
+def _connection_invalidated(dbapi_connection, connection_record, exception):
+    metrics().count('db_pool_invalidated_total')
+
+@event.listens_for(Engine, 'connect')
+def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    # SQLite (tests, dev) only enforces foreign keys, and so ON DELETE CASCADE,
+    # when asked to on each connection.
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys = ON")
+        cursor.close()
+
+def engine_options(config):
+    # SQLALCHEMY_ENGINE_OPTIONS for the configured database.
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    if url.get_backend_name() == 'sqlite':
+        # Flask-SQLAlchemy picks the right pool for SQLite files and :memory:.
+        return {}
+
+    if config['DB_POOL_SIZE'] <= 0:
+        options = {'poolclass': NullPool}
+    else:
+        options = {
+            'poolclass': InstrumentedQueuePool,
+            'pool_size': config['DB_POOL_SIZE'],
+            'max_overflow': config['DB_MAX_OVERFLOW'],
+            'pool_timeout': config['DB_POOL_TIMEOUT'],
+            'pool_recycle': config['DB_POOL_RECYCLE'],
+        }
+    options['pool_pre_ping'] = config['DB_POOL_PRE_PING']
+
+    timeout = config['DB_STATEMENT_TIMEOUT_MS']
+    if timeout and url.get_backend_name() == 'postgresql' and not config['DB_PGBOUNCER']:
+        options['connect_args'] = {'options': f"-c statement_timeout={int(timeout)}"}
+    return options
+
+def _pool_gauges():
+    # Summed over this process's engines (the primary, any binds and replicas).
+    checked_out = idle = overflow = 0
+    replicas = [replica.engine for replica in current_app.extensions.get('replicas', ())]
+    for engine in list(db.engines.values()) + replicas:
+        pool = engine.pool
+        if isinstance(pool, QueuePool):
+            checked_out += pool.checkedout()
+            idle += pool.checkedin()
+            overflow += max(pool.overflow(), 0)
+    return {'db_pool_checked_out': checked_out, 'db_pool_idle': idle, 'db_pool_overflow': overflow}
+
+register_gauges(_pool_gauges)
+
+# --------------------------------
+# Forking
+# --------------------------------
+# With gunicorn's preload_app (see gunicorn.conf.py) the app and its engines
+# are created once in the master and inherited by every forked worker. A
+# connection opened before the fork would then be shared by all of them, each
+# reading the others' replies off the same socket. After a fork the child drops
+# its copies of the pools without closing them (close=False leaves the parent's
+# connections alone) and opens its own on first use.
+_apps = weakref.WeakSet()
+
+def dispose_engines(app, close=True):
+    with app.app_context():
+        replicas = [replica.engine for replica in app.extensions.get('replicas', ())]
+        for engine in list(db.engines.values()) + replicas:
+            engine.dispose(close=close)
+
+def _dispose_after_fork():
+    for app in list(_apps):
+        dispose_engines(app, close=False)
+
+if hasattr(os, 'register_at_fork'):  # not on Windows, which can't fork
+    os.register_at_fork(after_in_child=_dispose_after_fork)
+
+def init_app(app):
+    _apps.add(app)
+    timeout = app.config['DB_STATEMENT_TIMEOUT_MS']
+    if not (app.config['DB_PGBOUNCER'] and timeout):
+        return
+    with app.app_context():
+        replicas = [replica.engine for replica in app.extensions.get('replicas', ())]
+        for engine in list(db.engines.values()) + replicas:
+            if engine.dialect.name != 'postgresql':
+                continue
+
+            @event.listens_for(engine, 'begin')
+            def _set_statement_timeout(conn):
+                conn.exec_driver_sql(f"SET LOCAL statement_timeout = {int(timeout)}")
@@ -0,0 +1,102 @@
+from sqlalchemy import func, select, literal, union_all, Integer
+from sqlalchemy.orm import selectinload, contains_eager
+from . import db
+from .models import User, Ticket, Comment, TicketAssignment
+from .pagination import Sort, int_arg, int_list_arg
+
+# --------------------------------
+# Ticket queries
+# --------------------------------
+# Tickets are always loaded together with their assignments and the assignee
+# usernames, so listing N tickets costs a constant number of queries
+# (one for the tickets, one for all of their assignments + users) instead
+# of one query per ticket and one lazy load per assignment.
+
+def ticket_query():
+    return Ticket.query.options(
+        selectinload(Ticket.assignments)
+        .joinedload(TicketAssignment.user)
+        .load_only(User.id, User.username)
+    )
+
+# Admins see all tickets; standard users only see tickets they are assigned to.
+def visible_filter(query, user):
+    if user.role != "admin":
+        query = query.filter(Ticket.assignments.any(TicketAssignment.user_id == user.id))
+    return query
+
+def visible_tickets(user):
+    return visible_filter(ticket_query(), user)
+
+# Server-side filters shared by the ticket listings. ?ids=1,2,3 turns a listing
+# into a batch lookup; tickets the user can't see are left out.
+def filter_tickets(query, args):
+    ids = int_list_arg(args, 'ids')
+    status = args.get('status')
+    creator_id = int_arg(args, 'creator_id')
+    assignee_id = int_arg(args, 'assignee')
+    if ids is not None:
+        query = query.filter(Ticket.id.in_(ids))
+    if status is not None:
+        query = query.filter(Ticket.status == status)
+    if creator_id is not None:
+        query = query.filter(Ticket.creator_id == creator_id)
+    if assignee_id is not None:
+        query = query.filter(Ticket.assignments.any(TicketAssignment.user_id == assignee_id))
+    return query
+
+# Sorts always end in the primary key so keyset pagination has a total order.
+# A "-" prefix on the sort name (e.g. ?sort=-id) reverses it.
+TICKET_SORTS = {
+    'id': Sort('id', [Ticket.id], lambda t: [t.id]),
+    'status': Sort('status', [func.coalesce(Ticket.status, ''), Ticket.id], lambda t: [t.status or '', t.id]),
+    'creator_id': Sort('creator_id', [Ticket.creator_id, Ticket.id], lambda t: [t.creator_id, t.id]),
+}
+
+# Ticket counts by status, creator and assignee over the visible tickets
+# matching the listing filters, in one round-trip: the three GROUP BYs run over
+# the same CTE and come back as one UNION ALL.
+def ticket_summary(user, args):
+    visible = filter_tickets(
+        visible_filter(select(Ticket.id, Ticket.status, Ticket.creator_id), user), args
+    ).cte('visible')
+    no_user = literal(None, Integer)
+    by_status = (
+        select(literal('status'), visible.c.status, no_user, func.count())
+        .group_by(visible.c.status)
+    )
+    by_creator = (
+        select(literal('creator'), User.username, User.id, func.count())
+        .join_from(visible, User, User.id == visible.c.creator_id)
+        .group_by(User.id, User.username)
+    )
+    by_assignee = (
+        select(literal('assignee'), User.username, User.id, func.count())
+        .join_from(visible, TicketAssignment, TicketAssignment.ticket_id == visible.c.id)
+        .join(User, User.id == TicketAssignment.user_id)
+        .group_by(User.id, User.username)
+    )
+    summary = {'total': 0, 'by_status': [], 'by_creator': [], 'by_assignee': []}
+    for kind, name, user_id, count in db.session.execute(union_all(by_status, by_creator, by_assignee)):
+        if kind == 'status':
+            summary['total'] += count
+            summary['by_status'].append({'status': name, 'count': count})
+        else:
+            summary['by_' + kind].append({'user_id': user_id, 'username': name, 'count': count})
+    for key in ('by_status', 'by_creator', 'by_assignee'):
+        summary[key].sort(key=lambda row: -row['count'])
+    return summary
+
+COMMENT_SORTS = {
+    'created_at': Sort('created_at', [Comment.created_at, Comment.id], lambda c: [c.created_at, c.id]),
+    'id': Sort('id', [Comment.id], lambda c: [c.id]),
+}
+
+# Comments come with their author's username, joined in the same query, so
+# clients don't look up each author.
+def comment_query(ticket_id):
+    return (
+        Comment.query.join(Comment.user)
+        .options(contains_eager(Comment.user).load_only(User.id, User.username))
+        .filter(Comment.ticket_id == ticket_id)
+    )
@@ -0,0 +1,181 @@
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, request, jsonify
+from flask_login import current_user
+from .instrumentation import metrics, describe
+
+logger = logging.getLogger(__name__)
+
+# --------------------------------
+# Rate limiting and admission control
+# --------------------------------
+# Every request takes a token from a bucket keyed by endpoint and client: the
+# user id when logged in, otherwise the IP. Buckets refill continuously at the
+# limit's rate up to its burst, so short bursts go through but a script
+# polling in a loop is held to the rate. Past the limit, requests get 429 with
+# Retry-After (the seconds until a token is available).
+#
+# Limits are written "N/second", "N/minute" or "N/hour", optionally followed
+# by " burst M" (default M = N):
+#   RATELIMIT_DEFAULT           endpoints without a limit of their own
+#   @rate_limit("...")          a view's own limit, put directly above the def
+#   RATELIMIT_ROUTES            {endpoint: limit}, overriding both; None
+#                               exempts the endpoint
+# Buckets live in each worker's memory, so with N workers a client gets up to
+# N times the limit. Set RATELIMIT_REDIS_URL (defaults to CACHE_REDIS_URL) to
+# share them between workers. If Redis is unreachable, requests are let
+# through.
+#
+# Admission control: nginx stamps each request with X-Request-Start. A request
+# that already waited longer than ADMISSION_QUEUE_BUDGET_MS in front of the app
+# (nginx, the gunicorn backlog) is refused with 429 straight away. Its client
+# has probably given up, and answering it would only delay everyone queued
+# behind it.
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600}
+
+# Queue time bucket upper bounds, in seconds.
+QUEUE_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+describe('ratelimit_rejected_total', 'counter', "Requests refused with 429 for exceeding their rate limit.")
+describe('admission_rejected_total', 'counter', "Requests refused with 429 for queueing longer than ADMISSION_QUEUE_BUDGET_MS.")
+describe('request_queue_seconds', 'histogram', "Time requests waited between nginx and the app (X-Request-Start).")
+
+class Limit:
+    def __init__(self, spec):
+        try:
+            rate, _, burst = spec.partition(' burst ')
+            count, period = rate.strip().split('/')
+            self.rate = int(count) / PERIODS[period.strip().rstrip('s')]
+            self.burst = int(burst) if burst else int(count)
+        except (ValueError, KeyError):
+            raise ValueError(f"Invalid rate limit {spec!r}, expected e.g. '10/minute burst 20'") from None
+        if self.rate <= 0 or self.burst < 1:
+            raise ValueError(f"Invalid rate limit {spec!r}")
+        self.spec = spec
+
+def rate_limit(spec):
+    # This view's limit; RATELIMIT_ROUTES can still override it.
+    limit = Limit(spec)
+    def decorator(f):
+        f._rate_limit = limit
+        return f
+    return decorator
+
+class LocalBuckets:
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, limit):
+        # Seconds until a token is available; 0 if one was taken.
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (limit.burst, now))
+            tokens = min(limit.burst, tokens + (now - updated) * limit.rate)
+            wait = 0 if tokens >= 1 else (1 - tokens) / limit.rate
+            self._buckets[key] = (tokens - 1 if tokens >= 1 else tokens, now)
+            if len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return wait
+
+# The same token bucket, run atomically in Redis on its own clock.
+TAKE_SCRIPT = """
+local rate, burst = tonumber(ARGV[1]), tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) / rate end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000))
+return tostring(wait)
+"""
+
+class RedisBuckets:
+    def __init__(self, url):
+        import redis  # optional dependency, only needed when RATELIMIT_REDIS_URL is set
+        self.client = redis.Redis.from_url(url)
+        self.errors = redis.RedisError
+        self.script = self.client.register_script(TAKE_SCRIPT)
+
+    def take(self, key, limit):
+        try:
+            return float(self.script(keys=[f"subjex:ratelimit:{key}"], args=[limit.rate, limit.burst]))
+        except self.errors:
+            logger.warning("Rate limit store unavailable, letting the request through", exc_info=True)
+            return 0
+
+def _limit_for(endpoint):
+    config = current_app.config
+    routes = config['RATELIMIT_ROUTES']
+    if endpoint in routes:
+        return Limit(routes[endpoint]) if routes[endpoint] else None
+    view = current_app.view_functions.get(endpoint)
+    limit = getattr(view, '_rate_limit', None)
+    if limit is None and config['RATELIMIT_DEFAULT']:
+        limit = Limit(config['RATELIMIT_DEFAULT'])
+    return limit
+
+def _queued_seconds():
+    # X-Request-Start: "t=<unix time>" in seconds (nginx $msec), milliseconds
+    # or microseconds. None if absent or unparsable.
+    header = request.headers.get('X-Request-Start')
+    if not header:
+        return None
+    try:
+        started = float(header.removeprefix('t='))
+    except ValueError:
+        return None
+    if started > 1e14:
+        started /= 1e6
+    elif started > 1e11:
+        started /= 1e3
+    return max(0.0, time.time() - started)
+
+def _too_many(error, retry_after):
+    return jsonify({'error': error}), 429, {'Retry-After': str(max(1, math.ceil(retry_after)))}
+
+def _admit():
+    config = current_app.config
+    queued = _queued_seconds()
+    if queued is not None:
+        metrics().observe_histogram('request_queue_seconds', queued, QUEUE_BUCKETS)
+        budget = config['ADMISSION_QUEUE_BUDGET_MS']
+        if budget and queued * 1000 > budget:
+            metrics().count('admission_rejected_total')
+            return _too_many("Server is overloaded, try again shortly", 1)
+
+    endpoint = request.endpoint
+    if endpoint is None:
+        return None
+    state = current_app.extensions['ratelimit']
+    if endpoint not in state['limits']:
+        state['limits'][endpoint] = _limit_for(endpoint)
+    limit = state['limits'][endpoint]
+    if limit is None:
+        return None
+    client = f"user:{current_user.id}" if current_user.is_authenticated else f"ip:{request.remote_addr}"
+    wait = state['buckets'].take(f"{endpoint}:{client}", limit)
+    if wait:
+        metrics().count('ratelimit_rejected_total')
+        return _too_many("Too many requests, slow down", wait)
+    return None
+
+def init_app(app):
+    if not app.config['RATELIMIT_ENABLED']:
+        return
+    url = app.config['RATELIMIT_REDIS_URL']
+    app.extensions['ratelimit'] = {
+        # endpoint -> Limit or None, resolved on its first request
+        'limits': {},
+        'buckets': RedisBuckets(url) if url else LocalBuckets(app.config['RATELIMIT_MAX_KEYS']),
+    }
+    app.before_request(_admit)
@@ -0,0 +1,192 @@
+import logging
+import random
+import threading
+import time
+from flask import g, request, current_app, has_request_context, session as client_session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import SQLAlchemyError, OperationalError
+from sqlalchemy.sql.dml import UpdateBase
+from .instrumentation import metrics, describe
+
+logger = logging.getLogger(__name__)
+
+# --------------------------------
+# Read replicas
+# --------------------------------
+# With DATABASE_REPLICA_URIS set, statements of read-only requests (GET, HEAD,
+# OPTIONS) go to a healthy replica; everything else uses the primary:
+#   - requests with other methods, and views marked @use_primary
+#   - any statement from the moment a request writes (flush, INSERT/UPDATE/
+#     DELETE), so a request never reads around its own write
+#   - every request from a client for REPLICA_PIN_SECONDS after it committed a
+#     write (tracked in its session cookie), so users see what they just wrote
+# Replicas are health-checked at most every REPLICA_CHECK_SECONDS: one that
+# can't be reached, or lags more than REPLICA_MAX_LAG_SECONDS, is skipped until
+# the next check, and with no healthy replica reads fall back to the primary.
+# A connection error on a replica also marks it down straight away, and the
+# statement that hit it is run again on the primary (see RoutingSession), so
+# the request still succeeds. Only requests that haven't written use a
+# replica, so re-running their reads is safe.
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PIN_KEY = '_primary_until'
+
+# Seconds behind the primary; 0 when all received WAL has been replayed.
+LAG_SQL = (
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+describe('db_replica_requests_total', 'counter', "Read-only requests routed to a replica.")
+describe('db_replica_fallbacks_total', 'counter', "Read-only requests sent to the primary because no replica was healthy.")
+describe('db_replica_failovers_total', 'counter', "Reads re-run on the primary after their replica connection failed.")
+
+def use_primary(f):
+    # Keep a read-only view on the primary, e.g. when replica lag would hurt.
+    f._use_primary = True
+    return f
+
+class Replica:
+    def __init__(self, key, engine):
+        self.key = key
+        self.engine = engine
+        self.healthy = True
+        self.checked_at = 0
+        self.lock = threading.Lock()
+        event.listen(engine, 'handle_error', self._on_error)
+
+    def mark_down(self):
+        if self.healthy:
+            logger.warning("Read replica %s is unavailable, using the primary", self.key)
+        self.healthy = False
+        self.checked_at = time.monotonic()
+
+    def _on_error(self, context):
+        # A dropped connection, or none could be opened at all.
+        if context.is_disconnect or context.connection is None:
+            self.mark_down()
+
+    def check(self, max_lag):
+        try:
+            with self.engine.connect() as conn:
+                lag = float(conn.exec_driver_sql(LAG_SQL).scalar()) if self.engine.dialect.name == 'postgresql' else 0
+        except SQLAlchemyError:
+            logger.warning("Health check of read replica %s failed", self.key, exc_info=True)
+            self.mark_down()
+            return
+        healthy = lag <= max_lag
+        if healthy != self.healthy:
+            logger.warning("Read replica %s is %s (lag %.1fs)", self.key, 'back' if healthy else 'lagging', lag)
+        self.healthy = healthy
+        self.checked_at = time.monotonic()
+
+class ReplicaRouter:
+    def init_app(self, app):
+        # Replica engines are kept out of SQLALCHEMY_BINDS: Flask-SQLAlchemy would
+        # give each bind its own (shared) metadata, and create_all would expect
+        # every app to have them.
+        uris = app.config['DATABASE_REPLICA_URIS']
+        if not uris:
+            return
+        options = app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {}
+        app.extensions['replicas'] = [
+            Replica(f"replica{index}", create_engine(uri, **options)) for index, uri in enumerate(uris)
+        ]
+        app.before_request(self._route_request)
+
+    def _route_request(self):
+        view = current_app.view_functions.get(request.endpoint)
+        g._read_replica = (
+            request.method in SAFE_METHODS
+            and not getattr(view, '_use_primary', False)
+            and client_session.get(PIN_KEY, 0) <= time.time()
+        )
+        g._replica_counted = False
+        g.pop('_replica_engine', None)
+
+    def _pick(self):
+        config = current_app.config
+        replicas = current_app.extensions['replicas']
+        for replica in random.sample(replicas, len(replicas)):
+            if time.monotonic() - replica.checked_at >= config['REPLICA_CHECK_SECONDS'] and replica.lock.acquire(blocking=False):
+                try:
+                    replica.check(config['REPLICA_MAX_LAG_SECONDS'])
+                finally:
+                    replica.lock.release()
+            if replica.healthy:
+                return replica.engine
+        return None
+
+    def engine_for(self, session, clause):
+        # The replica engine to use, or None for the primary.
+        if isinstance(clause, UpdateBase) or session._flushing:
+            session.info['wrote'] = True
+        if not has_request_context() or 'replicas' not in current_app.extensions:
+            return None
+        if not g.get('_read_replica') or session.info.get('wrote'):
+            return None
+        engine = g.get('_replica_engine')
+        if engine is None:
+            engine = self._pick()
+            if not g._replica_counted:
+                g._replica_counted = True
+                metrics().count('db_replica_requests_total' if engine is not None else 'db_replica_fallbacks_total')
+            if engine is None:
+                # Stay on the primary for the rest of the request.
+                g._read_replica = False
+                return None
+            g._replica_engine = engine
+        return engine
+
+    def fail_over(self, session):
+        # After a statement failed on this request's replica: True if the
+        # replica was marked down (a connection error, see Replica._on_error)
+        # and the session now uses the primary, so the statement can be re-run.
+        engine = g.get('_replica_engine') if has_request_context() else None
+        if engine is None:
+            return False
+        replica = next(replica for replica in current_app.extensions['replicas'] if replica.engine is engine)
+        if replica.healthy:
+            return False
+        session.rollback()
+        g._read_replica = False
+        g.pop('_replica_engine', None)
+        metrics().count('db_replica_failovers_total')
+        return True
+
+replica_router = ReplicaRouter()
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            engine = replica_router.engine_for(self, clause)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _on_replica_failure(self, run):
+        try:
+            return run()
+        except OperationalError:
+            if not replica_router.fail_over(self):
+                raise
+            return run()
+
+    def execute(self, *args, **kwargs):
+        return self._on_replica_failure(lambda: super(RoutingSession, self).execute(*args, **kwargs))
+
+    def scalars(self, *args, **kwargs):
+        return self._on_replica_failure(lambda: super(RoutingSession, self).scalars(*args, **kwargs))
+
+    def scalar(self, *args, **kwargs):
+        return self._on_replica_failure(lambda: super(RoutingSession, self).scalar(*args, **kwargs))
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _pin_to_primary(session):
+    if session.info.pop('wrote', False) and has_request_context() and 'replicas' in current_app.extensions:
+        client_session[PIN_KEY] = time.time() + current_app.config['REPLICA_PIN_SECONDS']
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _forget_write(session):
+    session.info.pop('wrote', None)
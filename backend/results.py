@@ -0,0 +1,116 @@
+import hashlib
+import logging
+import threading
+from flask import current_app, request, has_app_context
+from sqlalchemy import event as sa_event
+from sqlalchemy.orm import Session
+from . import db
+from .cache import get_cache
+from .instrumentation import metrics, describe
+
+logger = logging.getLogger(__name__)
+
+# --------------------------------
+# Result cache
+# --------------------------------
+# Expensive listings (tickets, the ticket summary) are cached as their encoded
+# JSON body, so a repeat request skips loading and serializing the rows. Keys
+# combine:
+#   - the scope: "admin" for admins, who all see the same tickets, otherwise
+#     the user id
+#   - the query string
+#   - the version of every tag the result depends on (e.g. "tickets")
+#   - the listing's ETag state, the aggregate over the visible tickets that
+#     changes with any write to them
+# Writes call `invalidate(*tags)` before committing. The tags' versions are
+# bumped once the transaction commits, which makes every entry built before
+# unreachable at once. Versions live in this worker, or in Redis for all
+# workers when CACHE_REDIS_URL is set. The ETag state in the key also covers
+# writes made through other workers, so a stale result is never served either
+# way. Unreachable entries age out of the LRU (RESULT_CACHE_SIZE entries,
+# RESULT_CACHE_TTL seconds).
+#
+# Versions are read before the result is computed, so a result computed while
+# a write commits is stored under the old versions and never read again.
+
+describe('result_cache_hits_total', 'counter', "Listings served from the result cache.")
+describe('result_cache_misses_total', 'counter', "Listings computed and stored in the result cache.")
+
+class LocalTags:
+    def __init__(self):
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def versions(self, tags):
+        return [self._versions.get(tag, 0) for tag in tags]
+
+    def bump(self, tags):
+        with self._lock:
+            for tag in tags:
+                self._versions[tag] = self._versions.get(tag, 0) + 1
+
+class RedisTags:
+    def __init__(self, url):
+        import redis  # optional dependency, only needed when CACHE_REDIS_URL is set
+        self.client = redis.Redis.from_url(url)
+        self.prefix = "subjex:result_tags:"
+
+    def versions(self, tags):
+        return [int(version or 0) for version in self.client.mget([self.prefix + tag for tag in tags])]
+
+    def bump(self, tags):
+        pipeline = self.client.pipeline()
+        for tag in tags:
+            pipeline.incr(self.prefix + tag)
+        pipeline.execute()
+
+def invalidate(*tags):
+    # Drop cached results depending on these tags once the current transaction commits.
+    db.session.info.setdefault('result_tags', set()).update(tags)
+
+@sa_event.listens_for(Session, 'after_commit')
+def _bump_committed_tags(session):
+    tags = session.info.pop('result_tags', None)
+    if tags and has_app_context() and 'result_tags' in current_app.extensions:
+        try:
+            current_app.extensions['result_tags'].bump(sorted(tags))
+        except Exception:
+            # The ETag state in the keys still keeps results fresh.
+            logger.warning("Could not invalidate cached results for %s", sorted(tags), exc_info=True)
+
+@sa_event.listens_for(Session, 'after_rollback')
+def _discard_tags(session):
+    session.info.pop('result_tags', None)
+
+def result_scope(user):
+    return "admin" if user.role == "admin" else f"user:{user.id}"
+
+def cached_json(name, tags, scope, state, compute):
+    # A JSON response with compute()'s result, reused while none of the tags
+    # were invalidated and the state is unchanged.
+    config = current_app.config
+    app = current_app._get_current_object()
+    if not config['RESULT_CACHE_TTL'] or 'result_tags' not in app.extensions:
+        return app.json.response(compute())
+
+    try:
+        versions = app.extensions['result_tags'].versions(tags)
+    except Exception:
+        logger.warning("Result cache tags unavailable, not caching %s", name, exc_info=True)
+        return app.json.response(compute())
+    args = sorted(request.args.items(multi=True))
+    key = hashlib.sha1(repr((name, scope, args, tuple(tags), versions, state)).encode()).hexdigest()
+
+    cache = get_cache('results', config['RESULT_CACHE_SIZE'], config['RESULT_CACHE_TTL'])
+    body = cache.get(key, None)
+    if body is None:
+        metrics().count('result_cache_misses_total')
+        body = app.json.dumps(compute())
+        cache.set(key, body)
+    else:
+        metrics().count('result_cache_hits_total')
+    return app.response_class(body + "\n", mimetype=app.json.mimetype)
+
+def init_app(app):
+    url = app.config.get('CACHE_REDIS_URL')
+    app.extensions['result_tags'] = RedisTags(url) if url else LocalTags()
@@ -1,9 +1,32 @@
-from flask import Blueprint, request, jsonify, send_from_directory
+from flask import Blueprint, request, jsonify, stream_with_context, url_for
 from . import db
-from .models import User, Ticket, Comment, TicketAssignment
+from .models import User, Ticket, Comment, TicketAssignment, Job
+from .queries import (
+    ticket_query, visible_tickets, filter_tickets, comment_query,
+    ticket_summary, TICKET_SORTS, COMMENT_SORTS,
+)
+from .schemas import ticket_schema, comment_schema, assignment_schema, user_schema, job_schema
+from .access import ticket_access
+from .export import export_query, FORMATS as EXPORT_FORMATS
+from .search import search_tickets, has_terms
+from .events import publish, publish_many, stream_events, latest_event_id
+from .etag import touch_tickets, tickets_state, tickets_etag, ticket_etag, users_etag, user_etag, is_fresh, not_modified, tagged
+from .auth import invalidate_user
+from .cache import cache_stats
+from .results import cached_json, result_scope, invalidate as invalidate_results
+from .instrumentation import timed, render_metrics
+from .replicas import use_primary
+from .ratelimit import rate_limit
+from .jobs import enqueue
+from . import tasks
+from .assets import serve as serve_frontend
+from .passwords import (
+    HashingBusy, hash_password, verify_password, login_retry_after, record_login_failure, clear_login_failures,
+)
+from .pagination import PaginationError, parse_sort, wants_page, keyset_page, ordered, page_body, int_list_arg
 from flask_login import login_required, current_user, login_user, logout_user
 from flask import current_app as app
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy.exc import IntegrityError
 from functools import wraps
 import os
 
@@ -25,20 +48,14 @@ def admin_required(f):
 # --------------------------------
 # Main page content return from compiled /out
 # --------------------------------
+# Files and client-side routes come from the route table in assets.py.
 @bp.route('/')
 def index():
-    # Serve the compiled index.html
-    return send_from_directory(app.static_folder, 'index.html')
+    return serve_frontend('')
 
-# Catch-all route to serve static files or fallback to index.html
 @bp.route('/<path:path>')
 def static_proxy(path):
-    # First try to serve the requested file
-    try:
-        return send_from_directory(app.static_folder, path)
-    except Exception:
-        # If not found, load index.html (for handling client-side routing)
-        return send_from_directory(app.static_folder, 'index.html')
+    return serve_frontend(path)
 
 
 # --------------------------------
@@ -59,9 +76,27 @@ def elevate_user():
 
     user.role = 'admin'
     db.session.commit()
+    # Other workers see the new role at once only with a shared cache (see auth.py).
+    invalidate_user(user.id)
 
     return jsonify({'message': f"User {user.username} elevated to admin."}), 200
 
+# GET: Hit/miss counters for the in-process caches, to check they are paying off.
+@bp.route('/api/dev/cache-stats', methods=['GET'])
+@admin_required
+def get_cache_stats():
+    stats = cache_stats()
+    stats['ticket_access_requests'] = ticket_access.stats()
+    return jsonify(stats), 200
+
+# GET: Prometheus metrics (request latency histograms and SQL counts per route,
+# summed over all workers). Not proxied by nginx; scrape app:5000 directly.
+@bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    token = app.config['METRICS_TOKEN']
+    if token and request.headers.get('Authorization') != f"Bearer {token}":
+        return jsonify({'error': 'Unauthorized'}), 401
+    return app.response_class(render_metrics(), mimetype='text/plain; version=0.0.4')
 
 
 
@@ -69,7 +104,12 @@ def elevate_user():
 # User Authentication Endpoints
 # --------------------------------
 
+def hashing_busy():
+    # Every password hashing thread is taken and the queue is full.
+    return jsonify({"error": "Too many logins in progress, try again shortly"}), 503, {'Retry-After': '1'}
+
 @bp.route('/api/register', methods=['POST'])
+@rate_limit('10/hour burst 5')
 def register_user():
     data = request.get_json()
     if not data or 'username' not in data or 'password' not in data:
@@ -78,7 +118,11 @@ def register_user():
     if User.query.filter_by(username=data['username']).first():
         return jsonify({"error": "Username already exists"}), 400
 
-    hashed_password = generate_password_hash(data['password'], method='pbkdf2:sha256', salt_length=8)
+    try:
+        with timed('hash'):
+            hashed_password = hash_password(data['password'])
+    except HashingBusy:
+        return hashing_busy()
     new_user = User(
         username=data['username'],
         password=hashed_password,
@@ -89,16 +133,30 @@ def register_user():
     return jsonify({"message": "User registered successfully!"}), 201
 
 @bp.route('/api/login', methods=['POST'])
+@rate_limit('60/minute burst 30')
 def login_user_endpoint():
     data = request.get_json()
     if not data or 'username' not in data or 'password' not in data:
         return jsonify({"error": "Username and password are required"}), 400
 
+    retry_after = login_retry_after(data['username'])
+    if retry_after:
+        return jsonify({"error": "Too many failed logins, try again later"}), 429, {'Retry-After': str(retry_after)}
+
     user = User.query.filter_by(username=data['username']).first()
-    if user and check_password_hash(user.password, data['password']):
+    try:
+        with timed('hash'):
+            valid = user is not None and verify_password(user, data['password'])
+    except HashingBusy:
+        return hashing_busy()
+    if valid:
+        # Saves the upgraded hash, if verify_password re-hashed it.
+        db.session.commit()
+        clear_login_failures(data['username'])
         login_user(user)
         return jsonify({"message": "Logged in successfully!"}), 200
     else:
+        record_login_failure(data['username'])
         return jsonify({"error": "Invalid credentials"}), 401
 
 @bp.route('/api/logout', methods=['POST'])
@@ -122,31 +180,87 @@ def get_session_info():
 
 # GET all tickets.
 # Admins see all; non-admins see only tickets where they have an assignment.
+# Supports ?ids=1,2,3, ?status=, ?creator_id=, ?assignee=<user_id>, ?sort=[-]id|status|creator_id
+# and keyset pagination via ?limit= and ?cursor= (see pagination.py).
 @bp.route('/api/tickets', methods=['GET'])
 @login_required
 def get_tickets():
-    if current_user.role == "admin":
-        tickets = Ticket.query.all()
-    else:
-        # For standard users, only include tickets where they have an assignment.
-        assigned_ticket_ids = [assign.ticket_id for assign in current_user.ticket_assignments]
-        tickets = Ticket.query.filter(Ticket.id.in_(assigned_ticket_ids)).all()
-    
-    results = []
-    for ticket in tickets:
+    def listing():
+        query = filter_tickets(visible_tickets(current_user), request.args)
+        sort = parse_sort(request.args, TICKET_SORTS, 'id')
+        if not wants_page(request.args):
+            return ticket_schema.dump_many(ordered(query, sort).all())
+        tickets, next_cursor = keyset_page(query, sort, request.args)
+        return page_body(ticket_schema.dump_many(tickets), next_cursor)
 
-        assigned_users = TicketAssignment.query.filter_by(ticket_id=ticket.id).all()
-        assigned_users_list = [{"user_id": assign.user_id, "username": assign.user.username} for assign in assigned_users]
+    try:
+        state = tickets_state(current_user, request.args)
+        etag = tickets_etag(current_user, request.args, state)
+        if is_fresh(etag):
+            return not_modified(etag)
+        response = cached_json('tickets', ['tickets'], result_scope(current_user), state, listing)
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
+    return tagged(response, etag)
+
+# GET: Ticket counts by status, creator and assignee, for dashboards.
+# Accepts the same filters as the ticket listing.
+@bp.route('/api/tickets/summary', methods=['GET'])
+@login_required
+def get_tickets_summary():
+    try:
+        state = tickets_state(current_user, request.args)
+        etag = tickets_etag(current_user, request.args, state)
+        if is_fresh(etag):
+            return not_modified(etag)
+        response = cached_json('tickets_summary', ['tickets'], result_scope(current_user), state,
+                               lambda: ticket_summary(current_user, request.args))
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
+    return tagged(response, etag)
+
+# GET: Stream every visible ticket with its assignees and comments, for reporting.
+# ?format=ndjson (default, one ticket per line) or ?format=csv (one row per comment).
+# Accepts the same filters as the ticket listing.
+@bp.route('/api/tickets/export', methods=['GET'])
+@login_required
+@rate_limit('10/minute burst 3')
+def export_tickets():
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f"Unsupported format '{fmt}'. Use one of: {', '.join(EXPORT_FORMATS)}"}), 400
+    try:
+        query = export_query(current_user, request.args)
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
+
+    generate, mimetype = EXPORT_FORMATS[fmt]
+    return app.response_class(
+        stream_with_context(generate(query)),
+        mimetype=mimetype,
+        headers={
+            'Content-Disposition': f'attachment; filename=tickets.{fmt}',
+            'Cache-Control': 'no-store',
+            'X-Accel-Buffering': 'no',
+        },
+    )
 
-        results.append({
-            'id': ticket.id,
-            'title': ticket.title,
-            'description': ticket.description,
-            'status': ticket.status,
-            'creator_id': ticket.creator_id,
-            'assigned_users' : assigned_users_list
-        })
-    return jsonify(results), 200
+# GET: Full-text search over ticket titles, descriptions and comments.
+# ?q= is required; results are the visible tickets ranked best first, each with
+# its `rank`, paginated with ?limit and ?cursor. Accepts the listing filters.
+@bp.route('/api/search', methods=['GET'])
+@login_required
+def search():
+    q = request.args.get('q', '')
+    if not has_terms(q):
+        return jsonify({'error': 'q must contain at least one word'}), 400
+    try:
+        query, sort = search_tickets(current_user, q, request.args)
+        rows, next_cursor = keyset_page(query, sort, request.args)
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
+    items = [dict(ticket_schema.dump(ticket), rank=rank) for ticket, rank in rows]
+    return jsonify(page_body(items, next_cursor))
 
 # POST: Create a new ticket.
 # Only admins can create tickets. When creating, they must include an assignment to at least one user.
@@ -157,9 +271,9 @@ def create_ticket():
     if not data or 'title' not in data or 'assigned_user_ids' not in data:
         return jsonify({"error": "Title and assigned_user_ids (as a list) are required"}), 400
 
-    # Validate that each assigned user exists.
+    # Validate that each assigned user exists (ignoring repeated ids).
     assigned_users = []
-    for user_id in data.get("assigned_user_ids"):
+    for user_id in dict.fromkeys(data.get("assigned_user_ids")):
         user = db.session.get(User, user_id)
         if not user:
             return jsonify({"error": f"User with id {user_id} not found"}), 404
@@ -169,7 +283,8 @@ def create_ticket():
         title=data.get("title"),
         description=data.get("description", ""),
         status=data.get("status", "Open"),
-        creator_id=current_user.id  # The admin creating the ticket.
+        creator_id=current_user.id,  # The admin creating the ticket.
+        assignee_count=len(assigned_users)
     )
     db.session.add(new_ticket)
     db.session.flush()  # to generate a ticket id
@@ -182,44 +297,125 @@ def create_ticket():
         )
         db.session.add(assignment)
 
+    publish('ticket.created', new_ticket.id, user_ids=[user.id for user in assigned_users])
+    invalidate_results('tickets')
     db.session.commit()
+    ticket_access.invalidate(*[user.id for user in assigned_users])
     return jsonify({
         "message": "Ticket created",
-        "ticket": {
-            'id': new_ticket.id,
-            'title': new_ticket.title,
-            'description': new_ticket.description,
-            'status': new_ticket.status,
-            'creator_id': new_ticket.creator_id
-        }
+        "ticket": ticket_schema.only('id', 'title', 'description', 'status', 'creator_id').dump(new_ticket)
     }), 201
 
+def is_id(value):
+    # JSON true/false arrive as bool, a subclass of int.
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def ticket_field_error(item):
+    # Over-long strings fail the INSERT on Postgres, taking the whole batch with it.
+    for field in ('title', 'description', 'status'):
+        value = item.get(field)
+        if value is None:
+            continue
+        if not isinstance(value, str):
+            return f"{field} must be a string"
+        limit = Ticket.__table__.c[field].type.length
+        if len(value) > limit:
+            return f"{field} must be at most {limit} characters"
+    return None
+
+# POST: Create many tickets in one request.
+# Body: {"tickets": [{"title", "description", "status", "assigned_user_ids"}, ...], "atomic": false}
+# All user ids are validated with one query and the tickets and assignments are
+# inserted with multi-row INSERTs in a single transaction. Invalid items are
+# reported per item; with "atomic": true any invalid item rejects the whole batch.
+@bp.route('/api/tickets/bulk', methods=['POST'])
+@admin_required
+def create_tickets_bulk():
+    data = request.get_json()
+    if not data or not isinstance(data.get('tickets'), list) or not data['tickets']:
+        return jsonify({"error": "tickets (a non-empty list) is required"}), 400
+    items = data['tickets']
+    if len(items) > app.config['BULK_MAX_ITEMS']:
+        return jsonify({"error": f"At most {app.config['BULK_MAX_ITEMS']} tickets per request"}), 400
+
+    requested_ids = {
+        user_id for item in items if isinstance(item, dict) and isinstance(item.get('assigned_user_ids'), list)
+        for user_id in item['assigned_user_ids'] if is_id(user_id)
+    }
+    existing_ids = set(db.session.scalars(db.select(User.id).where(User.id.in_(requested_ids))))
+
+    results = []
+    valid = []
+    for index, item in enumerate(items):
+        error = None
+        if not isinstance(item, dict) or not item.get('title'):
+            error = "title is required"
+        elif not isinstance(item.get('assigned_user_ids'), list):
+            error = "assigned_user_ids (as a list) is required"
+        elif not all(is_id(user_id) for user_id in item['assigned_user_ids']):
+            error = "assigned_user_ids must be integers"
+        else:
+            missing = [user_id for user_id in item['assigned_user_ids'] if user_id not in existing_ids]
+            error = f"Users not found: {missing}" if missing else ticket_field_error(item)
+        if error:
+            results.append({"index": index, "status": "error", "error": error})
+        else:
+            results.append({"index": index, "status": "created"})
+            valid.append((index, item))
+
+    if data.get('atomic') and len(valid) != len(items):
+        return jsonify({"created": 0, "results": results}), 400
+    if not valid:
+        return jsonify({"created": 0, "results": results}), 400
+
+    ticket_ids = db.session.scalars(
+        db.insert(Ticket).returning(Ticket.id, sort_by_parameter_order=True),
+        [{
+            'title': item['title'],
+            'description': item.get('description', ""),
+            'status': item.get('status', "Open"),
+            'creator_id': current_user.id,
+            'assignee_count': len(set(item['assigned_user_ids'])),
+        } for index, item in valid]
+    ).all()
+
+    assignments = []
+    changes = []
+    for (index, item), ticket_id in zip(valid, ticket_ids):
+        results[index]['id'] = ticket_id
+        user_ids = list(dict.fromkeys(item['assigned_user_ids']))
+        assignments += [{'ticket_id': ticket_id, 'user_id': user_id} for user_id in user_ids]
+        changes.append({'kind': 'ticket.created', 'ticket_id': ticket_id, 'payload': {'user_ids': user_ids}})
+    if assignments:
+        db.session.execute(db.insert(TicketAssignment), assignments)
+    publish_many(changes)
+    invalidate_results('tickets')
+    db.session.commit()
+    ticket_access.invalidate(*{assign['user_id'] for assign in assignments})
+
+    return jsonify({"created": len(ticket_ids), "results": results}), 201
+
 # GET: A single ticket by its id.
 # Non-admins must be assigned to the ticket to access it.
 @bp.route('/api/tickets/<int:ticket_id>', methods=['GET'])
 @login_required
 def get_ticket(ticket_id):
-    ticket = db.session.get(Ticket, ticket_id)
-    if not ticket:
+    version = db.session.scalar(db.select(Ticket.version).where(Ticket.id == ticket_id))
+    if version is None:
         return jsonify({'error': 'Ticket not found'}), 404
     
     # Deny access for non-admins if no assignment exists.
-    if current_user.role != "admin":
-        assignment = TicketAssignment.query.filter_by(ticket_id=ticket_id, user_id=current_user.id).first()
-        if not assignment:
-            return jsonify({'error': 'Access denied'}), 403
+    if not ticket_access.can_view(current_user, ticket_id):
+        return jsonify({'error': 'Access denied'}), 403
 
-    assigned_users = TicketAssignment.query.filter_by(ticket_id=ticket_id).all()
-    assigned_users_list = [{"user_id": assign.user_id, "username": assign.user.username} for assign in assigned_users]
+    etag = ticket_etag(version)
+    if is_fresh(etag):
+        return not_modified(etag)
 
-    return jsonify({
-        'id': ticket.id,
-        'title': ticket.title,
-        'description': ticket.description,
-        'status': ticket.status,
-        'creator_id': ticket.creator_id,
-        "assigned_users" : assigned_users_list
-    }), 200
+    ticket = ticket_query().filter(Ticket.id == ticket_id).first()
+    if not ticket:
+        return jsonify({'error': 'Ticket not found'}), 404
+    return tagged(jsonify(ticket_schema.dump(ticket)), etag)
 
 # PATCH: Update a ticket.
 # Only admins can update ticket details, and only for tickets they own.
@@ -243,6 +439,8 @@ def update_ticket(ticket_id):
         ticket.status = data['status']
     # Optionally, update assignments separately.
     
+    touch_tickets(ticket.id)
+    publish('ticket.updated', ticket.id, fields=sorted(k for k in ('title', 'description', 'status') if k in data))
     db.session.commit()
     return jsonify({'message': 'Ticket updated successfully'}), 200
 
@@ -267,25 +465,86 @@ def assign_user_to_ticket(ticket_id):
     if not user:
         return jsonify({"error": "User not found"}), 404
 
-    # Check if user is already assigned to this ticket
-    existing_assignment = TicketAssignment.query.filter_by(ticket_id=ticket_id, user_id=user.id).first()
-    if existing_assignment:
-        return jsonify({"error": "User is already assigned to this ticket"}), 400
-
-    # Create a new assignment
+    # Create a new assignment. Duplicates are rejected by the unique
+    # (ticket_id, user_id) index rather than a separate lookup.
     new_assignment = TicketAssignment(ticket_id=ticket_id, user_id=user.id)
     db.session.add(new_assignment)
-    db.session.commit()
+    try:
+        touch_tickets(ticket_id, assignees=1)
+        publish('assignment.created', ticket_id, user_ids=[user.id], user_id=user.id)
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({"error": "User is already assigned to this ticket"}), 400
+    ticket_access.invalidate(user.id)
 
     return jsonify({
         "message": "User assigned successfully",
-        "assignment": {
-            "ticket_id": ticket_id,
-            "user_id": user.id,
-            "username": user.username
-        }
+        "assignment": assignment_body(new_assignment, user),
     }), 201
 
+def assignment_body(assignment, user):
+    # An assignment as listed by GET .../assignments, plus the user's name.
+    return {**assignment_schema.dump(assignment), **user_schema.only('username').dump(user)}
+
+# POST: Assign many users to a ticket in one request.
+# Body: {"user_ids": [...]}. Each id is reported as assigned, already_assigned,
+# not_found or invalid (not an integer).
+@bp.route('/api/tickets/<int:ticket_id>/assignments/bulk', methods=['POST'])
+@admin_required
+def assign_users_to_ticket_bulk(ticket_id):
+    ticket = db.session.get(Ticket, ticket_id)
+    if not ticket:
+        return jsonify({'error': 'Ticket not found'}), 404
+
+    # Ensure the admin is the creator of the ticket
+    if current_user.role == "admin" and ticket.creator_id != current_user.id:
+        return jsonify({'error': 'You can only edit tickets you created'}), 403
+
+    data = request.get_json()
+    if not data or not isinstance(data.get('user_ids'), list) or not data['user_ids']:
+        return jsonify({"error": "user_ids (a non-empty list) is required"}), 400
+    invalid_ids = [user_id for user_id in data['user_ids'] if not is_id(user_id)]
+    user_ids = list(dict.fromkeys(user_id for user_id in data['user_ids'] if is_id(user_id)))
+    if len(user_ids) + len(invalid_ids) > app.config['BULK_MAX_ITEMS']:
+        return jsonify({"error": f"At most {app.config['BULK_MAX_ITEMS']} users per request"}), 400
+
+    existing_users = set(db.session.scalars(db.select(User.id).where(User.id.in_(user_ids))))
+    already_assigned = set(db.session.scalars(
+        db.select(TicketAssignment.user_id)
+        .where(TicketAssignment.ticket_id == ticket_id, TicketAssignment.user_id.in_(user_ids))
+    ))
+
+    results = [{"user_id": user_id, "status": "invalid"} for user_id in invalid_ids]
+    new_user_ids = []
+    for user_id in user_ids:
+        if user_id not in existing_users:
+            results.append({"user_id": user_id, "status": "not_found"})
+        elif user_id in already_assigned:
+            results.append({"user_id": user_id, "status": "already_assigned"})
+        else:
+            results.append({"user_id": user_id, "status": "assigned"})
+            new_user_ids.append(user_id)
+
+    if new_user_ids:
+        try:
+            db.session.execute(db.insert(TicketAssignment).values(
+                [{'ticket_id': ticket_id, 'user_id': user_id} for user_id in new_user_ids]
+            ))
+            touch_tickets(ticket_id, assignees=len(new_user_ids))
+            publish_many([
+                {'kind': 'assignment.created', 'ticket_id': ticket_id, 'payload': {'user_id': user_id, 'user_ids': [user_id]}}
+                for user_id in new_user_ids
+            ])
+            db.session.commit()
+        except IntegrityError:
+            # Another request assigned one of these users in the meantime.
+            db.session.rollback()
+            return jsonify({"error": "Assignments changed concurrently, please retry"}), 409
+        ticket_access.invalidate(*new_user_ids)
+
+    return jsonify({"assigned": len(new_user_ids), "results": results}), 200
+
 # DELETE: Removes a user assigned to a ticket
 # Only admins can change ticket details, and only tickets they own.
 @bp.route('/api/tickets/<int:ticket_id>/assignments/<int:user_id>', methods=['DELETE'])
@@ -304,7 +563,10 @@ def remove_user_from_ticket(ticket_id, user_id):
         return jsonify({"error": "User is not assigned to this ticket"}), 404
 
     db.session.delete(assignment)
+    touch_tickets(ticket_id, assignees=-1)
+    publish('assignment.deleted', ticket_id, user_ids=[user_id], user_id=user_id)
     db.session.commit()
+    ticket_access.invalidate(user_id)
 
     return jsonify({"message": "User removed from ticket successfully"}), 200
 
@@ -322,8 +584,11 @@ def delete_ticket(ticket_id):
     if current_user.role == "admin" and ticket.creator_id != current_user.id:
         return jsonify({'error': 'You can only edit tickets you created'}), 403
     
-    db.session.delete(ticket)
-    db.session.commit()
+    # Tickets with long threads are deleted in the background.
+    if ticket.comment_count + ticket.assignee_count > app.config['JOBS_INLINE_MAX_ROWS']:
+        return job_accepted(enqueue('delete_ticket', {'ticket_id': ticket_id}, created_by=current_user.id))
+
+    tasks.delete_ticket(ticket_id)
     return jsonify({'message': 'Ticket deleted successfully'}), 200
 
 # ----------------------
@@ -331,28 +596,32 @@ def delete_ticket(ticket_id):
 # ----------------------
 
 # GET all comments for a specific ticket.
+# Supports ?sort=[-]created_at|id and keyset pagination via ?limit= and ?cursor=.
 @bp.route('/api/tickets/<int:ticket_id>/comments', methods=['GET'])
 @login_required
 def get_ticket_comments(ticket_id):
-    ticket = db.session.get(Ticket, ticket_id)
-    if not ticket:
+    # Adding or deleting a comment bumps the ticket's version.
+    version = db.session.scalar(db.select(Ticket.version).where(Ticket.id == ticket_id))
+    if version is None:
         return jsonify({'error': 'Ticket not found'}), 404
 
     # Standard users see comments only if they are assigned.
-    if current_user.role != "admin":
-        assignment = TicketAssignment.query.filter_by(ticket_id=ticket_id, user_id=current_user.id).first()
-        if not assignment:
-            return jsonify({'error': 'Access denied'}), 403
+    if not ticket_access.can_view(current_user, ticket_id):
+        return jsonify({'error': 'Access denied'}), 403
 
-    results = []
-    for comment in ticket.comments:
-        results.append({
-            'id': comment.id,
-            'content': comment.content,
-            'created_at': comment.created_at,
-            'author_id': comment.user_id
-        })
-    return jsonify(results), 200
+    etag = ticket_etag(version)
+    if is_fresh(etag):
+        return not_modified(etag)
+
+    try:
+        query = comment_query(ticket_id)
+        sort = parse_sort(request.args, COMMENT_SORTS, 'created_at')
+        if not wants_page(request.args):
+            return tagged(jsonify(comment_schema.dump_many(ordered(query, sort).all())), etag)
+        comments, next_cursor = keyset_page(query, sort, request.args)
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
+    return tagged(jsonify(page_body(comment_schema.dump_many(comments), next_cursor)), etag)
 
 # POST a comment on a ticket.
 @bp.route('/api/tickets/<int:ticket_id>/comments', methods=['POST'])
@@ -363,10 +632,8 @@ def add_comment(ticket_id):
         return jsonify({'error': 'Ticket not found'}), 404
 
     # Standard users must be assigned to the ticket.
-    if current_user.role != "admin":
-        assignment = TicketAssignment.query.filter_by(ticket_id=ticket_id, user_id=current_user.id).first()
-        if not assignment:
-            return jsonify({'error': 'Access denied'}), 403
+    if not ticket_access.can_view(current_user, ticket_id):
+        return jsonify({'error': 'Access denied'}), 403
 
     data = request.get_json()
     if not data or 'content' not in data:
@@ -378,13 +645,13 @@ def add_comment(ticket_id):
         user_id=current_user.id
     )
     db.session.add(new_comment)
+    touch_tickets(ticket.id, comments=1)
+    db.session.flush()  # to generate a comment id
+    publish('comment.created', ticket.id, comment_id=new_comment.id, author_id=current_user.id)
     db.session.commit()
     return jsonify({
         "message": "Comment added",
-        "comment": {
-            'id': new_comment.id,
-            'content': new_comment.content
-        }
+        "comment": comment_schema.only('id', 'content').dump(new_comment)
     }), 201
 
 # DELETE a comment.
@@ -408,9 +675,49 @@ def delete_comment(comment_id):
         return jsonify({"error": "You are not authorized to delete this comment"}), 403
 
     db.session.delete(comment)
+    touch_tickets(comment.ticket_id, comments=-1)
+    publish('comment.deleted', comment.ticket_id, comment_id=comment.id)
     db.session.commit()
     return jsonify({"message": "Comment deleted successfully"}), 200
 
+# -----------------------------
+# Change Feed
+# -----------------------------
+
+# GET: Server-sent event stream of ticket, comment and assignment changes the
+# current user can see. Resumes after the Last-Event-ID header (sent by
+# EventSource on reconnect) or ?last_event_id=; otherwise starts from now.
+@bp.route('/api/events', methods=['GET'])
+@login_required
+@use_primary
+@rate_limit('30/minute burst 10')
+def stream_change_events():
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    if last_event_id is None:
+        last_event_id = latest_event_id()
+    else:
+        try:
+            last_event_id = int(last_event_id)
+        except ValueError:
+            return jsonify({'error': 'Last-Event-ID must be an integer'}), 400
+
+    user = current_user._get_current_object()
+
+    def can_see(change):
+        if user.role == "admin":
+            return True
+        if user.id in change.payload.get('user_ids', ()):
+            # Their own assignments changed, so re-resolve what they can see.
+            ticket_access.reset()
+            return True
+        return change.ticket_id is not None and ticket_access.can_view(user, change.ticket_id)
+
+    return app.response_class(
+        stream_with_context(stream_events(can_see, last_event_id)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
 # -----------------------------
 # Ticket Assignment Endpoints
 # -----------------------------
@@ -425,28 +732,16 @@ def get_ticket_assignments(ticket_id):
     if not ticket:
         return jsonify({'error': 'Ticket not found'}), 404
 
+    if not ticket_access.can_view(current_user, ticket_id):
+        return jsonify({'error': 'Access denied'}), 403
+
     if current_user.role != 'admin':
         assignment = TicketAssignment.query.filter_by(ticket_id=ticket_id, user_id=current_user.id).first()
-        if not assignment:
-            return jsonify({'error': 'Access denied'}), 403
-        return jsonify({
-            'assignments': [{
-                'id': assignment.id,
-                'ticket_id': assignment.ticket_id,
-                'user_id': assignment.user_id
-            }]
-        }), 200
+        return jsonify({'assignments': [assignment_schema.dump(assignment)]}), 200
 
     # For admin, return all assignments.
     assignments = TicketAssignment.query.filter_by(ticket_id=ticket_id).all()
-    results = []
-    for assign in assignments:
-        results.append({
-            'id': assign.id,
-            'ticket_id': assign.ticket_id,
-            'user_id': assign.user_id,
-        })
-    return jsonify({'assignments': results}), 200
+    return jsonify({'assignments': assignment_schema.dump_many(assignments)}), 200
 
 # POST: Create a new assignment for a ticket.
 # Only admins can assign users to tickets.
@@ -470,21 +765,15 @@ def create_ticket_assignment(ticket_id):
     if existing:
         return jsonify({"error": "User is already assigned to this ticket"}), 400
 
-    new_assignment = TicketAssignment(
-        ticket_id=ticket_id,
-        user_id=user.id,
-        assignment_note=data.get("assignment_note", "")
-    )
+    new_assignment = TicketAssignment(ticket_id=ticket_id, user_id=user.id)
     db.session.add(new_assignment)
+    touch_tickets(ticket_id, assignees=1)
+    publish('assignment.created', ticket_id, user_ids=[user.id], user_id=user.id)
     db.session.commit()
+    ticket_access.invalidate(user.id)
     return jsonify({
         "message": "User assigned to ticket successfully",
-        "assignment": {
-            "id": new_assignment.id,
-            "ticket_id": new_assignment.ticket_id,
-            "user_id": new_assignment.user_id,
-            "assignment_note": new_assignment.assignment_note
-        }
+        "assignment": assignment_body(new_assignment, user),
     }), 201
 
 # PATCH: Update an assignment (for example, change the assignment_note).
@@ -512,7 +801,10 @@ def delete_ticket_assignment(ticket_id, assignment_id):
         return jsonify({"error": "Assignment not found"}), 404
 
     db.session.delete(assignment)
+    touch_tickets(ticket_id, assignees=-1)
+    publish('assignment.deleted', ticket_id, user_ids=[assignment.user_id], user_id=assignment.user_id)
     db.session.commit()
+    ticket_access.invalidate(assignment.user_id)
     return jsonify({"message": "Assignment deleted successfully"}), 200
 
 #-----------------
@@ -520,13 +812,26 @@ def delete_ticket_assignment(ticket_id, assignment_id):
 #-----------------
 
 
-# GET: All users
+# GET: All users (admins only), or ?ids=1,2,3 for any logged-in user to look
+# up several usernames in one query. Unknown ids are left out.
 @bp.route('/api/users', methods=['GET'])
-@admin_required
+@login_required
 def get_all_users():
+    try:
+        ids = int_list_arg(request.args, 'ids')
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
+    if ids is not None:
+        users = User.query.with_entities(User.id, User.username).filter(User.id.in_(ids)).order_by(User.id).all()
+        return jsonify(user_schema.dump_many(users))
+    if current_user.role != "admin":
+        return jsonify({"error": "Admin access required"}), 403
+
+    etag = users_etag()
+    if is_fresh(etag):
+        return not_modified(etag)
     users = User.query.with_entities(User.id, User.username).all()
-    user_list = [{"user_id": user.id, "username": user.username} for user in users]
-    return jsonify(user_list), 200
+    return tagged(jsonify(user_schema.dump_many(users)), etag)
 
 # GET: A user's username by their UID
 @bp.route('/api/users/<int:user_id>', methods=['GET'])
@@ -536,7 +841,10 @@ def get_username(user_id):
     if not user:
         return jsonify({'error': 'User not found'}), 404
 
-    return jsonify({'user_id': user.id, 'username': user.username}), 200
+    etag = user_etag(user)
+    if is_fresh(etag):
+        return not_modified(etag)
+    return tagged(jsonify(user_schema.dump(user)), etag)
 
 # DELETE: Remove a user by ID — requires DELETE_USER_SECRET
 @bp.route('/api/users/<int:user_id>', methods=['DELETE'])
@@ -552,6 +860,44 @@ def delete_user(user_id):
     if not user:
         return jsonify({'error': 'User not found'}), 404
 
-    db.session.delete(user)
-    db.session.commit()
+    if db.session.scalar(db.select(db.exists().where(Ticket.creator_id == user_id))):
+        return jsonify({'error': 'User still owns tickets; delete them first'}), 409
+
+    # Users with a long history are deleted in the background.
+    cascade_rows = (
+        db.session.scalar(db.select(db.func.count(TicketAssignment.id)).where(TicketAssignment.user_id == user_id))
+        + db.session.scalar(db.select(db.func.count(Comment.id)).where(Comment.user_id == user_id))
+    )
+    if cascade_rows > app.config['JOBS_INLINE_MAX_ROWS']:
+        return job_accepted(enqueue('delete_user', {'user_id': user_id}, created_by=current_user.id if current_user.is_authenticated else None))
+
+    tasks.delete_user(user_id)
     return jsonify({'message': f'User {user.username} deleted successfully'}), 200
+
+# -----------------------------
+# Background Jobs
+# -----------------------------
+
+def job_accepted(job):
+    # Commit the queued job and answer 202 pointing at its status.
+    db.session.commit()
+    location = url_for('main.get_job', job_id=job.id)
+    return jsonify(job_schema.dump(job)), 202, {'Location': location}
+
+# GET: Status of a background job; visible to whoever queued it and to admins.
+@bp.route('/api/jobs/<int:job_id>', methods=['GET'])
+@login_required
+def get_job(job_id):
+    job = db.session.get(Job, job_id)
+    if not job or (current_user.role != "admin" and job.created_by != current_user.id):
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job_schema.dump(job))
+
+# POST: Queue a maintenance job ("recount_tickets" or "rebuild_search_index").
+@bp.route('/api/jobs', methods=['POST'])
+@admin_required
+def create_job():
+    data = request.get_json()
+    if not data or data.get('kind') not in tasks.MAINTENANCE:
+        return jsonify({'error': f"kind must be one of {', '.join(tasks.MAINTENANCE)}"}), 400
+    return job_accepted(enqueue(data['kind'], created_by=current_user.id))
@@ -0,0 +1,66 @@
+from operator import attrgetter
+from .instrumentation import timed
+
+# --------------------------------
+# Serializers
+# --------------------------------
+# Each response shape is declared once as a Schema: output key -> attribute
+# path on the model (dotted paths follow relationships) or a function of the
+# object. Routes dump models (or result rows, which have the same attributes)
+# through these rather than building dicts by hand, so a field reads the same
+# in every endpoint. Values are left as they are (datetimes included) for the
+# JSON provider to encode.
+
+class Schema:
+    def __init__(self, **fields):
+        self.fields = fields
+        self._getters = [
+            (name, attrgetter(source) if isinstance(source, str) else source)
+            for name, source in fields.items()
+        ]
+
+    def only(self, *names):
+        return Schema(**{name: self.fields[name] for name in names})
+
+    def dump(self, obj):
+        return {name: get(obj) for name, get in self._getters}
+
+    def dump_many(self, objs):
+        with timed('serialize'):
+            return [self.dump(obj) for obj in objs]
+
+user_schema = Schema(user_id='id', username='username')
+
+# An assignment as embedded in a ticket (needs the assignment's user loaded).
+assignee_schema = Schema(user_id='user_id', username='user.username')
+
+assignment_schema = Schema(id='id', ticket_id='ticket_id', user_id='user_id')
+
+ticket_schema = Schema(
+    id='id',
+    title='title',
+    description='description',
+    status='status',
+    creator_id='creator_id',
+    assigned_users=lambda ticket: [assignee_schema.dump(assign) for assign in ticket.assignments],
+    comment_count='comment_count',
+    assignee_count='assignee_count',
+    last_activity_at='last_activity_at',
+)
+
+# Listings load the author with each comment (see queries.comment_query).
+comment_schema = Schema(id='id', content='content', created_at='created_at', author_id='user_id', author_username='user.username')
+
+# Only the last line of a failed attempt's traceback is shown to clients.
+job_schema = Schema(
+    id='id',
+    kind='kind',
+    status='status',
+    attempts='attempts',
+    max_attempts='max_attempts',
+    run_at='run_at',
+    result='result',
+    error=lambda job: job.error.strip().splitlines()[-1] if job.error else None,
+    created_at='created_at',
+    finished_at='finished_at',
+)
@@ -0,0 +1,117 @@
+import re
+from sqlalchemy import event, text, Float, Integer
+from . import db
+from .models import Ticket, Comment, ticket_search_vector, comment_search_vector
+from .pagination import Sort
+from .queries import ticket_query, visible_filter, filter_tickets
+
+# --------------------------------
+# Full-text search
+# --------------------------------
+# Tickets match on their title/description or on any of their comments; a
+# ticket's rank is the sum of the ranks of its matches.
+#
+# Postgres: GIN indexes on to_tsvector() expressions (declared in models.py),
+# queried with websearch_to_tsquery and ranked with ts_rank.
+#
+# SQLite (tests/dev): an FTS5 table kept in sync by triggers, ranked with bm25.
+# Ticket rows use rowid id * 2 and comment rows id * 2 + 1, so triggers can
+# update the index by rowid.
+
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(body, ticket_id UNINDEXED)",
+    """CREATE TRIGGER IF NOT EXISTS tickets_search_insert AFTER INSERT ON tickets BEGIN
+        INSERT INTO search_index(rowid, body, ticket_id)
+        VALUES (new.id * 2, coalesce(new.title, '') || ' ' || coalesce(new.description, ''), new.id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS tickets_search_update AFTER UPDATE OF title, description ON tickets BEGIN
+        DELETE FROM search_index WHERE rowid = old.id * 2;
+        INSERT INTO search_index(rowid, body, ticket_id)
+        VALUES (new.id * 2, coalesce(new.title, '') || ' ' || coalesce(new.description, ''), new.id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS tickets_search_delete AFTER DELETE ON tickets BEGIN
+        DELETE FROM search_index WHERE rowid = old.id * 2;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS comments_search_insert AFTER INSERT ON comments BEGIN
+        INSERT INTO search_index(rowid, body, ticket_id) VALUES (new.id * 2 + 1, new.content, new.ticket_id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS comments_search_update AFTER UPDATE OF content ON comments BEGIN
+        DELETE FROM search_index WHERE rowid = old.id * 2 + 1;
+        INSERT INTO search_index(rowid, body, ticket_id) VALUES (new.id * 2 + 1, new.content, new.ticket_id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS comments_search_delete AFTER DELETE ON comments BEGIN
+        DELETE FROM search_index WHERE rowid = old.id * 2 + 1;
+    END""",
+]
+
+SQLITE_REBUILD = [
+    "DELETE FROM search_index",
+    """INSERT INTO search_index(rowid, body, ticket_id)
+       SELECT id * 2, coalesce(title, '') || ' ' || coalesce(description, ''), id FROM tickets""",
+    """INSERT INTO search_index(rowid, body, ticket_id)
+       SELECT id * 2 + 1, content, ticket_id FROM comments""",
+]
+
+def is_search_table(name):
+    # The FTS5 table and its shadow tables are not part of the ORM metadata.
+    return name is not None and name.startswith('search_index')
+
+# db.create_all() (tests, dev) installs the SQLite index along with the tables.
+@event.listens_for(db.metadata, 'after_create')
+def _install_sqlite_index(target, connection, **kw):
+    if connection.dialect.name == 'sqlite':
+        for statement in SQLITE_DDL:
+            connection.exec_driver_sql(statement)
+
+def rebuild_index():
+    # Only needed on SQLite; Postgres indexes are maintained by the database.
+    if db.engine.dialect.name == 'sqlite':
+        for statement in SQLITE_REBUILD:
+            db.session.execute(text(statement))
+        db.session.commit()
+
+def _sqlite_terms(q):
+    # Quote every word so user input can't form FTS5 query syntax; words are ANDed.
+    return " ".join('"' + word + '"' for word in re.findall(r"\w+", q))
+
+def _matches(q):
+    # Subquery of (ticket_id, rank) for every ticket matching q.
+    if db.engine.dialect.name == 'postgresql':
+        query = db.func.websearch_to_tsquery(db.literal_column("'english'::regconfig"), q)
+        ticket_hits = db.select(
+            Ticket.id.label('ticket_id'), db.func.ts_rank(ticket_search_vector, query).label('rank')
+        ).where(ticket_search_vector.op('@@')(query))
+        comment_hits = db.select(
+            Comment.ticket_id.label('ticket_id'), db.func.ts_rank(comment_search_vector, query).label('rank')
+        ).where(comment_search_vector.op('@@')(query))
+        hits = ticket_hits.union_all(comment_hits).subquery()
+        # ts_rank is a real (float4). The rank goes into page cursors as a
+        # Python float and is compared as double precision on the next page,
+        # so order by the same double precision value or ties repeat or vanish.
+        return (
+            db.select(hits.c.ticket_id, db.cast(db.func.sum(hits.c.rank), Float(53)).label('rank'))
+            .group_by(hits.c.ticket_id)
+            .subquery('matches')
+        )
+
+    # FTS5's hidden `rank` column is the bm25 score (lower is better). bm25()
+    # itself can't be used once SQLite flattens this into an outer query.
+    return text(
+        "SELECT ticket_id, sum(-rank) AS rank FROM search_index "
+        "WHERE search_index MATCH :terms GROUP BY ticket_id"
+    ).bindparams(terms=_sqlite_terms(q)).columns(ticket_id=Integer, rank=Float).subquery('matches')
+
+def search_tickets(user, q, args):
+    # Returns (query, sort) for keyset_page: rows are (Ticket, rank), best first.
+    matches = _matches(q)
+    query = (
+        ticket_query()
+        .join(matches, matches.c.ticket_id == Ticket.id)
+        .add_columns(matches.c.rank)
+    )
+    query = filter_tickets(visible_filter(query, user), args)
+    sort = Sort('rank', [matches.c.rank, Ticket.id], lambda row: [row.rank, row.Ticket.id], descending=True)
+    return query, sort
+
+def has_terms(q):
+    return bool(re.search(r"\w", q or ""))
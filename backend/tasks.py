@@ -0,0 +1,85 @@
+from . import db
+from .models import User, Ticket, Comment, TicketAssignment
+from .jobs import task
+from .events import publish
+from .etag import touch_tickets, recount_tickets
+from .access import ticket_access
+from .auth import invalidate_user
+from .search import rebuild_index
+from .results import invalidate as invalidate_results
+
+# --------------------------------
+# Job handlers
+# --------------------------------
+# Run by `flask worker`, or called directly by routes when the work is small
+# enough to do inline (see JOBS_INLINE_MAX_ROWS). Each one commits its work and
+# must be safe to run again (see jobs.py).
+#
+# Caches are invalidated in the process that runs the job. Without
+# CACHE_REDIS_URL the web workers' copies expire on their own (USER_CACHE_TTL,
+# ACCESS_CACHE_TTL).
+
+# Kinds admins may queue through POST /api/jobs.
+MAINTENANCE = ('recount_tickets', 'rebuild_search_index')
+
+@task('delete_user')
+def delete_user(user_id):
+    user = db.session.get(User, user_id)
+    if user is None:
+        return None
+
+    # The user's assignments and comments disappear from these tickets.
+    affected_ticket_ids = db.session.scalars(
+        db.select(TicketAssignment.ticket_id).where(TicketAssignment.user_id == user_id)
+        .union(db.select(Comment.ticket_id).where(Comment.user_id == user_id))
+    ).all()
+    touch_tickets(*affected_ticket_ids)
+    for affected_ticket_id in affected_ticket_ids:
+        publish('ticket.updated', affected_ticket_id, reason='user.deleted', user_id=user_id)
+    username = user.username
+    # Comments and assignments go with it (ON DELETE CASCADE).
+    db.session.delete(user)
+    db.session.flush()
+    recount_tickets(*affected_ticket_ids)
+    db.session.commit()
+    ticket_access.invalidate(user_id)
+    # Clears the shared cache with CACHE_REDIS_URL. Per-worker caches only
+    # forget the user after USER_CACHE_TTL (see auth.py).
+    invalidate_user(user_id)
+    return {'username': username, 'tickets_updated': len(affected_ticket_ids)}
+
+@task('delete_ticket')
+def delete_ticket(ticket_id):
+    ticket = db.session.get(Ticket, ticket_id)
+    if ticket is None:
+        return None
+
+    assigned_user_ids = db.session.scalars(
+        db.select(TicketAssignment.user_id).where(TicketAssignment.ticket_id == ticket_id)
+    ).all()
+    # Comments and assignments go with it (ON DELETE CASCADE).
+    db.session.delete(ticket)
+    publish('ticket.deleted', ticket_id, user_ids=assigned_user_ids)
+    invalidate_results('tickets')
+    db.session.commit()
+    ticket_access.invalidate(*assigned_user_ids)
+    return {'ticket_id': ticket_id}
+
+@task('recount_tickets')
+def recount_all_tickets(batch_size=1000):
+    # Rebuild every ticket's counters, a batch per transaction.
+    last_id, total = 0, 0
+    while True:
+        ticket_ids = db.session.scalars(
+            db.select(Ticket.id).where(Ticket.id > last_id).order_by(Ticket.id).limit(batch_size)
+        ).all()
+        if not ticket_ids:
+            return {'tickets': total}
+        recount_tickets(*ticket_ids)
+        db.session.commit()
+        last_id, total = ticket_ids[-1], total + len(ticket_ids)
+
+@task('rebuild_search_index')
+def rebuild_search_index():
+    rebuild_index()
+    return None
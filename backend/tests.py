@@ -2,12 +2,10 @@ import os
 import tempfile
 import pytest
 from flask import json
-from . import create_app, db
+from . import create_app, db, init_migrate
 from .models import User, Ticket, Comment, TicketAssignment
 
-@pytest.fixture(scope='function')
-def client():
-    from . import create_app, db
+def make_app():
     from werkzeug.security import generate_password_hash
     app = create_app({
         'TESTING': True,
@@ -19,14 +17,27 @@ def client():
 
     with app.app_context():
         db.create_all()
-        from .models import User
         admin = User(username="admin", password=generate_password_hash("adminpass"), role="admin")
         user = User(username="user", password=generate_password_hash("userpass"), role="standard")
         db.session.add_all([admin, user])
         db.session.commit()
+    return app
+
+@pytest.fixture(scope='function')
+def client():
+    app = make_app()
+    with app.app_context():
         with app.test_client() as client:
             yield client
 
+# Unlike `client`, requests made through this fixture each get their own app
+# context (and `g`), as they would in production.
+@pytest.fixture(scope='function')
+def isolated_client():
+    app = make_app()
+    with app.test_client() as client:
+        yield client
+
 def login(client, username, password):
     return client.post('/api/login', json={"username": username, "password": password})
 
@@ -36,6 +47,29 @@ def register(client, username, password):
 def logout(client):
     return client.post('/api/logout')
 
+def count_queries(func, app=None):
+    # Count the SQL statements issued while running func.
+    result, statements = capture_queries(func, app)
+    return result, len(statements)
+
+def capture_queries(func, app=None):
+    # Run func and return its result and the SQL statements it issued.
+    from sqlalchemy import event
+    if app is not None:
+        with app.app_context():
+            engine = db.engine
+    else:
+        engine = db.engine
+    statements = []
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        result = func()
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    return result, statements
+
 def test_register_and_login(client):
     rv = register(client, "testuser", "testpass")
     assert rv.status_code == 200 or rv.status_code == 201
@@ -169,6 +203,11 @@ def test_assign_user_to_ticket(client):
 
     rv = client.post('/api/tickets/1/assignments', json={"user_id": 3})
     assert rv.status_code == 200 or rv.status_code == 201
+    # The created assignment is listed the same way GET .../assignments lists it.
+    listed = client.get('/api/tickets/1/assignments').get_json()['assignments']
+    created = rv.get_json()['assignment']
+    assert created.pop('username') == "test"
+    assert created in listed
 
 def test_delete_ticket_assignment(client):
     login(client, "admin", "adminpass")
@@ -189,4 +228,981 @@ def test_get_all_users(client):
 def test_get_username(client):
     login(client, "admin", "adminpass")
     rv = client.get('/api/users/1')
-    assert rv.status_code == 200
\ No newline at end of file
+    assert rv.status_code == 200
+
+def test_get_tickets_query_count_is_constant(client):
+    login(client, "admin", "adminpass")
+    register(client, "third", "password123")
+
+    def create_tickets(count):
+        for i in range(count):
+            client.post('/api/tickets', json={
+                "title": f"Ticket {i}",
+                "description": "desc",
+                "assigned_user_ids": [2, 3]
+            })
+
+    create_tickets(2)
+    rv, few = count_queries(lambda: client.get('/api/tickets'))
+    assert rv.status_code == 200
+    assert len(rv.get_json()) == 2
+
+    create_tickets(20)
+    rv, many = count_queries(lambda: client.get('/api/tickets'))
+    assert rv.status_code == 200
+    assert len(rv.get_json()) == 22
+    assert rv.get_json()[0]['assigned_users'] == [
+        {"user_id": 2, "username": "user"},
+        {"user_id": 3, "username": "third"},
+    ]
+    assert many == few
+
+def test_get_tickets_standard_user_visibility(client):
+    login(client, "admin", "adminpass")
+    client.post('/api/tickets', json={"title": "Mine", "assigned_user_ids": [2]})
+    client.post('/api/tickets', json={"title": "Not mine", "assigned_user_ids": [1]})
+    logout(client)
+
+    login(client, "user", "userpass")
+    rv = client.get('/api/tickets')
+    assert [t['title'] for t in rv.get_json()] == ["Mine"]
+    assert client.get('/api/tickets/1').status_code == 200
+    assert client.get('/api/tickets/2').status_code == 403
+
+def test_get_tickets_keyset_pagination(client):
+    login(client, "admin", "adminpass")
+    for i in range(5):
+        client.post('/api/tickets', json={
+            "title": f"Ticket {i}",
+            "status": "Closed" if i % 2 else "Open",
+            "assigned_user_ids": [2]
+        })
+
+    # Without limit/cursor the legacy array shape is kept.
+    rv = client.get('/api/tickets')
+    assert isinstance(rv.get_json(), list)
+
+    seen = []
+    cursor = None
+    while True:
+        url = '/api/tickets?limit=2' + (f'&cursor={cursor}' if cursor else '')
+        body = client.get(url).get_json()
+        seen += [t['id'] for t in body['items']]
+        cursor = body['next_cursor']
+        if not cursor:
+            break
+    assert seen == [1, 2, 3, 4, 5]
+
+    body = client.get('/api/tickets?limit=2&sort=-id').get_json()
+    assert [t['id'] for t in body['items']] == [5, 4]
+    body = client.get(f"/api/tickets?limit=2&sort=-id&cursor={body['next_cursor']}").get_json()
+    assert [t['id'] for t in body['items']] == [3, 2]
+
+    body = client.get('/api/tickets?limit=10&status=Closed').get_json()
+    assert [t['id'] for t in body['items']] == [2, 4]
+    assert body['next_cursor'] is None
+
+    assert client.get('/api/tickets?limit=10&assignee=1').get_json()['items'] == []
+    assert client.get('/api/tickets?limit=2&cursor=garbage').status_code == 400
+    assert client.get('/api/tickets?sort=title').status_code == 400
+
+def test_get_ticket_comments_pagination(client):
+    login(client, "admin", "adminpass")
+    client.post('/api/tickets', json={"title": "Ticket", "assigned_user_ids": [2]})
+    for i in range(3):
+        client.post('/api/tickets/1/comments', json={"content": f"Comment {i}"})
+
+    body = client.get('/api/tickets/1/comments?limit=2').get_json()
+    assert [c['content'] for c in body['items']] == ["Comment 0", "Comment 1"]
+    body = client.get(f"/api/tickets/1/comments?limit=2&cursor={body['next_cursor']}").get_json()
+    assert [c['content'] for c in body['items']] == ["Comment 2"]
+    assert body['next_cursor'] is None
+
+    # A cursor from one sort can't be replayed against another.
+    cursor = client.get('/api/tickets/1/comments?limit=1').get_json()['next_cursor']
+    assert client.get(f'/api/tickets/1/comments?limit=1&sort=id&cursor={cursor}').status_code == 400
+
+def test_duplicate_assignment_rejected_by_unique_index(client):
+    login(client, "admin", "adminpass")
+    client.post('/api/tickets', json={"title": "Ticket", "assigned_user_ids": [2, 2]})
+    assert TicketAssignment.query.filter_by(ticket_id=1, user_id=2).count() == 1
+    rv = client.post('/api/tickets/1/assignments', json={"user_id": 2})
+    assert rv.status_code == 400
+    assert client.get('/api/tickets/1').status_code == 200
+
+def test_migrations_match_models(tmp_path):
+    # Upgrading an empty database to head must produce exactly the schema in models.py.
+    from flask_migrate import upgrade
+    from alembic.migration import MigrationContext
+    from alembic.autogenerate import compare_metadata
+    from .search import is_search_table
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'migrated.db'}",
+        'SECRET_KEY': 'test',
+    })
+    init_migrate(app)
+    with app.app_context():
+        upgrade()
+        with db.engine.connect() as conn:
+            context = MigrationContext.configure(conn, opts={
+                'include_name': lambda name, type_, parents: not (type_ == 'table' and is_search_table(name)),
+            })
+            diff = compare_metadata(context, db.metadata)
+        assert diff == []
+
+def test_ticket_access_cache_invalidated_on_assignment_changes(client):
+    client.application.config['ACCESS_CACHE_TTL'] = 60
+    login(client, "admin", "adminpass")
+    client.post('/api/tickets', json={"title": "Ticket", "assigned_user_ids": [1]})
+    logout(client)
+
+    login(client, "user", "userpass")
+    assert client.get('/api/tickets/1').status_code == 403
+    logout(client)
+
+    login(client, "admin", "adminpass")
+    client.post('/api/tickets/1/assignments', json={"user_id": 2})
+    logout(client)
+
+    login(client, "user", "userpass")
+    assert client.get('/api/tickets/1').status_code == 200
+    assert client.get('/api/tickets/1/comments').status_code == 200
+    logout(client)
+
+    login(client, "admin", "adminpass")
+    client.delete('/api/tickets/1/assignments/2')
+    stats = client.get('/api/dev/cache-stats').get_json()['ticket_access']
+    assert stats['hits'] >= 1
+    logout(client)
+
+    login(client, "user", "userpass")
+    assert client.get('/api/tickets/1').status_code == 403
+
+def test_session_user_is_cached_and_invalidated(isolated_client, monkeypatch):
+    client = isolated_client
+    monkeypatch.setenv("ELEVATE_ADMIN_SECRET", "devsecret")
+    monkeypatch.setenv("DELETE_USER_SECRET", "deletesecret")
+    # Off by default without CACHE_REDIS_URL, since other workers couldn't be invalidated.
+    if not client.application.config['CACHE_REDIS_URL']:
+        assert client.application.config['USER_CACHE_TTL'] == 0
+    client.application.config['USER_CACHE_TTL'] = 30
+    login(client, "user", "userpass")
+    client.get('/api/session')
+    rv, queries = count_queries(lambda: client.get('/api/session'), client.application)
+    assert rv.status_code == 200
+    assert queries == 0
+
+    rv = client.post('/api/dev/elevate-user', json={"user_id": 2, "dev_password": "devsecret"})
+    assert rv.status_code == 200
+    assert client.get('/api/session').get_json()['role'] == "admin"
+
+    rv = client.delete('/api/users/2', json={"delete_secret": "deletesecret"})
+    assert rv.status_code == 200
+    assert client.get('/api/session').status_code == 401
+
+def test_ticket_listing_etag_and_conditional_get(client):
+    login(client, "admin", "adminpass")
+    client.post('/api/tickets', json={"title": "Ticket", "assigned_user_ids": [2]})
+
+    rv = client.get('/api/tickets')
+    etag = rv.headers['ETag']
+    rv, queries = count_queries(lambda: client.get('/api/tickets', headers={'If-None-Match': etag}))
+    assert rv.status_code == 304
+    assert rv.data == b''
+    assert queries == 1
+
+    # Any change to the ticket, its assignments or comments produces a new ETag.
+    client.post('/api/tickets/1/comments', json={"content": "New"})
+    rv = client.get('/api/tickets', headers={'If-None-Match': etag})
+    assert rv.status_code == 200
+    assert rv.headers['ETag'] != etag
+
+    # Different query parameters never share an ETag.
+    assert client.get('/api/tickets?status=Open').headers['ETag'] != rv.headers['ETag']
+
+def test_ticket_and_comments_etag_follow_ticket_version(client):
+    login(client, "admin", "adminpass")
+    client.post('/api/tickets', json={"title": "Ticket", "assigned_user_ids": [2]})
+
+    ticket_etag = client.get('/api/tickets/1').headers['ETag']
+    comments_etag = client.get('/api/tickets/1/comments').headers['ETag']
+    assert client.get('/api/tickets/1', headers={'If-None-Match': ticket_etag}).status_code == 304
+    assert client.get('/api/tickets/1/comments', headers={'If-None-Match': comments_etag}).status_code == 304
+
+    client.post('/api/tickets/1/comments', json={"content": "New"})
+    rv = client.get('/api/tickets/1/comments', headers={'If-None-Match': comments_etag})
+    assert rv.status_code == 200
+    assert len(rv.get_json()) == 1
+
+    client.patch('/api/tickets/1', json={"status": "Closed"})
+    rv = client.get('/api/tickets/1', headers={'If-None-Match': ticket_etag})
+    assert rv.status_code == 200
+    assert rv.get_json()['status'] == "Closed"
+
+    user_etag = client.get('/api/users/2').headers['ETag']
+    assert client.get('/api/users/2', headers={'If-None-Match': user_etag}).status_code == 304
+
+def read_events(client, **headers):
+    # Collect the events from one (short) stream; see EVENTS_STREAM_MAX_SECONDS.
+    client.application.config.update(EVENTS_STREAM_MAX_SECONDS=0.2, EVENTS_HEARTBEAT_SECONDS=0.05)
+    rv = client.get('/api/events', headers=headers)
+    assert rv.status_code == 200
+    assert rv.mimetype == 'text/event-stream'
+    events = []
+    for frame in rv.get_data(as_text=True).split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in frame.splitlines() if ": " in line and not line.startswith(":"))
+        if 'data' in fields and 'id' in fields:
+            events.append(json.loads(fields['data']))
+    return events
+
+def test_change_feed_waits_once_for_a_rolled_back_event_id(client):
+    import time
+    from .models import ChangeEvent
+    login(client, "admin", "adminpass")
+    client.post('/api/tickets', json={"title": "First", "assigned_user_ids": [2]})
+    # Event 2 was rolled back after taking its id.
+    db.session.add(ChangeEvent(id=3, kind='ticket.updated', ticket_id=1, payload={}))
+    db.session.commit()
+    client.application.config['EVENTS_GAP_GRACE_SECONDS'] = 0.1
+
+    started = time.monotonic()
+    assert [e['id'] for e in read_events(client, **{'Last-Event-ID': '1'})] == [3]
+    assert time.monotonic() - started >= 0.1
+
+    # Later streams know the gap is permanent; the grace would outlast the stream.
+    client.application.config['EVENTS_GAP_GRACE_SECONDS'] = 60
+    assert [e['id'] for e in read_events(client, **{'Last-Event-ID': '1'})] == [3]
+
+def test_change_feed_resumes_and_filters_by_visibility(client):
+    login(client, "admin", "adminpass")
+    client.post('/api/tickets', json={"title": "Theirs", "assigned_user_ids": [2]})
+    client.post('/api/tickets', json={"title": "Admin only", "assigned_user_ids": [1]})
+    client.post('/api/tickets/1/comments', json={"content": "Hello"})
+    client.post('/api/tickets/2/comments', json={"content": "Secret"})
+
+    events = read_events(client, **{'Last-Event-ID': '0'})
+    assert [e['kind'] for e in events] == ['ticket.created', 'ticket.created', 'comment.created', 'comment.created']
+    assert read_events(client, **{'Last-Event-ID': str(events[-1]['id'])}) == []
+    # Without Last-Event-ID the stream starts at the current end of the log.
+    assert read_events(client) == []
+    logout(client)
+
+    login(client, "user", "userpass")
+    events = read_events(client, **{'Last-Event-ID': '0'})
+    assert [(e['kind'], e['ticket_id']) for e in events] == [('ticket.created', 1), ('comment.created', 1)]
+    logout(client)
+
+    login(client, "admin", "adminpass")
+    client.delete('/api/tickets/1/assignments/2')
+    client.post('/api/tickets/1/comments', json={"content": "After unassigning"})
+    logout(client)
+
+    # Being unassigned is delivered, later changes to that ticket are not.
+    login(client, "user", "userpass")
+    events = read_events(client, **{'Last-Event-ID': str(events[-1]['id'])})
+    assert [e['kind'] for e in events] == ['assignment.deleted']
+
+def test_bulk_create_tickets(client):
+    login(client, "admin", "adminpass")
+    tickets = [{"title": f"Imported {i}", "assigned_user_ids": [1, 2]} for i in range(30)]
+    tickets.insert(3, {"title": "Bad", "assigned_user_ids": [2, 99]})
+    tickets.insert(5, {"assigned_user_ids": [2]})
+
+    rv, statements = capture_queries(lambda: client.post('/api/tickets/bulk', json={"tickets": tickets}))
+    assert rv.status_code == 201
+    body = rv.get_json()
+    assert body['created'] == 30
+    assert body['results'][3] == {"index": 3, "status": "error", "error": "Users not found: [99]"}
+    assert body['results'][5]['status'] == "error"
+    assert body['results'][0] == {"index": 0, "status": "created", "id": 1}
+    # One lookup for all assignees and one multi-row insert for all assignments.
+    # (SQLite can't batch INSERT .. RETURNING in order, so tickets are excluded.)
+    assert sum(st.startswith("SELECT users.id") for st in statements) == 1
+    assert sum(st.startswith("INSERT INTO ticket_assignments") for st in statements) == 1
+    assert TicketAssignment.query.count() == 60
+
+    rv = client.post('/api/tickets/bulk', json={"tickets": tickets, "atomic": True})
+    assert rv.status_code == 400
+    assert Ticket.query.count() == 30
+
+def test_bulk_create_reports_malformed_ids_per_item(client):
+    login(client, "admin", "adminpass")
+    rv = client.post('/api/tickets/bulk', json={"tickets": [
+        {"title": "Nested", "assigned_user_ids": [[1]]},
+        {"title": "Object", "assigned_user_ids": [{"id": {}}]},
+        {"title": "Good", "assigned_user_ids": [1]},
+    ]})
+    assert rv.status_code == 201
+    results = rv.get_json()['results']
+    assert [r['status'] for r in results] == ["error", "error", "created"]
+    assert results[0]['error'] == "assigned_user_ids must be integers"
+
+def test_bulk_create_rejects_over_long_title_per_item(client):
+    login(client, "admin", "adminpass")
+    rv = client.post('/api/tickets/bulk', json={"tickets": [
+        {"title": "x" * 101, "assigned_user_ids": [1]},
+        {"title": "x" * 100, "assigned_user_ids": [1]},
+    ]})
+    assert rv.status_code == 201
+    assert rv.get_json()['results'][0] == {
+        "index": 0, "status": "error", "error": "title must be at most 100 characters",
+    }
+    assert Ticket.query.count() == 1
+
+def test_bulk_assign_users(client):
+    login(client, "admin", "adminpass")
+    register(client, "third", "password123")
+    client.post('/api/tickets', json={"title": "Ticket", "assigned_user_ids": [2]})
+
+    rv = client.post('/api/tickets/1/assignments/bulk', json={"user_ids": [2, 3, 42, 3]})
+    assert rv.status_code == 200
+    assert rv.get_json() == {"assigned": 1, "results": [
+        {"user_id": 2, "status": "already_assigned"},
+        {"user_id": 3, "status": "assigned"},
+        {"user_id": 42, "status": "not_found"},
+    ]}
+    assert [u['user_id'] for u in client.get('/api/tickets/1').get_json()['assigned_users']] == [2, 3]
+
+    rv = client.post('/api/tickets/1/assignments/bulk', json={"user_ids": [[1], {"id": {}}, True, 1]})
+    assert rv.status_code == 200
+    assert rv.get_json() == {"assigned": 1, "results": [
+        {"user_id": [1], "status": "invalid"},
+        {"user_id": {"id": {}}, "status": "invalid"},
+        {"user_id": True, "status": "invalid"},
+        {"user_id": 1, "status": "assigned"},
+    ]}
+
+def test_export_streams_tickets_with_assignees_and_comments(client):
+    client.application.config['EXPORT_CHUNK_SIZE'] = 2
+    login(client, "admin", "adminpass")
+    client.post('/api/tickets/bulk', json={"tickets": [
+        {"title": f"Ticket {i}", "assigned_user_ids": [2]} for i in range(5)
+    ]})
+    client.post('/api/tickets/1/comments', json={"content": "First"})
+    client.post('/api/tickets/1/comments', json={"content": "Second, with a comma"})
+    client.post('/api/tickets', json={"title": "Private", "assigned_user_ids": [1]})
+
+    rv = client.get('/api/tickets/export')
+    assert rv.status_code == 200
+    assert rv.is_streamed
+    lines = [json.loads(line) for line in rv.get_data(as_text=True).splitlines()]
+    assert [t['id'] for t in lines] == [1, 2, 3, 4, 5, 6]
+    assert lines[0]['assigned_users'] == [{"user_id": 2, "username": "user"}]
+    assert [c['content'] for c in lines[0]['comments']] == ["First", "Second, with a comma"]
+
+    # Chunked loading: statements grow with the number of chunks, not tickets.
+    rv, queries = count_queries(lambda: client.get('/api/tickets/export?status=Open').get_data())
+    assert queries <= 2 + 2 * 3 + 1
+
+    import csv, io
+    rows = list(csv.reader(io.StringIO(client.get('/api/tickets/export?format=csv').get_data(as_text=True))))
+    assert rows[0][0] == 'ticket_id'
+    assert len(rows) == 1 + 2 + 5  # header, two comment rows for ticket 1, one row for each other ticket
+    assert rows[2][-1] == "Second, with a comma"
+    logout(client)
+
+    login(client, "user", "userpass")
+    lines = client.get('/api/tickets/export').get_data(as_text=True).splitlines()
+    assert len(lines) == 5
+    assert client.get('/api/tickets/export?format=xml').status_code == 400
+
+def test_search_pages_through_tickets_with_equal_rank(client):
+    login(client, "admin", "adminpass")
+    client.post('/api/tickets/bulk', json={"tickets": [
+        {"title": "Toner low", "description": "Replace the toner", "assigned_user_ids": [1]} for _ in range(5)
+    ]})
+    seen, cursor = [], None
+    while True:
+        body = client.get('/api/search?q=toner&limit=2' + (f'&cursor={cursor}' if cursor else '')).get_json()
+        seen += body['items']
+        cursor = body['next_cursor']
+        if cursor is None:
+            break
+    assert len({item['rank'] for item in seen}) == 1
+    # Ties are ordered by id (descending, like the rank), each exactly once.
+    assert [item['id'] for item in seen] == [5, 4, 3, 2, 1]
+
+def test_search_ranks_visible_tickets_and_follows_edits(client):
+    login(client, "admin", "adminpass")
+    client.post('/api/tickets', json={"title": "Printer jam", "description": "The printer jams on every page", "assigned_user_ids": [2]})
+    client.post('/api/tickets', json={"title": "Laptop", "description": "Battery drains", "assigned_user_ids": [1]})
+    client.post('/api/tickets', json={"title": "Network", "description": "Wifi drops near the printer", "assigned_user_ids": [2]})
+
+    body = client.get('/api/search?q=printer').get_json()
+    assert [t['id'] for t in body['items']] == [1, 3]
+    assert body['items'][0]['rank'] >= body['items'][1]['rank']
+
+    # Edits and comments are searchable straight away.
+    client.patch('/api/tickets/2', json={"description": "Printer driver crash"})
+    client.post('/api/tickets/3/comments', json={"content": "Replaced the printer cable"})
+    body = client.get('/api/search?q=printer&limit=2').get_json()
+    assert len(body['items']) == 2
+    rest = client.get(f"/api/search?q=printer&limit=2&cursor={body['next_cursor']}").get_json()
+    assert sorted(t['id'] for t in body['items'] + rest['items']) == [1, 2, 3]
+    assert rest['next_cursor'] is None
+
+    client.delete('/api/tickets/1')
+    assert [t['id'] for t in client.get('/api/search?q=jams').get_json()['items']] == []
+    assert client.get('/api/search?q=%22*').status_code == 400
+    logout(client)
+
+    # Standard users only find tickets they are assigned to.
+    login(client, "user", "userpass")
+    assert [t['id'] for t in client.get('/api/search?q=printer').get_json()['items']] == [3]
+
+def test_benchmark_seed_and_workload_smoke(tmp_path):
+    from benchmarks.seed import seed
+    from benchmarks.workload import AppClient, run_workload, summarize
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'bench.db'}", 'SECRET_KEY': 'test'})
+    with app.app_context():
+        db.create_all()
+        counts = seed(100, log=lambda message: None)
+        AppClient.instrument(db.engine)
+        user_ids = db.session.scalars(db.select(User.id).where(User.role == 'standard')).all()
+    assert counts['tickets'] == 100 and counts['users'] == 10
+
+    samples, wall = run_workload(lambda: AppClient(app), ['bench0', 'bench1'], {'bench0'}, user_ids, duration=0.5)
+    report = summarize(samples, wall)
+    assert report['overall']['requests'] > 0
+    assert report['overall']['errors'] == 0
+    assert report['operations']['list_tickets']['queries_per_request'] > 0
+
+def test_request_instrumentation_headers_metrics_and_profiles(client, tmp_path):
+    import json as jsonlib
+    config = client.application.config
+    config.update(METRICS_DIR=str(tmp_path / 'metrics'), METRICS_FLUSH_SECONDS=0,
+                  PROFILE_SAMPLE_RATE=1, SLOW_REQUEST_MS=0, PROFILE_DIR=str(tmp_path / 'profiles'))
+    login(client, "admin", "adminpass")
+    rv = client.get('/api/tickets')
+    timing = rv.headers['Server-Timing']
+    assert 'db;dur=' in timing and 'queries"' in timing and 'app;dur=' in timing
+    assert 'hash;dur=' in login(client, "admin", "adminpass").headers['Server-Timing']
+    assert list((tmp_path / 'profiles').glob('*main.get_tickets*.prof'))
+
+    def tickets_count():
+        body = client.get('/metrics').get_data(as_text=True)
+        line = next(line for line in body.splitlines()
+                    if line.startswith('http_request_duration_seconds_count{endpoint="main.get_tickets",method="GET"}'))
+        return int(line.split()[-1])
+
+    # Counters are per process, so compare before and after another worker's
+    # file appears in the shared directory.
+    before = tickets_count()
+    (tmp_path / 'metrics' / 'other.json').write_text(jsonlib.dumps({
+        'routes': {'main.get_tickets GET': {'buckets': [1] + [0] * 10, 'count': 1, 'sum': 0.001, 'db_queries': 2, 'db_seconds': 0.0005}},
+        'statuses': {'main.get_tickets GET 200': 1},
+    }))
+    assert tickets_count() == before + 1
+    assert 'db_queries_total{endpoint="main.get_tickets",method="GET"}' in client.get('/metrics').get_data(as_text=True)
+
+    config['METRICS_TOKEN'] = 'secret'
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer secret'}).status_code == 200
+
+def test_exited_workers_metrics_are_archived(tmp_path):
+    from .instrumentation import archive_worker, collect
+    app = make_app()
+    app.config.update(METRICS_DIR=str(tmp_path))
+
+    def worker_file(name, count):
+        (tmp_path / name).write_text(json.dumps({
+            'pid': 999999999, 'routes': {}, 'statuses': {'main.get_tickets GET 200': count},
+            'counters': {'result_cache_hits_total': count}, 'gauges': {'db_pool_idle': 3},
+        }))
+
+    def totals():
+        with app.app_context():
+            total = collect()
+        return total['statuses'].get('main.get_tickets GET 200', 0), total['counters'].get('result_cache_hits_total', 0)
+
+    before = totals()
+    worker_file('101-aaaa.json', 2)
+    worker_file('102-bbbb.json', 3)
+    archive_worker(str(tmp_path), 101)
+    archive_worker(str(tmp_path), 102)
+    archive_worker(str(tmp_path), 103)
+
+    assert sorted(path.name for path in tmp_path.glob('*.json')) == ['archive.json']
+    assert totals() == (before[0] + 5, before[1] + 5)
+    assert json.loads((tmp_path / 'archive.json').read_text())['gauges'] == {}
+
+def test_metrics_collect_without_fcntl(tmp_path, monkeypatch):
+    # Windows has no fcntl; the shared files are then read without a lock.
+    import sys
+    from .instrumentation import collect
+    monkeypatch.setitem(sys.modules, 'fcntl', None)
+    app = make_app()
+    app.config.update(METRICS_DIR=str(tmp_path))
+    (tmp_path / '101-aaaa.json').write_text(json.dumps({'routes': {}, 'statuses': {'main.get_tickets GET 200': 2}}))
+    with app.app_context():
+        assert collect()['statuses']['main.get_tickets GET 200'] >= 2
+
+def test_engine_options_from_config():
+    from sqlalchemy.pool import NullPool
+    from .pool import engine_options, InstrumentedQueuePool
+    config = dict(make_app().config, SQLALCHEMY_DATABASE_URI='postgresql://app@db/app')
+    options = engine_options(config)
+    assert options['poolclass'] is InstrumentedQueuePool
+    assert options['pool_size'] == config['DB_POOL_SIZE'] and options['pool_pre_ping'] is True
+    assert options['connect_args'] == {'options': f"-c statement_timeout={config['DB_STATEMENT_TIMEOUT_MS']}"}
+
+    # Behind PgBouncer the timeout is set per transaction instead of at connect.
+    assert 'connect_args' not in engine_options(dict(config, DB_PGBOUNCER=True))
+    assert engine_options(dict(config, DB_POOL_SIZE=0))['poolclass'] is NullPool
+    assert engine_options(dict(config, SQLALCHEMY_DATABASE_URI='sqlite:///:memory:')) == {}
+
+def test_pool_wait_and_timeout_metrics(client, tmp_path):
+    from sqlalchemy import create_engine, exc
+    from .instrumentation import metrics
+    from .pool import InstrumentedQueuePool
+    engine = create_engine(f"sqlite:///{tmp_path / 'pool.db'}", poolclass=InstrumentedQueuePool,
+                           pool_size=1, max_overflow=0, pool_timeout=0.05)
+    before = metrics().snapshot()
+    held = engine.connect()
+    with pytest.raises(exc.TimeoutError):
+        engine.connect()
+    held.close()
+    after = metrics().snapshot()
+    assert after['counters']['db_pool_timeouts_total'] == before['counters'].get('db_pool_timeouts_total', 0) + 1
+    waits = before['histograms'].get('db_pool_wait_seconds', {'count': 0})['count']
+    assert after['histograms']['db_pool_wait_seconds']['count'] == waits + 2
+
+    body = client.get('/metrics').get_data(as_text=True)
+    assert 'db_pool_timeouts_total ' in body and 'db_pool_checked_out ' in body
+    assert 'db_pool_wait_seconds_bucket{le="0.001"}' in body
+
+def make_replicated_app(tmp_path, replica_uri=None):
+    # A file-based primary and a copy of it standing in for a replica. Rows
+    # added to only one of them show which database served a request.
+    import shutil
+    from werkzeug.security import generate_password_hash
+    primary = tmp_path / 'primary.db'
+    config = {
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{primary}",
+        'SECRET_KEY': 'test',
+    }
+    app = create_app(config)
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(username="admin", password=generate_password_hash("adminpass"), role="admin"))
+        db.session.commit()
+    shutil.copy(primary, tmp_path / 'replica.db')
+
+    app = create_app(dict(config, DATABASE_REPLICA_URIS=[replica_uri or f"sqlite:///{tmp_path / 'replica.db'}"]))
+    if replica_uri is None:
+        with app.extensions['replicas'][0].engine.begin() as conn:
+            conn.execute(Ticket.__table__.insert().values(id=99, title="Replica only", description="", creator_id=1))
+    return app
+
+def test_reads_go_to_replica_until_client_writes(tmp_path):
+    from .instrumentation import metrics
+    app = make_replicated_app(tmp_path)
+    client = app.test_client()
+    assert login(client, "admin", "adminpass").status_code == 200
+
+    counters = lambda: metrics().snapshot()['counters']
+    with app.app_context():
+        before = counters().get('db_replica_requests_total', 0)
+        assert client.get('/api/tickets/99').status_code == 200
+        assert counters()['db_replica_requests_total'] == before + 1
+
+    # After a write the client reads from the primary until the pin expires.
+    assert client.post('/api/tickets', json={"title": "New", "description": "d", "assigned_user_ids": [1]}).status_code == 201
+    assert client.get('/api/tickets/99').status_code == 404
+    with client.session_transaction() as session:
+        session['_primary_until'] = 0
+    assert client.get('/api/tickets/99').status_code == 200
+
+def test_reads_fall_back_to_primary_without_replica(tmp_path):
+    from .instrumentation import metrics
+    app = make_replicated_app(tmp_path, replica_uri=f"sqlite:///{tmp_path / 'missing' / 'replica.db'}")
+    client = app.test_client()
+    assert login(client, "admin", "adminpass").status_code == 200
+    with client.session_transaction() as session:
+        session.pop('_primary_until', None)
+
+    counters = lambda: metrics().snapshot()['counters']
+    with app.app_context():
+        before = counters().get('db_replica_fallbacks_total', 0)
+        assert client.get('/api/users/1').status_code == 200
+        assert counters()['db_replica_fallbacks_total'] == before + 1
+
+def test_reads_retried_on_primary_when_replica_connection_fails(tmp_path):
+    import sqlite3
+    from sqlalchemy import event
+    app = make_replicated_app(tmp_path)
+    client = app.test_client()
+    assert login(client, "admin", "adminpass").status_code == 200
+    with client.session_transaction() as session:
+        session.pop('_primary_until', None)
+
+    # The replica passed its last health check, then goes away.
+    replica = app.extensions['replicas'][0]
+    replica.checked_at = float('inf')
+    replica.engine.dispose()
+    @event.listens_for(replica.engine, 'do_connect')
+    def refuse(dialect, conn_rec, cargs, cparams):
+        raise sqlite3.OperationalError("could not connect to server")
+
+    rv = client.get('/api/users/1')
+    assert rv.status_code == 200
+    assert rv.get_json()['username'] == "admin"
+    assert not replica.healthy
+    # Ticket 99 only exists on the replica: the read was served by the primary.
+    assert client.get('/api/tickets/99').status_code == 404
+
+def test_login_upgrades_outdated_password_hash(client):
+    from werkzeug.security import generate_password_hash
+    with client.application.app_context():
+        user = db.session.get(User, 2)
+        user.password = generate_password_hash("userpass", method='pbkdf2:sha256', salt_length=8)
+        db.session.commit()
+
+    assert login(client, "user", "userpass").status_code == 200
+    stored = db.session.get(User, 2).password
+    assert stored.startswith(client.application.config['PASSWORD_HASH_METHOD'] + '$')
+    logout(client)
+    assert login(client, "user", "userpass").status_code == 200
+
+def test_password_hashes_fit_the_column(client):
+    # SQLite ignores VARCHAR lengths; Postgres rejects longer values.
+    from .passwords import hash_password
+    assert len(hash_password("password123")) <= User.password.type.length
+    assert len(db.session.get(User, 2).password) <= User.password.type.length
+
+def test_login_throttled_after_repeated_failures(isolated_client):
+    limit = isolated_client.application.config['LOGIN_MAX_FAILURES']
+    for _ in range(limit):
+        assert login(isolated_client, "user", "wrong").status_code == 401
+    rv = login(isolated_client, "user", "userpass")
+    assert rv.status_code == 429 and int(rv.headers['Retry-After']) > 0
+    # Other accounts from the same client are not affected yet.
+    assert login(isolated_client, "admin", "adminpass").status_code == 200
+
+def test_hash_executor_rejects_when_full():
+    import threading
+    from .passwords import HashExecutor, HashingBusy
+    executor = HashExecutor(threads=1, queue=0)
+    release = threading.Event()
+    started = threading.Event()
+    def hold():
+        started.set()
+        release.wait(5)
+    holder = threading.Thread(target=executor.run, args=(hold,))
+    holder.start()
+    started.wait(5)
+    with pytest.raises(HashingBusy):
+        executor.run(lambda: None)
+    release.set()
+    holder.join()
+    assert executor.run(lambda: 42) == 42
+
+def test_ticket_counters_and_summary(client):
+    login(client, "admin", "adminpass")
+    register(client, "third", "password123")
+    client.post('/api/tickets', json={"title": "A", "description": "d", "assigned_user_ids": [2]})
+    client.post('/api/tickets', json={"title": "B", "description": "d", "status": "Closed", "assigned_user_ids": [2, 3]})
+    comment = client.post('/api/tickets/1/comments', json={"content": "first"}).get_json()['comment']
+    client.post('/api/tickets/1/comments', json={"content": "second"})
+    client.post('/api/tickets/1/assignments', json={"user_id": 3})
+    client.delete(f"/api/comments/{comment['id']}")
+    client.delete('/api/tickets/2/assignments/2')
+
+    tickets = {ticket['id']: ticket for ticket in client.get('/api/tickets').get_json()}
+    assert (tickets[1]['comment_count'], tickets[1]['assignee_count']) == (1, 2)
+    assert (tickets[2]['comment_count'], tickets[2]['assignee_count']) == (0, 1)
+    assert tickets[1]['last_activity_at'] is not None
+
+    rv, queries = count_queries(lambda: client.get('/api/tickets/summary'))
+    summary = rv.get_json()
+    assert summary['total'] == 2
+    assert sorted((row['status'], row['count']) for row in summary['by_status']) == [('Closed', 1), ('Open', 1)]
+    assert summary['by_creator'] == [{'user_id': 1, 'username': 'admin', 'count': 2}]
+    assert sorted((row['user_id'], row['count']) for row in summary['by_assignee']) == [(2, 1), (3, 2)]
+    assert queries <= 2  # ETag + the aggregate
+    assert client.get('/api/tickets/summary', headers={'If-None-Match': rv.headers['ETag']}).status_code == 304
+
+    # Standard users only count the tickets they can see.
+    logout(client)
+    login(client, "user", "userpass")
+    assert client.get('/api/tickets/summary?status=Open').get_json()['total'] == 1
+
+def test_frontend_served_from_route_table(tmp_path):
+    import gzip
+    from . import assets
+    (tmp_path / '_next' / 'static').mkdir(parents=True)
+    (tmp_path / 'tickets').mkdir()
+    (tmp_path / 'index.html').write_text("<html>index</html>")
+    (tmp_path / 'tickets' / 'lookup.html').write_text("<html>lookup</html>")
+    (tmp_path / '_next' / 'static' / 'app.js').write_text("var a = 1;")
+    (tmp_path / '_next' / 'static' / 'app.js.gz').write_bytes(gzip.compress(b"var a = 1;"))
+    app = make_app()
+    app.static_folder = str(tmp_path)
+    assets.init_app(app)
+    client = app.test_client()
+
+    rv = client.get('/_next/static/app.js', headers={'Accept-Encoding': 'gzip, deflate'})
+    assert rv.headers['Content-Encoding'] == 'gzip' and 'immutable' in rv.headers['Cache-Control']
+    assert gzip.decompress(rv.data) == b"var a = 1;" and rv.mimetype == 'text/javascript'
+    rv = client.get('/_next/static/app.js')
+    assert 'Content-Encoding' not in rv.headers and rv.data == b"var a = 1;"
+
+    assert b"lookup" in client.get('/tickets/lookup').data
+    rv = client.get('/some/client/route')
+    assert b"index" in rv.data and rv.headers['Cache-Control'] == 'no-cache'
+    assert client.get('/_next/static/missing.js').status_code == 404
+
+def test_json_encoding_and_compression(client):
+    import gzip
+    from datetime import datetime
+    from flask.json.provider import DefaultJSONProvider
+    app = client.application
+    value = {'b': datetime(2026, 1, 2, 3, 4, 5), 'a': [1, None, "x"]}
+    # Same output as Flask's own provider.
+    assert app.json.response(value).data == DefaultJSONProvider(app).response(value).data
+
+    login(client, "admin", "adminpass")
+    client.post('/api/tickets/bulk', json={"tickets": [
+        {"title": f"Ticket {i}", "description": "x" * 100, "assigned_user_ids": [2]} for i in range(20)
+    ]})
+    plain = client.get('/api/tickets', headers={'Accept-Encoding': 'identity'})
+    assert 'Content-Encoding' not in plain.headers
+    rv = client.get('/api/tickets', headers={'Accept-Encoding': 'gzip'})
+    assert rv.headers['Content-Encoding'] == 'gzip' and 'Accept-Encoding' in rv.headers['Vary']
+    assert gzip.decompress(rv.data) == plain.data
+    assert rv.headers['ETag'].startswith('W/')
+    assert client.get('/api/tickets', headers={'If-None-Match': rv.headers['ETag']}).status_code == 304
+    # Small responses are sent as is.
+    assert 'Content-Encoding' not in client.get('/api/session', headers={'Accept-Encoding': 'gzip'}).headers
+
+def test_rate_limit_per_endpoint_and_client(isolated_client):
+    import time
+    from .instrumentation import metrics
+    client = isolated_client
+    app = client.application
+    app.config['RATELIMIT_ROUTES'] = dict(app.config['RATELIMIT_ROUTES'], **{
+        'main.login_user_endpoint': '2/minute', 'main.get_tickets': '1/minute burst 2',
+    })
+    with app.app_context():
+        before = metrics().snapshot()['counters'].get('ratelimit_rejected_total', 0)
+
+    # Logged out, attempts are counted per IP.
+    assert login(client, "user", "wrong").status_code == 401
+    assert login(client, "user", "wrong").status_code == 401
+    rv = login(client, "admin", "adminpass")
+    assert rv.status_code == 429 and 0 < int(rv.headers['Retry-After']) <= 30
+    app.config['RATELIMIT_ROUTES']['main.login_user_endpoint'] = None
+    app.extensions['ratelimit']['limits'].clear()
+    assert login(client, "admin", "adminpass").status_code == 200
+
+    # Logged in, per user and endpoint: other endpoints are unaffected.
+    assert [client.get('/api/tickets').status_code for _ in range(3)] == [200, 200, 429]
+    assert client.get('/api/users').status_code == 200
+    assert client.get('/metrics').status_code == 200
+    with app.app_context():
+        assert metrics().snapshot()['counters']['ratelimit_rejected_total'] == before + 2
+
+    # Requests that queued past the budget are refused before doing any work.
+    app.config['ADMISSION_QUEUE_BUDGET_MS'] = 1000
+    rv = client.get('/api/users', headers={'X-Request-Start': f"t={time.time() - 5:.3f}"})
+    assert rv.status_code == 429 and rv.headers['Retry-After'] == '1'
+    fresh = client.get('/api/users', headers={'X-Request-Start': f"t={int(time.time() * 1000)}"})
+    assert fresh.status_code == 200
+
+def test_large_delete_queued_as_job_and_retried(client, monkeypatch):
+    from .jobs import HANDLERS, enqueue, work
+    from .models import Job, utcnow
+    client.application.config['JOBS_INLINE_MAX_ROWS'] = 0
+    login(client, "admin", "adminpass")
+    client.post('/api/tickets', json={"title": "Big", "assigned_user_ids": [2]})
+
+    rv = client.delete('/api/tickets/1')
+    assert rv.status_code == 202
+    job = rv.get_json()
+    assert job['kind'] == 'delete_ticket' and job['status'] == 'queued'
+    assert rv.headers['Location'].endswith(f"/api/jobs/{job['id']}")
+    assert db.session.get(Ticket, 1) is not None
+
+    assert work(burst=True) == 1
+    status = client.get(f"/api/jobs/{job['id']}").get_json()
+    assert status['status'] == 'succeeded' and status['result'] == {'ticket_id': 1}
+    assert db.session.get(Ticket, 1) is None
+    assert client.post('/api/jobs', json={"kind": "delete_user"}).status_code == 400
+    logout(client)
+    login(client, "user", "userpass")
+    assert client.get(f"/api/jobs/{job['id']}").status_code == 404
+
+    # A failing handler is retried with backoff until it succeeds.
+    calls = []
+    def flaky():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("database went away")
+        return 'ok'
+    monkeypatch.setitem(HANDLERS, 'flaky', flaky)
+    job_id = enqueue('flaky', max_attempts=2).id
+    db.session.commit()
+    assert work(burst=True) == 1
+    job = db.session.get(Job, job_id)
+    assert job.status == 'queued' and job.attempts == 1 and job.run_at > utcnow()
+    assert 'database went away' in job.error
+    job.run_at = utcnow()
+    db.session.commit()
+    assert work(burst=True) == 1
+    job = db.session.get(Job, job_id)
+    assert (job.status, job.attempts, job.result, job.error) == ('succeeded', 2, 'ok', None)
+
+def test_deletes_cascade_in_the_database(client, monkeypatch):
+    monkeypatch.setenv("DELETE_USER_SECRET", "deletesecret")
+    login(client, "admin", "adminpass")
+    for title in ("Short", "Long"):
+        client.post('/api/tickets', json={"title": title, "assigned_user_ids": [2]})
+    client.post('/api/tickets/bulk', json={"tickets": [{"title": "Other", "assigned_user_ids": [2]}]})
+    logout(client)
+    login(client, "user", "userpass")
+    for ticket_id, comments in ((1, 2), (2, 40), (3, 40)):
+        for i in range(comments):
+            client.post(f'/api/tickets/{ticket_id}/comments', json={"content": f"Comment {i}"})
+    logout(client)
+    login(client, "admin", "adminpass")
+
+    # The statements don't depend on how many comments the ticket has.
+    (short, short_statements), (long, long_statements) = [
+        capture_queries(lambda: client.delete(f'/api/tickets/{ticket_id}')) for ticket_id in (1, 2)
+    ]
+    assert short.status_code == long.status_code == 200
+    # (Less the reload of the logged-in user, expired by the first delete's commit.)
+    long_statements = [statement for statement in long_statements if 'FROM users' not in statement]
+    assert len(long_statements) == len(short_statements) <= 6
+    assert not any(statement.lstrip().upper().startswith('DELETE FROM COMMENTS') for statement in long_statements)
+    assert Comment.query.filter(Comment.ticket_id.in_([1, 2])).count() == 0
+    assert TicketAssignment.query.filter(TicketAssignment.ticket_id.in_([1, 2])).count() == 0
+
+    # An admin who still owns tickets can't be deleted.
+    assert client.delete('/api/users/1', json={"delete_secret": "deletesecret"}).status_code == 409
+
+    rv, statements = count_queries(lambda: client.delete('/api/users/2', json={"delete_secret": "deletesecret"}))
+    assert rv.status_code == 200 and statements <= 15
+    assert Comment.query.count() == 0 and TicketAssignment.query.count() == 0
+    assert db.session.get(Ticket, 3).comment_count == 0
+
+def test_batch_lookups_and_comment_authors(client):
+    login(client, "admin", "adminpass")
+    for title in ("One", "Two", "Three"):
+        client.post('/api/tickets', json={"title": title, "assigned_user_ids": [2] if title != "Two" else [1]})
+    client.post('/api/tickets/1/comments', json={"content": "From admin"})
+    logout(client)
+    login(client, "user", "userpass")
+    client.post('/api/tickets/1/comments', json={"content": "From user"})
+
+    # Tickets the user can't see are left out rather than refused.
+    rv = client.get('/api/tickets?ids=1,2,3,99')
+    assert [t['id'] for t in rv.get_json()] == [1, 3]
+    assert client.get('/api/tickets?ids=1,x').status_code == 400
+
+    # Any logged-in user can look up usernames by id, in one query.
+    rv, queries = count_queries(lambda: client.get('/api/users?ids=2,1,99'))
+    assert rv.get_json() == [{'user_id': 1, 'username': 'admin'}, {'user_id': 2, 'username': 'user'}]
+    assert queries <= 2
+    assert client.get('/api/users').status_code == 403
+
+    # Comment authors are joined in, not looked up per comment.
+    rv, queries = count_queries(lambda: client.get('/api/tickets/1/comments'))
+    assert [(c['author_id'], c['author_username']) for c in rv.get_json()] == [(1, 'admin'), (2, 'user')]
+    assert queries <= 4
+    page = client.get('/api/tickets/1/comments?limit=1').get_json()
+    assert page['items'][0]['author_username'] == 'admin'
+
+def test_ticket_listing_result_cache(client):
+    from .instrumentation import metrics
+    from .results import invalidate
+    from werkzeug.security import generate_password_hash
+    db.session.add(User(username="admin2", password=generate_password_hash("adminpass"), role="admin"))
+    db.session.commit()
+    login(client, "admin", "adminpass")
+    client.post('/api/tickets', json={"title": "Cached", "assigned_user_ids": [2]})
+
+    def counters():
+        snapshot = metrics().snapshot()['counters']
+        return snapshot.get('result_cache_hits_total', 0), snapshot.get('result_cache_misses_total', 0)
+
+    hits, misses = counters()
+    first, first_queries = count_queries(lambda: client.get('/api/tickets'))
+    second, second_queries = count_queries(lambda: client.get('/api/tickets'))
+    assert first.get_json() == second.get_json()
+    assert second_queries < first_queries
+    assert counters() == (hits + 1, misses + 1)
+
+    # Every admin sees the same tickets, so they share the entry.
+    logout(client)
+    login(client, "admin2", "adminpass")
+    assert client.get('/api/tickets').get_json() == first.get_json()
+    assert counters() == (hits + 2, misses + 1)
+
+    # Writes invalidate it: the next listing is rebuilt with the change.
+    logout(client)
+    login(client, "admin", "adminpass")
+    client.patch('/api/tickets/1', json={"status": "Closed"})
+    assert client.get('/api/tickets').get_json()[0]['status'] == 'Closed'
+    logout(client)
+    login(client, "user", "userpass")
+    client.post('/api/tickets/1/comments', json={"content": "New"})
+    assert client.get('/api/tickets').get_json()[0]['comment_count'] == 1
+    assert client.get('/api/tickets/summary').get_json()['total'] == 1
+
+    # An invalidated tag alone is enough, even when the tickets look the same.
+    _, misses = counters()
+    invalidate('tickets')
+    db.session.commit()
+    client.get('/api/tickets')
+    assert counters()[1] == misses + 1
+
+@pytest.mark.filterwarnings("ignore:This process .* is multi-threaded")
+def test_forked_workers_drop_inherited_connections(tmp_path):
+    # With gunicorn's preload_app, workers are forked from a master that may
+    # already hold pooled connections; they must open their own.
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'forked.db'}",
+        'SECRET_KEY': 'test',
+    })
+    with app.app_context():
+        db.session.execute(db.text("SELECT 1"))
+        db.session.remove()
+        assert db.engine.pool.checkedin() == 1
+
+        pid = os.fork()
+        if pid == 0:
+            os._exit(0 if db.engine.pool.checkedin() == 0 else 1)
+        _, status = os.waitpid(pid, 0)
+        assert os.waitstatus_to_exitcode(status) == 0
+
+        # The parent's connection was left open.
+        assert db.engine.pool.checkedin() == 1
+        assert db.session.execute(db.text("SELECT 1")).scalar() == 1
+
+def test_benchmark_modules_import_and_build_request_mix():
+    # The benchmarks are run by hand; make sure they still import and that the
+    # request mix and report comparison behave.
+    import argparse
+    from benchmarks import seed, workload, concurrency, startup
+    assert concurrency.main and startup.main and seed.main
+    assert seed.parse_scale('100k') == 100_000 and seed.parse_scale('250') == 250
+    with pytest.raises(argparse.ArgumentTypeError):
+        seed.parse_scale('lots')
+
+    accounts = {f"bench{i}": i + 1 for i in range(5)}
+    usernames, admins, other_user_ids = workload.pick_users(accounts, users=3, admins=1)
+    assert usernames == ['bench0', 'bench1', 'bench2'] and admins == {'bench0'}
+    assert other_user_ids == [2, 3, 4, 5]
+    assert set(workload.STANDARD_MIX) < set(workload.ADMIN_MIX) == set(workload.STANDARD_MIX) | {'assign'}
+
+    samples = [('login', True, 0.010, 2), ('list_tickets', True, 0.020, 2), ('list_tickets', False, 0.040, 3)]
+    report = workload.summarize(samples, wall_seconds=1)
+    assert report['overall']['requests'] == 3 and report['overall']['errors'] == 1
+    assert report['operations']['list_tickets']['p95_ms'] == 40.0
+    slower = workload.summarize([(op, ok, seconds * 2, queries) for op, ok, seconds, queries in samples], 1)
+    assert workload.compare(report, report, 0.2) == []
+    assert len(workload.compare(report, slower, 0.2)) == 2
@@ -0,0 +1,88 @@
+import argparse
+import json
+import os
+import threading
+from datetime import datetime, timezone
+from .seed import PASSWORD
+from .workload import HttpClient, seeded_accounts, pick_users, run_workload, summarize, git_commit
+
+# --------------------------------
+# Concurrency scaling benchmark
+# --------------------------------
+# Runs the workload against a server at increasing numbers of concurrent users
+# and prints throughput and latency at each level. Use it to compare gunicorn
+# worker classes (see gunicorn.conf.py) on the same machine and data.
+#
+# --streams N first opens N /api/events streams and keeps them open for the
+# whole run, like N browser tabs on the tickets page. With sync workers each
+# stream holds a worker, so the other requests queue up behind them.
+#
+#   RATELIMIT_ENABLED=false GUNICORN_WORKER_CLASS=sync gunicorn app:app &
+#   python -m benchmarks.concurrency --url http://127.0.0.1:5000 --levels 1,4,16,64 --streams 4
+
+def hold_stream(base_url, username, stop, opened):
+    client = HttpClient(base_url, timeout=60)
+    client.request('POST', '/api/login', {'username': username, 'password': PASSWORD})
+    try:
+        response = client.open('GET', '/api/events')
+        opened.release()
+        while not stop.is_set():
+            if not response.fp.readline():
+                # The server ended the stream (EVENTS_STREAM_MAX_SECONDS); reopen it.
+                response = client.open('GET', '/api/events')
+    except OSError:
+        opened.release()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure throughput and latency at increasing concurrency.")
+    parser.add_argument('--url', required=True, help="Base URL of a running server.")
+    parser.add_argument('--levels', default='1,2,4,8,16,32,64',
+                        help="Comma-separated concurrent user counts (default 1,2,4,8,16,32,64).")
+    parser.add_argument('--duration', type=float, default=20, help="Measured seconds per level (default 20).")
+    parser.add_argument('--warmup', type=float, default=2, help="Unmeasured seconds per level (default 2).")
+    parser.add_argument('--streams', type=int, default=0, help="Event streams to hold open during the run.")
+    parser.add_argument('--timeout', type=float, default=10, help="Per-request timeout (default 10).")
+    parser.add_argument('--save', help="Write the results as JSON to this path.")
+    args = parser.parse_args(argv)
+
+    make_client = lambda: HttpClient(args.url, args.timeout)
+    accounts = seeded_accounts(make_client)
+    if accounts is None:
+        parser.error("Could not log in as bench0; seed the database first (python -m benchmarks.seed).")
+
+    stop = threading.Event()
+    opened = threading.Semaphore(0)
+    stream_users = sorted(accounts, key=lambda name: int(name[5:]), reverse=True)[:args.streams]
+    for username in stream_users:
+        threading.Thread(target=hold_stream, args=(args.url, username, stop, opened), daemon=True).start()
+    for _ in stream_users:
+        opened.acquire(timeout=args.timeout)
+
+    results = []
+    print(f"{'users':>6}{'requests':>10}{'errors':>8}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    try:
+        for level in [int(level) for level in args.levels.split(',')]:
+            usernames, admins, other_user_ids = pick_users(accounts, level, 1 if level > 1 else 0)
+            samples, wall = run_workload(make_client, usernames, admins, other_user_ids, args.duration, args.warmup)
+            overall = summarize(samples, wall)['overall']
+            results.append(dict(overall, users=level))
+            print(f"{level:>6}{overall['requests']:>10}{overall['errors']:>8}{overall['throughput_rps']:>10}"
+                  + "".join(f"{overall[key] if overall[key] is not None else '-':>10}" for key in ('p50_ms', 'p95_ms', 'p99_ms')))
+    finally:
+        stop.set()
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.save) or '.', exist_ok=True)
+        with open(args.save, 'w') as f:
+            json.dump({
+                'meta': {
+                    'commit': git_commit(),
+                    'recorded_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                    'target': args.url,
+                    'streams': len(stream_users),
+                },
+                'levels': results,
+            }, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+import argparse
+import random
+import time
+from backend import create_app, db
+from backend.models import User, Ticket, TicketAssignment, Comment, utcnow
+from backend.passwords import hash_password
+from backend.etag import recount_tickets
+
+# --------------------------------
+# Benchmark data generator
+# --------------------------------
+# Seeds a database (already migrated with `flask db upgrade`) with a realistic
+# shape of data. The scale is the number of tickets; the other tables grow with
+# it:
+#   users        1 per USERS_PER_TICKETS tickets (at least 10), bench0 is an admin
+#   assignments  1-3 distinct users per ticket
+#   comments     0-6 per ticket, by assigned users
+# Every user's password is PASSWORD so the workload can log in as anyone.
+#
+#   python -m benchmarks.seed --scale 100k --database-url postgresql://...
+
+SCALES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+USERS_PER_TICKETS = 50
+PASSWORD = 'benchpass'
+STATUSES = ['Open', 'Open', 'In Review', 'Closed']
+WORDS = (
+    "printer network laptop login password email vpn wifi battery screen keyboard "
+    "mouse update install crash slow error backup disk server access account "
+    "license monitor cable driver phone calendar meeting report invoice"
+).split()
+
+def parse_scale(value):
+    value = value.lower()
+    if value in SCALES:
+        return SCALES[value]
+    try:
+        return int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"scale must be one of {', '.join(SCALES)} or a number of tickets")
+
+def sentence(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+def _batches(rows, size):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+def seed(tickets, batch_size=5000, random_seed=0, log=print):
+    # Must run inside an app context. Returns the number of rows inserted per table.
+    rng = random.Random(random_seed)
+    started = time.monotonic()
+    counts = {}
+
+    # Hashing is deliberately slow, so every user shares one hash. It uses the
+    # configured method so logins don't re-hash (see backend/passwords.py).
+    password = hash_password(PASSWORD)
+    user_count = max(10, tickets // USERS_PER_TICKETS)
+    offset = db.session.scalar(db.select(db.func.count(User.id)))
+    user_ids = []
+    for batch in _batches(range(user_count), batch_size):
+        user_ids += db.session.scalars(
+            db.insert(User).returning(User.id, sort_by_parameter_order=True),
+            [{
+                'username': f"bench{offset + i}",
+                'password': password,
+                'role': 'admin' if offset + i == 0 else 'standard',
+            } for i in batch]
+        ).all()
+    db.session.commit()
+    counts['users'] = len(user_ids)
+    log(f"users: {len(user_ids)}")
+
+    counts.update(tickets=0, ticket_assignments=0, comments=0)
+    for batch in _batches(range(tickets), batch_size):
+        ticket_ids = db.session.scalars(
+            db.insert(Ticket).returning(Ticket.id, sort_by_parameter_order=True),
+            [{
+                'title': sentence(rng, 4).capitalize(),
+                'description': sentence(rng, 20),
+                'status': rng.choice(STATUSES),
+                'creator_id': user_ids[0],
+            } for _ in batch]
+        ).all()
+
+        assignments = []
+        comments = []
+        for ticket_id in ticket_ids:
+            assignees = rng.sample(user_ids, rng.randint(1, 3))
+            assignments += [{'ticket_id': ticket_id, 'user_id': user_id} for user_id in assignees]
+            comments += [{
+                'ticket_id': ticket_id,
+                'user_id': rng.choice(assignees),
+                'content': sentence(rng, 12),
+                'created_at': utcnow(),
+            } for _ in range(rng.randint(0, 6))]
+        db.session.execute(db.insert(TicketAssignment), assignments)
+        if comments:
+            db.session.execute(db.insert(Comment), comments)
+        recount_tickets(*ticket_ids)
+        db.session.commit()
+
+        counts['tickets'] += len(ticket_ids)
+        counts['ticket_assignments'] += len(assignments)
+        counts['comments'] += len(comments)
+        log(f"tickets: {counts['tickets']}/{tickets}")
+
+    if db.engine.dialect.name == 'postgresql':
+        # Fresh statistics, or the planner will benchmark a guess.
+        db.session.execute(db.text("ANALYZE"))
+        db.session.commit()
+
+    log(f"seeded {counts} in {time.monotonic() - started:.1f}s")
+    return counts
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Seed a migrated database with benchmark data.")
+    parser.add_argument('--scale', type=parse_scale, default='10k',
+                        help="Number of tickets: 10k, 100k, 1m or any number (default 10k).")
+    parser.add_argument('--database-url', help="Defaults to DATABASE_URI from the environment.")
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--random-seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    config = {'SQLALCHEMY_DATABASE_URI': args.database_url} if args.database_url else None
+    app = create_app(config)
+    with app.app_context():
+        seed(args.scale, batch_size=args.batch_size, random_seed=args.random_seed)
+
+if __name__ == '__main__':
+    main()
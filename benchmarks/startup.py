@@ -0,0 +1,125 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+from datetime import datetime, timezone
+from .workload import percentile, git_commit, compare
+
+# --------------------------------
+# Startup benchmark
+# --------------------------------
+# Boots the app in a fresh interpreter --runs times and reports each phase of a
+# cold start, which is what every gunicorn worker (or the master, with
+# preload_app) pays after a deploy:
+#   import         `from backend import create_app`
+#   create_app     building the app and its extensions
+#   first_request  a request that needs no database
+#   first_query    opening the first connection and running SELECT 1
+# It also reports the database connections opened before the first query,
+# which should stay at 0: booting must not touch the database.
+#
+#   python -m benchmarks.startup --runs 20 --save benchmarks/results/startup.json
+#   python -m benchmarks.startup --runs 20 --compare benchmarks/results/startup.json
+#
+# With --compare, any phase more than --tolerance slower at p95 than in the
+# baseline, or more connections at boot, is a regression (exit 1).
+
+PHASES = ('import', 'create_app', 'first_request', 'first_query')
+
+CHILD = """
+import json, time
+started = time.perf_counter()
+from sqlalchemy import event
+from sqlalchemy.pool import Pool
+connections = []
+event.listen(Pool, 'connect', lambda *args: connections.append(1))
+from backend import create_app, db
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+app.test_client().get('/api/session')
+served = time.perf_counter()
+at_boot = len(connections)
+with app.app_context():
+    db.session.execute(db.text('SELECT 1'))
+    db.session.remove()
+queried = time.perf_counter()
+print(json.dumps({
+    'import': imported - started,
+    'create_app': created - imported,
+    'first_request': served - created,
+    'first_query': queried - served,
+    'connections': at_boot,
+}))
+"""
+
+def boot_once(env):
+    result = subprocess.run([sys.executable, '-c', CHILD], env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise SystemExit(f"App failed to boot:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def summarize(runs):
+    operations = {}
+    for phase in PHASES:
+        timings = sorted(run[phase] for run in runs)
+        operations[phase] = {
+            'runs': len(timings),
+            'mean_ms': round(sum(timings) / len(timings) * 1000, 3),
+            'p50_ms': round(percentile(timings, 50) * 1000, 3),
+            'p95_ms': round(percentile(timings, 95) * 1000, 3),
+        }
+    return {'operations': operations, 'boot_connections': max(run['connections'] for run in runs)}
+
+def print_report(report):
+    print(f"{'phase':<16}{'runs':>6}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for phase, row in report['operations'].items():
+        print(f"{phase:<16}{row['runs']:>6}{row['mean_ms']:>10}{row['p50_ms']:>10}{row['p95_ms']:>10}")
+    print(f"database connections opened while booting: {report['boot_connections']}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure how long the app takes to boot.")
+    parser.add_argument('--runs', type=int, default=10, help="Cold starts to measure (default 10).")
+    parser.add_argument('--database-url', help="Defaults to DATABASE_URI.")
+    parser.add_argument('--save', help="Write the report as JSON to this path.")
+    parser.add_argument('--compare', help="Baseline report to compare against; exits 1 on regressions.")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="Allowed p95 slowdown as a fraction before it counts as a regression (default 0.2).")
+    args = parser.parse_args(argv)
+
+    env = dict(os.environ)
+    if args.database_url:
+        env['DATABASE_URI'] = args.database_url
+    if not env.get('DATABASE_URI'):
+        parser.error("Set DATABASE_URI or pass --database-url.")
+    env.setdefault('SECRET_KEY', 'bench')
+
+    # The first boot warms the filesystem cache and writes bytecode; skip it.
+    boot_once(env)
+    report = summarize([boot_once(env) for _ in range(args.runs)])
+    report['meta'] = {
+        'commit': git_commit(),
+        'recorded_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'runs': args.runs,
+    }
+    print_report(report)
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.save) or '.', exist_ok=True)
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, report, args.tolerance)
+        if report['boot_connections'] > baseline['boot_connections']:
+            regressions.append(f"connections while booting {baseline['boot_connections']} -> {report['boot_connections']}")
+        for message in regressions:
+            print(f"REGRESSION {message}")
+        if regressions:
+            raise SystemExit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,356 @@
+import argparse
+import http.client
+import json
+import math
+import os
+import random
+import re
+import subprocess
+import threading
+import time
+from datetime import datetime, timezone
+from http.cookies import SimpleCookie
+from urllib.parse import urlsplit
+from .seed import PASSWORD
+
+# --------------------------------
+# Benchmark workload
+# --------------------------------
+# Virtual users log in as seeded accounts (see seed.py) and loop over a weighted
+# mix of the real endpoints. Standard users read and comment on the tickets
+# they are assigned to; admins also add and remove assignments. The run
+# reports p50/p95/p99 latency, throughput and queries per request for each
+# operation, can save the report as JSON, and compare it with a saved baseline.
+#
+# Two targets:
+#   --url http://localhost:5000   a running server (gunicorn + Postgres); queries
+#                                 are read from its Server-Timing header
+#   --in-process                  the app in this process via its test client;
+#                                 queries are counted with engine events
+#
+#   python -m benchmarks.workload --url http://localhost:5000 --users 32 \
+#       --duration 60 --save benchmarks/results/$(git rev-parse --short HEAD).json \
+#       --compare benchmarks/results/baseline.json
+
+# Weights of each operation in a virtual user's loop.
+STANDARD_MIX = {
+    'list_tickets': 35,
+    'get_ticket': 20,
+    'list_comments': 25,
+    'add_comment': 15,
+    'login': 5,
+}
+ADMIN_MIX = dict(STANDARD_MIX, assign=10)
+
+PERCENTILES = (50, 95, 99)
+
+def server_timing_queries(header):
+    # The query count from the app's Server-Timing header: db;dur=1.2;desc="3 queries"
+    match = re.search(r'(?:^|,)\s*db;[^,]*desc="(\d+) queries"', header or "")
+    return int(match.group(1)) if match else None
+
+class HttpClient:
+    # One keep-alive connection and cookie jar per virtual user.
+    def __init__(self, base_url, timeout=30):
+        parts = urlsplit(base_url)
+        connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.connect = lambda: connection_class(parts.hostname, parts.port, timeout=timeout)
+        self.prefix = parts.path.rstrip('/')
+        self.conn = self.connect()
+        self.cookies = SimpleCookie()
+
+    def open(self, method, path, body=None):
+        # Send a request and return the response with its body still unread.
+        headers = {'Accept': 'application/json'}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        if self.cookies:
+            headers['Cookie'] = "; ".join(f"{key}={morsel.value}" for key, morsel in self.cookies.items())
+        try:
+            self.conn.request(method, self.prefix + path, payload, headers)
+            response = self.conn.getresponse()
+        except (http.client.HTTPException, ConnectionError):
+            # The server closed the keep-alive connection; retry once on a new one.
+            self.conn.close()
+            self.conn = self.connect()
+            self.conn.request(method, self.prefix + path, payload, headers)
+            response = self.conn.getresponse()
+        for header in response.headers.get_all('Set-Cookie') or []:
+            self.cookies.load(header)
+        return response
+
+    def request(self, method, path, body=None):
+        try:
+            response = self.open(method, path, body)
+            data = response.read()
+        except OSError:
+            # Timed out: the connection can't be reused.
+            self.conn.close()
+            self.conn = self.connect()
+            raise
+        return response.status, data, server_timing_queries(response.headers.get('Server-Timing'))
+
+class AppClient:
+    # Requests through the Flask test client; SQL statements are counted per
+    # request with an engine event (requests run on the calling thread).
+    _local = threading.local()
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    @classmethod
+    def instrument(cls, engine):
+        from sqlalchemy import event
+
+        @event.listens_for(engine, 'before_cursor_execute')
+        def count(conn, cursor, statement, parameters, context, executemany):
+            cls._local.queries = getattr(cls._local, 'queries', 0) + 1
+
+    def request(self, method, path, body=None):
+        self._local.queries = 0
+        rv = self.client.open(path, method=method, json=body)
+        return rv.status_code, rv.get_data(), self._local.queries
+
+class VirtualUser(threading.Thread):
+    daemon = True
+
+    def __init__(self, client, username, mix, rng, other_user_ids, record):
+        super().__init__(name=f"vu-{username}")
+        self.client = client
+        self.username = username
+        self.mix = mix
+        self.rng = rng
+        self.other_user_ids = other_user_ids
+        self.record = record
+        self.ticket_ids = []
+        self.stop_at = None
+        self.recording = threading.Event()
+
+    def call(self, op, method, path, body=None, expect=(200, 201)):
+        started = time.perf_counter()
+        try:
+            status, data, queries = self.client.request(method, path, body)
+        except (OSError, http.client.HTTPException):
+            # Timeouts and dropped connections count as errors.
+            status, data, queries = None, b'', None
+        elapsed = time.perf_counter() - started
+        if self.recording.is_set():
+            self.record(op, status in expect, elapsed, queries)
+        return status, data
+
+    def login(self):
+        return self.call('login', 'POST', '/api/login', {'username': self.username, 'password': PASSWORD})
+
+    def list_tickets(self):
+        status, data = self.call('list_tickets', 'GET', '/api/tickets?limit=50')
+        if status == 200 and not self.ticket_ids:
+            self.ticket_ids = [ticket['id'] for ticket in json.loads(data)['items']]
+
+    def get_ticket(self, ticket_id):
+        self.call('get_ticket', 'GET', f'/api/tickets/{ticket_id}')
+
+    def list_comments(self, ticket_id):
+        self.call('list_comments', 'GET', f'/api/tickets/{ticket_id}/comments?limit=50')
+
+    def add_comment(self, ticket_id):
+        self.call('add_comment', 'POST', f'/api/tickets/{ticket_id}/comments',
+                  {'content': f"Benchmark comment from {self.username}"})
+
+    def assign(self, ticket_id):
+        # Add a user and take them off again, leaving the seeded data as it was.
+        # 400 means the user was already assigned; leave that assignment alone.
+        user_id = self.rng.choice(self.other_user_ids)
+        status, _ = self.call('assign', 'POST', f'/api/tickets/{ticket_id}/assignments',
+                              {'user_id': user_id}, expect=(201, 400))
+        if status == 201:
+            self.call('unassign', 'DELETE', f'/api/tickets/{ticket_id}/assignments/{user_id}')
+
+    def step(self):
+        op = self.rng.choices(list(self.mix), weights=list(self.mix.values()))[0]
+        if op in ('login', 'list_tickets'):
+            getattr(self, op)()
+        elif not self.ticket_ids:
+            self.list_tickets()
+        else:
+            getattr(self, op)(self.rng.choice(self.ticket_ids))
+
+    def run(self):
+        self.login()
+        self.list_tickets()
+        while time.monotonic() < self.stop_at:
+            self.step()
+
+def percentile(sorted_values, p):
+    # Nearest-rank percentile.
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, math.ceil(p / 100 * len(sorted_values)) - 1)]
+
+def summarize(samples, wall_seconds):
+    # samples: list of (op, ok, seconds, queries)
+    def stats(rows):
+        latencies = sorted(row[2] for row in rows)
+        queries = [row[3] for row in rows if row[3] is not None]
+        result = {
+            'requests': len(rows),
+            'errors': sum(1 for row in rows if not row[1]),
+            'throughput_rps': round(len(rows) / wall_seconds, 2) if wall_seconds else None,
+            'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3) if latencies else None,
+            'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+        }
+        for p in PERCENTILES:
+            value = percentile(latencies, p)
+            result[f'p{p}_ms'] = round(value * 1000, 3) if value is not None else None
+        return result
+
+    by_op = {}
+    for sample in samples:
+        by_op.setdefault(sample[0], []).append(sample)
+    return {
+        'overall': stats(samples),
+        'operations': {op: stats(rows) for op, rows in sorted(by_op.items())},
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def seeded_accounts(make_client):
+    # {username: user_id} of the seeded bench accounts, or None if bench0 can't log in.
+    admin = make_client()
+    admin.request('POST', '/api/login', {'username': 'bench0', 'password': PASSWORD})
+    status, data, _ = admin.request('GET', '/api/users')
+    if status != 200:
+        return None
+    return {user['username']: user['user_id'] for user in json.loads(data) if user['username'].startswith('bench')}
+
+def pick_users(accounts, users, admins):
+    # bench0 is the admin; the other virtual users log in as the next accounts.
+    # Returns (usernames, admin usernames, ids assignments can be made to).
+    standard = sorted((name for name in accounts if name != 'bench0'), key=lambda name: int(name[5:]))
+    admin_names = ['bench0'] * admins
+    usernames = admin_names + standard[:max(0, users - admins)]
+    return usernames, set(admin_names), [accounts[name] for name in standard]
+
+def run_workload(make_client, usernames, admin_usernames, other_user_ids, duration, warmup=0, random_seed=0):
+    # Returns (samples, wall_seconds) for the measured part of the run.
+    samples = []
+    lock = threading.Lock()
+
+    def record(op, ok, seconds, queries):
+        with lock:
+            samples.append((op, ok, seconds, queries))
+
+    rng = random.Random(random_seed)
+    users = [
+        VirtualUser(make_client(), username, ADMIN_MIX if username in admin_usernames else STANDARD_MIX,
+                    random.Random(rng.random()), other_user_ids, record)
+        for username in usernames
+    ]
+    stop_at = time.monotonic() + warmup + duration
+    for user in users:
+        user.stop_at = stop_at
+        user.start()
+    time.sleep(warmup)
+    started = time.monotonic()
+    for user in users:
+        user.recording.set()
+    for user in users:
+        user.join()
+    return samples, time.monotonic() - started
+
+def compare(baseline, current, tolerance):
+    # Returns a list of regression messages: p95 latency more than `tolerance`
+    # (a fraction) slower, or more queries per request, for any operation.
+    regressions = []
+    print(f"{'operation':<16}{'p95 base':>12}{'p95 now':>12}{'change':>10}{'q/req base':>12}{'q/req now':>12}")
+    for op, now in current['operations'].items():
+        base = baseline['operations'].get(op)
+        if base is None:
+            continue
+        change = None
+        if base['p95_ms'] and now['p95_ms'] is not None:
+            change = now['p95_ms'] / base['p95_ms'] - 1
+            if change > tolerance:
+                regressions.append(f"{op}: p95 {base['p95_ms']}ms -> {now['p95_ms']}ms ({change:+.0%})")
+        base_q, now_q = base.get('queries_per_request'), now.get('queries_per_request')
+        if base_q is not None and now_q is not None and now_q > base_q + 0.5:
+            regressions.append(f"{op}: queries per request {base_q} -> {now_q}")
+        print(f"{op:<16}{base['p95_ms'] or '-':>12}{now['p95_ms'] or '-':>12}"
+              f"{f'{change:+.0%}' if change is not None else '-':>10}{base_q or '-':>12}{now_q or '-':>12}")
+    return regressions
+
+def print_report(report):
+    print(f"{'operation':<16}{'requests':>10}{'errors':>8}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'q/req':>8}")
+    rows = list(report['operations'].items()) + [('overall', report['overall'])]
+    for op, row in rows:
+        print(f"{op:<16}{row['requests']:>10}{row['errors']:>8}{row['throughput_rps']:>10}"
+              f"{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}{row['queries_per_request'] or '-':>8}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the API benchmark workload.")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--url', help="Base URL of a running server, e.g. http://localhost:5000")
+    target.add_argument('--in-process', action='store_true', help="Run the app in this process (counts queries).")
+    parser.add_argument('--database-url', help="For --in-process; defaults to DATABASE_URI.")
+    parser.add_argument('--users', type=int, default=16, help="Concurrent virtual users (default 16).")
+    parser.add_argument('--admins', type=int, default=1, help="How many of them are admins (default 1).")
+    parser.add_argument('--duration', type=float, default=30, help="Measured seconds (default 30).")
+    parser.add_argument('--warmup', type=float, default=5, help="Unmeasured seconds first (default 5).")
+    parser.add_argument('--random-seed', type=int, default=0)
+    parser.add_argument('--timeout', type=float, default=30, help="Per-request timeout with --url (default 30).")
+    parser.add_argument('--save', help="Write the report as JSON to this path.")
+    parser.add_argument('--compare', help="Baseline report to compare against; exits 1 on regressions.")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="Allowed p95 slowdown as a fraction before it counts as a regression (default 0.2).")
+    args = parser.parse_args(argv)
+
+    if args.in_process:
+        from backend import create_app, db
+        # Every virtual user logs in from the same address; don't rate limit them.
+        config = {'RATELIMIT_ENABLED': False}
+        if args.database_url:
+            config['SQLALCHEMY_DATABASE_URI'] = args.database_url
+        app = create_app(config)
+        with app.app_context():
+            AppClient.instrument(db.engine)
+        make_client = lambda: AppClient(app)
+    else:
+        make_client = lambda: HttpClient(args.url, args.timeout)
+
+    accounts = seeded_accounts(make_client)
+    if accounts is None:
+        parser.error("Could not log in as bench0; seed the database first (python -m benchmarks.seed).")
+    usernames, admins, other_user_ids = pick_users(accounts, args.users, args.admins)
+
+    samples, wall = run_workload(make_client, usernames, admins, other_user_ids,
+                                 args.duration, args.warmup, args.random_seed)
+    report = summarize(samples, wall)
+    report['meta'] = {
+        'commit': git_commit(),
+        'recorded_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'target': 'in-process' if args.in_process else args.url,
+        'users': len(usernames),
+        'duration_s': round(wall, 2),
+    }
+    print_report(report)
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.save) or '.', exist_ok=True)
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), report, args.tolerance)
+        for message in regressions:
+            print(f"REGRESSION {message}")
+        if regressions:
+            raise SystemExit(1)
+
+if __name__ == '__main__':
+    main()
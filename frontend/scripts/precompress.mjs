@@ -0,0 +1,56 @@
+// Runs after `next build` (the "postbuild" script). Writes .br and .gz copies
+// of every compressible file in the static export, and asset-manifest.json
+// listing each file, the encodings it has and whether it is content-hashed.
+// Flask (backend/assets.py) and nginx (nginx/default.conf) serve these as is,
+// so nothing is compressed per request.
+import { readdir, readFile, writeFile, rm, stat } from "node:fs/promises";
+import { join, relative, extname, sep } from "node:path";
+import { brotliCompressSync, gzipSync, constants } from "node:zlib";
+
+const MANIFEST = "asset-manifest.json";
+const COMPRESSIBLE = new Set([".html", ".js", ".css", ".json", ".txt", ".svg", ".map", ".xml", ".ico", ".webmanifest"]);
+// Below this, compression saves less than the extra response header costs.
+const MIN_BYTES = 1024;
+
+const ENCODINGS = [
+  ["br", ".br", (data) => brotliCompressSync(data, { params: { [constants.BROTLI_PARAM_QUALITY]: 11 } })],
+  ["gzip", ".gz", (data) => gzipSync(data, { level: 9 })],
+];
+
+// Next.js content-hashes everything under _next/static/, so those never change.
+const isHashed = (path) => path.startsWith("_next/static/");
+
+async function* walk(dir) {
+  for (const entry of await readdir(dir, { withFileTypes: true })) {
+    const full = join(dir, entry.name);
+    if (entry.isDirectory()) yield* walk(full);
+    else yield full;
+  }
+}
+
+const root = process.argv[2] ?? "out";
+const files = {};
+let saved = 0;
+for await (const full of walk(root)) {
+  const path = relative(root, full).split(sep).join("/");
+  if (path === MANIFEST || path.endsWith(".br") || path.endsWith(".gz")) continue;
+
+  const encodings = [];
+  const compressible = COMPRESSIBLE.has(extname(path)) && (await stat(full)).size >= MIN_BYTES;
+  const data = compressible ? await readFile(full) : null;
+  for (const [encoding, suffix, compress] of ENCODINGS) {
+    const compressed = data && compress(data);
+    if (compressed && compressed.length < data.length) {
+      await writeFile(full + suffix, compressed);
+      if (encoding === "br") saved += data.length - compressed.length;
+      encodings.push(encoding);
+    } else {
+      await rm(full + suffix, { force: true });
+    }
+  }
+  files[path] = { encodings, immutable: isHashed(path) };
+}
+
+const sorted = Object.fromEntries(Object.keys(files).sort().map((path) => [path, files[path]]));
+await writeFile(join(root, MANIFEST), JSON.stringify({ files: sorted }, null, 1));
+console.log(`precompressed ${Object.keys(files).length} files in ${root}/, ${Math.round(saved / 1024)} KiB smaller with brotli`);
@@ -114,29 +114,11 @@ function TicketPage() {
         credentials: "include",
       });
 
-      const comments = (await res3.json()) as Array<{
-        author_id: number;
-        content: string;
-        created_at: string;
-        id: number;
-      }>;
-
-      const master_comments: Array<Comment> = [];
-
-      // Get Comment Authors
-      for (let index = 0; index < comments.length; index++) {
-        const comment = comments[index];
-        const res = await fetch(`${window.location.origin}/api/users/${comment.author_id}`, {
-          method: "GET",
-          cache: "force-cache",
-          credentials: "include",
-        });
-        const author = (await res.json()).username as string;
-        master_comments.push({ ...comment, author_username: author });
-      }
+      // Comments come with their author's username.
+      const ticketComments = (await res3.json()) as Array<Comment>;
 
       setComments(() => {
-        return { state: master_comments, pending: false };
+        return { state: ticketComments, pending: false };
       });
     }
 
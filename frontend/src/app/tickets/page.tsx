@@ -85,6 +85,19 @@ export default function Tickets() {
     GetSession();
   }, [forceReload, router]);
 
+  // Re-fetch the tickets when the server reports a change, instead of polling.
+  // EventSource reconnects on its own and resumes from the last event id.
+  useEffect(() => {
+    if (!isLoggedIn.state) return;
+
+    const source = new EventSource(`${window.location.origin}/api/events`, { withCredentials: true });
+    const reload = () => setForceReload((prev) => !prev);
+    const kinds = ["ticket.created", "ticket.updated", "ticket.deleted", "assignment.created", "assignment.deleted", "reset"];
+    kinds.forEach((kind) => source.addEventListener(kind, reload));
+
+    return () => source.close();
+  }, [isLoggedIn.state]);
+
   if (isLoggedIn.pending == true) {
     return (
       <div></div>
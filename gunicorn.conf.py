@@ -0,0 +1,87 @@
+# Gunicorn settings, read automatically by `gunicorn app:app` from this directory.
+# Every value can be overridden with an environment variable (or a command line flag).
+#
+# GUNICORN_WORKER_CLASS picks the concurrency model:
+#   gevent  (default) each worker serves up to GUNICORN_WORKER_CONNECTIONS
+#           requests at once on greenlets. psycopg2 is made cooperative
+#           (psycogreen), so a slow query or an open /api/events stream only
+#           parks its own greenlet instead of blocking the worker.
+#   gthread GUNICORN_THREADS OS threads per worker.
+#   sync    one request per worker at a time (the old setup); /api/events
+#           streams hold a whole worker for up to EVENTS_STREAM_MAX_SECONDS.
+#
+# Worker counts default from the CPU count: one per core for gevent (each one
+# already multiplexes many requests), 2 * cores + 1 for sync and gthread.
+# WEB_CONCURRENCY overrides it, as on most platforms.
+#
+# Every worker has its own SQLAlchemy connection pool. Keep
+# workers * (pool size + overflow) below the database's connection limit.
+#
+# GUNICORN_PRELOAD (default true) imports the app once in the master before
+# forking the workers (preload_app). Workers then start in milliseconds instead
+# of each importing the app, and share its memory until they write to it.
+# Engines inherited from the master are disposed in every worker (see
+# backend/pool.py), so no connection is ever shared. The trade-off: a HUP
+# reloads the config but not the code; restart gunicorn to deploy.
+import multiprocessing
+import os
+import shutil
+
+def _int(name, default):
+    return int(os.environ.get(name, default))
+
+cores = multiprocessing.cpu_count()
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:5000")
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gevent")
+preload_app = os.environ.get("GUNICORN_PRELOAD", "true").lower() == "true"
+
+if worker_class == "gevent" and preload_app:
+    # The app is imported in the master, so the standard library has to be
+    # patched before that rather than in each worker.
+    from gevent import monkey
+    monkey.patch_all()
+
+if worker_class == "gevent":
+    workers = _int("WEB_CONCURRENCY", cores)
+    worker_connections = _int("GUNICORN_WORKER_CONNECTIONS", 200)
+elif worker_class == "gthread":
+    workers = _int("WEB_CONCURRENCY", 2 * cores + 1)
+    threads = _int("GUNICORN_THREADS", 4)
+else:
+    workers = _int("WEB_CONCURRENCY", 2 * cores + 1)
+
+# Sync workers are killed when a single request runs longer than this; gevent
+# and gthread workers only when the whole worker stops responding.
+timeout = _int("GUNICORN_TIMEOUT", 30)
+graceful_timeout = _int("GUNICORN_GRACEFUL_TIMEOUT", 30)
+keepalive = _int("GUNICORN_KEEPALIVE", 5)
+# Recycle workers now and then to cap slow memory growth.
+max_requests = _int("GUNICORN_MAX_REQUESTS", 0)
+max_requests_jitter = _int("GUNICORN_MAX_REQUESTS_JITTER", 0)
+
+accesslog = os.environ.get("GUNICORN_ACCESSLOG")
+loglevel = os.environ.get("GUNICORN_LOGLEVEL", "info")
+
+def on_starting(server):
+    # Metrics files of the previous run's workers (see instrumentation.py).
+    metrics_dir = os.environ.get("METRICS_DIR")
+    if metrics_dir and os.path.isdir(metrics_dir):
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+
+def child_exit(server, worker):
+    # Fold the exited worker's metrics into the archive (see instrumentation.py).
+    metrics_dir = os.environ.get("METRICS_DIR")
+    if metrics_dir and os.path.isdir(metrics_dir):
+        from backend.instrumentation import archive_worker
+        archive_worker(metrics_dir, worker.pid)
+
+def post_worker_init(worker):
+    # Runs in each worker after gevent has patched the standard library.
+    if worker_class == "gevent":
+        try:
+            from psycogreen.gevent import patch_psycopg
+            patch_psycopg()
+        except ImportError:
+            # No psycopg2 (e.g. SQLite in development): nothing to patch.
+            pass
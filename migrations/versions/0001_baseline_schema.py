@@ -0,0 +1,68 @@
+"""baseline schema
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-18 12:00:00
+
+The schema as it was created by db.create_all() before migrations existed.
+Databases that already have these tables are left untouched, so existing
+deployments can simply run `flask db upgrade`.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if sa.inspect(op.get_bind()).has_table('users'):
+        return
+
+    op.create_table('users',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('username', sa.String(length=150), nullable=False),
+        sa.Column('password', sa.String(length=150), nullable=False),
+        sa.Column('role', sa.String(length=50), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('username')
+    )
+    op.create_table('tickets',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('title', sa.String(length=100), nullable=False),
+        sa.Column('description', sa.String(length=255), nullable=True),
+        sa.Column('status', sa.String(length=50), nullable=True),
+        sa.Column('creator_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['creator_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('comments',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('content', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('ticket_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['ticket_id'], ['tickets.id']),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('ticket_assignments',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('ticket_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['ticket_id'], ['tickets.id']),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('ticket_assignments')
+    op.drop_table('comments')
+    op.drop_table('tickets')
+    op.drop_table('users')
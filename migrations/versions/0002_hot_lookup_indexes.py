@@ -0,0 +1,47 @@
+"""indexes for hot lookup columns
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 12:10:00
+
+On Postgres the indexes are built with CREATE INDEX CONCURRENTLY outside of a
+transaction, so they can be added to a live database without blocking writes.
+Duplicate assignments (previously only prevented in Python) are removed first
+so the unique index can be built.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_ticket_assignments_ticket_id_user_id', 'ticket_assignments', ['ticket_id', 'user_id'], True),
+    ('ix_ticket_assignments_user_id', 'ticket_assignments', ['user_id'], False),
+    ('ix_comments_ticket_id_created_at_id', 'comments', ['ticket_id', 'created_at', 'id'], False),
+    ('ix_comments_user_id', 'comments', ['user_id'], False),
+    ('ix_tickets_creator_id_status', 'tickets', ['creator_id', 'status'], False),
+]
+
+
+def upgrade():
+    op.execute(
+        "DELETE FROM ticket_assignments WHERE id NOT IN ("
+        "SELECT MIN(id) FROM ticket_assignments GROUP BY ticket_id, user_id)"
+    )
+
+    with op.get_context().autocommit_block():
+        for name, table, columns, unique in INDEXES:
+            op.create_index(name, table, columns, unique=unique,
+                            postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns, unique in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,35 @@
+"""ticket version counters and updated_at timestamps
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 12:20:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('tickets') as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+    with op.batch_alter_table('comments') as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+
+    op.execute("UPDATE tickets SET updated_at = CURRENT_TIMESTAMP")
+    op.execute("UPDATE comments SET updated_at = created_at")
+
+
+def downgrade():
+    with op.batch_alter_table('comments') as batch_op:
+        batch_op.drop_column('updated_at')
+    with op.batch_alter_table('tickets') as batch_op:
+        batch_op.drop_column('updated_at')
+        batch_op.drop_column('version')
@@ -0,0 +1,35 @@
+"""change event log for the server-sent event feed
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 12:30:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('change_events',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=50), nullable=False),
+        sa.Column('ticket_id', sa.Integer(), nullable=True),
+        sa.Column('payload', sa.JSON(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_change_events_ticket_id', 'change_events', ['ticket_id'])
+    op.create_index('ix_change_events_created_at', 'change_events', ['created_at'])
+
+
+def downgrade():
+    op.drop_index('ix_change_events_created_at', table_name='change_events')
+    op.drop_index('ix_change_events_ticket_id', table_name='change_events')
+    op.drop_table('change_events')
@@ -0,0 +1,52 @@
+"""full-text search indexes
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 13:00:00
+
+Postgres: GIN indexes over the to_tsvector() expressions used by search.py,
+built CONCURRENTLY. SQLite: the FTS5 table and the triggers that keep it in
+sync, backfilled from the existing rows.
+
+"""
+from alembic import op
+
+from backend.search import SQLITE_DDL, SQLITE_REBUILD
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+TICKETS_VECTOR = "to_tsvector('english'::regconfig, coalesce(title, '') || ' ' || coalesce(description, ''))"
+COMMENTS_VECTOR = "to_tsvector('english'::regconfig, content)"
+
+SQLITE_TRIGGERS = [
+    'tickets_search_insert', 'tickets_search_update', 'tickets_search_delete',
+    'comments_search_insert', 'comments_search_update', 'comments_search_delete',
+]
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        with op.get_context().autocommit_block():
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_tickets_search ON tickets USING gin ({TICKETS_VECTOR})")
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_comments_search ON comments USING gin ({COMMENTS_VECTOR})")
+    elif dialect == 'sqlite':
+        for statement in SQLITE_DDL + SQLITE_REBUILD:
+            op.execute(statement)
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        with op.get_context().autocommit_block():
+            op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_comments_search")
+            op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_tickets_search")
+    elif dialect == 'sqlite':
+        for trigger in SQLITE_TRIGGERS:
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS search_index")
@@ -0,0 +1,65 @@
+"""ON DELETE CASCADE for comments and assignments
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 17:00:00
+
+Comments and assignments are deleted by the database along with their ticket
+or user. On Postgres, replacing a constraint takes ACCESS EXCLUSIVE locks on
+the tables involved until the transaction commits. The new constraints are
+therefore added NOT VALID, which skips the scan, and that transaction is
+committed before they are validated. Each VALIDATE CONSTRAINT runs in its own
+transaction with a SHARE UPDATE EXCLUSIVE lock, so reads and writes carry on
+while it scans the rows.
+
+On SQLite the tables are rebuilt (batch mode); their unnamed constraints get
+names from NAMING_CONVENTION so they can be dropped, and the full-text search
+triggers dropped along with the old comments table are put back.
+
+"""
+from alembic import op
+
+from backend.search import SQLITE_DDL
+
+
+# revision identifiers, used by Alembic.
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+NAMING_CONVENTION = {'fk': 'fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s'}
+FOREIGN_KEYS = {
+    'comments': [('ticket_id', 'tickets'), ('user_id', 'users')],
+    'ticket_assignments': [('ticket_id', 'tickets'), ('user_id', 'users')],
+}
+
+
+def _replace_foreign_keys(ondelete):
+    dialect = op.get_bind().dialect.name
+    postgresql = dialect == 'postgresql'
+    for table, columns in FOREIGN_KEYS.items():
+        with op.batch_alter_table(table, naming_convention=NAMING_CONVENTION) as batch_op:
+            for column, referred in columns:
+                # Postgres named the original constraints itself.
+                name = f"{table}_{column}_fkey" if postgresql else f"fk_{table}_{column}_{referred}"
+                batch_op.drop_constraint(name, type_='foreignkey')
+                batch_op.create_foreign_key(name, referred, [column], ['id'], ondelete=ondelete,
+                                            postgresql_not_valid=True)
+    if postgresql:
+        # Commits the swap above, releasing its locks, before the scans.
+        with op.get_context().autocommit_block():
+            for table, columns in FOREIGN_KEYS.items():
+                for column, referred in columns:
+                    op.execute(f"ALTER TABLE {table} VALIDATE CONSTRAINT {table}_{column}_fkey")
+    if dialect == 'sqlite':
+        for statement in SQLITE_DDL:
+            op.execute(statement)
+
+
+def upgrade():
+    _replace_foreign_keys('CASCADE')
+
+
+def downgrade():
+    _replace_foreign_keys(None)
@@ -0,0 +1,33 @@
+"""widen users.password for scrypt hashes
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-19 09:00:00
+
+scrypt hashes with 16-character salts (PASSWORD_HASH_METHOD and
+PASSWORD_SALT_LENGTH defaults) are 162 characters long, which Postgres
+rejects in a VARCHAR(150). Widening a VARCHAR on Postgres only changes the
+catalog, without rewriting or scanning the table.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0009'
+down_revision = '0008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.alter_column('password', existing_type=sa.String(length=150),
+                              type_=sa.String(length=255), existing_nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.alter_column('password', existing_type=sa.String(length=255),
+                              type_=sa.String(length=150), existing_nullable=False)